@@ -0,0 +1,188 @@
+"""
+Ship endpoint benchmark over synthetic fleets of increasing size.
+
+Seeds a fresh SQLite database per fleet size with benchmarks.fleet rows
+(widget JSON blobs, a year of operation dates) and calls get_ships, get_ship,
+get_berth_status, get_operations_stats, get_analytics and
+get_completion_forecast in-process through the Flask test client. For each
+endpoint and size it records median wall time, SQL statements per request,
+response size and peak traced memory, and prints how each grows relative to
+the smallest fleet. Results can be saved and compared against a stored
+baseline.
+
+The response cache is disabled so every request does the full work; with
+--cached each endpoint is warmed once and the timings are cache hits. The
+forecast's parsed per-ship inputs are kept between requests either way, as
+in a running worker.
+
+    python -m benchmarks.endpoint_bench --sizes 1000,10000,100000 --output baseline.json
+    python -m benchmarks.endpoint_bench --sizes 1000,10000,100000 --compare baseline.json
+    python -m benchmarks.endpoint_bench --sizes 1000,10000,100000 --cached
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from sqlalchemy import event
+
+from benchmarks.fleet import seed_database
+from src.main import create_app
+from src.models import db
+from src.services import cache, forecast
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+# (name, path); get_ship asks for a row in the middle of the table
+ENDPOINTS = [
+    ('get_ships', '/api/ships'),
+    ('get_ship', '/api/ships/{middle_id}'),
+    ('get_berth_status', '/api/ships/berths'),
+    ('get_operations_stats', '/api/ships/stats'),
+    ('get_analytics', '/api/analytics?period=30'),
+    ('get_completion_forecast', '/api/ships/forecast'),
+]
+# Timings this close to the baseline are treated as noise
+MIN_REGRESSION_SECONDS = 0.002
+
+class QueryCounter:
+    """Counts statements executed on an engine"""
+
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+def bench_endpoint(client, counter, path, repeat, cached=False):
+    """Median timing for one endpoint, plus queries and peak memory from a separate traced run"""
+    if cached:
+        client.get(path)
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.get(path)
+        runs.append(time.perf_counter() - started)
+        if response.status_code != 200:
+            raise RuntimeError(f'{path} answered {response.status_code}')
+
+    counter.count = 0
+    tracemalloc.start()
+    response = client.get(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'wall_s': statistics.median(runs),
+        'queries': counter.count,
+        'response_kb': len(response.data) // 1024,
+        'peak_kb': peak // 1024,
+    }
+
+def bench_size(size, repeat, seed, tmp, cached=False):
+    database_url = f"sqlite:///{os.path.join(tmp, f'fleet_{size}.db')}"
+    seed_database(database_url, size, seed).dispose()
+    os.environ['DATABASE_URL'] = database_url
+    # A fresh cache per fleet so no size is served another's payloads
+    cache.set_cache(cache.Cache(cache.MemoryTier(), cache.SharedVersions(os.path.join(tmp, f'versions_{size}'))))
+    forecast.set_forecaster(forecast.Forecaster())
+    app = create_app()
+    results = {}
+    with app.app_context():
+        counter = QueryCounter(db.engine)
+        client = app.test_client()
+        for name, path in ENDPOINTS:
+            key = f'{name}:{size}'
+            results[key] = bench_endpoint(client, counter, path.format(middle_id=size // 2 or 1), repeat, cached)
+            r = results[key]
+            print(f"{key:>28}  wall {r['wall_s'] * 1000:9.1f}ms  queries {r['queries']:4d}  "
+                  f"response {r['response_kb']:7d}KB  peak {r['peak_kb']:8d}KB", flush=True)
+        db.engine.dispose()
+    return results
+
+def run(sizes, repeat, seed, cached=False):
+    results = {}
+    previous_url = os.environ.get('DATABASE_URL')
+    previous_cache = cache.ENABLED
+    cache.ENABLED = cached
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            for size in sizes:
+                results.update(bench_size(size, repeat, seed, tmp, cached))
+        finally:
+            cache.ENABLED = previous_cache
+            cache.set_cache(None)
+            if previous_url is None:
+                os.environ.pop('DATABASE_URL', None)
+            else:
+                os.environ['DATABASE_URL'] = previous_url
+    return results
+
+def print_growth(results, sizes):
+    """Each endpoint's wall time and peak memory relative to the smallest fleet"""
+    base_size = sizes[0]
+    print(f'\nGrowth relative to {base_size} ships (wall time x / peak memory x)')
+    print(f"{'':>22}  " + ' '.join(f'{size:>16}' for size in sizes))
+    for name, _ in ENDPOINTS:
+        base = results[f'{name}:{base_size}']
+        cells = []
+        for size in sizes:
+            r = results[f'{name}:{size}']
+            cells.append(f"{r['wall_s'] / base['wall_s']:7.1f} / {r['peak_kb'] / max(base['peak_kb'], 1):6.1f}")
+        print(f'{name:>22}  ' + ' '.join(f'{cell:>16}' for cell in cells))
+
+def compare(results, baseline, tolerance):
+    """Return the list of metrics that regressed beyond tolerance"""
+    regressions = []
+    for key, r in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        for metric in ('wall_s', 'queries', 'peak_kb'):
+            new, old = r[metric], base[metric]
+            if metric == 'queries':
+                # Statement counts are exact; any increase is a regression
+                regressed = new > old
+            else:
+                floor = 64 if metric == 'peak_kb' else MIN_REGRESSION_SECONDS
+                regressed = new > old * (1 + tolerance) and new - old > floor
+            if regressed:
+                regressions.append(f'{key} {metric}: {old:.4g} -> {new:.4g} (+{(new / old - 1) * 100 if old else 100:.0f}%)')
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)), help='comma-separated fleet sizes')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', help='write results as JSON (use as a baseline later)')
+    parser.add_argument('--compare', help='baseline JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='allowed slowdown before flagging')
+    parser.add_argument('--cached', action='store_true', help='time warm response-cache hits instead of full requests')
+    args = parser.parse_args(argv)
+
+    sizes = sorted(int(s) for s in args.sizes.split(','))
+    results = run(sizes, args.repeat, args.seed, args.cached)
+    print_growth(results, sizes)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print('\nRegressions against baseline:')
+            for line in regressions:
+                print(f'  {line}')
+            return 1
+        print('\nNo regressions against baseline.')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,214 @@
+"""
+Extraction benchmark over synthetic TXT, CSV and PDF manifests.
+
+Times text extraction (extract_text_from_pdf / extract_data_from_csv / plain
+read) and parse_maritime_data separately, breaks parse time down by field
+group, and records peak traced memory. PDFs are also timed through the
+keyword page index (index build plus indexed parse), and manifests matching
+a registered template through its fast path. Results can be saved and compared
+against a stored baseline to judge parser changes.
+
+    python -m benchmarks.extraction_bench --pages 1,50,500 --output baseline.json
+    python -m benchmarks.extraction_bench --pages 1,50,500 --compare baseline.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.manifests import write_manifest
+from src.services import pdf_index
+from src.services.csv_ingest import ingest_csv
+from src.services.templates import match_template
+from src.routes.file_processor import (
+    FIELD_GROUPS, PatternMatcher, clean_extracted_text,
+    extract_data_from_csv, extract_text_from_pdf, parse_maritime_data,
+)
+
+DEFAULT_PAGES = [1, 10, 50, 100, 250, 500]
+DEFAULT_FORMATS = ['txt', 'csv', 'pdf']
+# Timings this close to the baseline are treated as noise
+MIN_REGRESSION_SECONDS = 0.002
+
+def read_text(path, fmt):
+    if fmt == 'pdf':
+        return extract_text_from_pdf(path)
+    if fmt == 'csv':
+        return extract_data_from_csv(path)
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+def time_groups(text):
+    """Seconds spent in each field group for one parse"""
+    clean_text = clean_extracted_text(text)
+    data = {}
+    matcher = PatternMatcher()
+    timings = {}
+    for name, parse_group in FIELD_GROUPS:
+        started = time.perf_counter()
+        parse_group(text, clean_text, data, matcher)
+        timings[name] = time.perf_counter() - started
+    return timings
+
+def bench_file(path, fmt, repeat):
+    """Median timings for one manifest, plus peak memory from a separate traced run"""
+    extract_runs, parse_runs, group_runs = [], [], []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        text = read_text(path, fmt)
+        extract_runs.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        data = parse_maritime_data(text)
+        parse_runs.append(time.perf_counter() - started)
+
+        group_runs.append(time_groups(text))
+
+    tracemalloc.start()
+    parse_maritime_data(read_text(path, fmt))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    result = {
+        'file_bytes': os.path.getsize(path),
+        'text_chars': len(text),
+        'fields_found': len(data),
+        'extract_s': statistics.median(extract_runs),
+        'parse_s': statistics.median(parse_runs),
+        'groups_s': {name: statistics.median(run[name] for run in group_runs) for name, _ in FIELD_GROUPS},
+        'peak_kb': peak // 1024,
+    }
+    if fmt == 'csv':
+        # Structured path /api/extract uses for CSV, for comparison with extract + parse
+        ingest_runs = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            ingest_csv(path)
+            ingest_runs.append(time.perf_counter() - started)
+        result['ingest_s'] = statistics.median(ingest_runs)
+    template = match_template(text)
+    if template:
+        # Fast path /api/extract takes for documents matching a registered template
+        template_runs = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            template.extract(text)
+            template_runs.append(time.perf_counter() - started)
+        result['template'] = template.name
+        result['template_s'] = statistics.median(template_runs)
+    if fmt == 'pdf':
+        # Keyword page index path /api/extract uses for PDF (index build excludes text extraction)
+        pages = pdf_index.extract_pages(path)
+        index_runs, indexed_runs = [], []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            index = pdf_index.PageIndex.build(pages)
+            index_runs.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            indexed = parse_maritime_data(text, page_index=index)
+            indexed_runs.append(time.perf_counter() - started)
+        result['index_s'] = statistics.median(index_runs)
+        result['indexed_parse_s'] = statistics.median(indexed_runs)
+        # The index may only skip work, never change what the parse finds. Each page is also checked on its own,
+        # since on the whole manifest the header's labelled values can hide a field the index missed elsewhere.
+        mismatched = set(_differing(data, indexed))
+        for page in pages:
+            page_index = pdf_index.PageIndex.build([page])
+            page_text = page_index.full_text()
+            mismatched.update(_differing(parse_maritime_data(page_text),
+                                         parse_maritime_data(page_text, page_index=page_index)))
+        result['indexed_mismatch'] = sorted(mismatched)
+        # Pages each field group parses, summed over groups, against every group parsing every page
+        result['group_pages'] = sum(index.summary()['group_pages'].values())
+        result['all_group_pages'] = len(pdf_index.GROUP_KEYWORDS) * len(pages)
+    return result
+
+def _differing(full, indexed):
+    return [key for key in set(full) | set(indexed) if full.get(key) != indexed.get(key)]
+
+def run(pages_list, formats, repeat, seed):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt in formats:
+            for pages in pages_list:
+                path = write_manifest(os.path.join(tmp, f'manifest_{pages}.{fmt}'), fmt, pages, seed)
+                key = f'{fmt}:{pages}'
+                results[key] = bench_file(path, fmt, repeat)
+                r = results[key]
+                print(f"{key:>10}  extract {r['extract_s'] * 1000:9.1f}ms  parse {r['parse_s'] * 1000:9.1f}ms  "
+                      f"peak {r['peak_kb']:8d}KB  fields {r['fields_found']}"
+                      + (f"  ingest {r['ingest_s'] * 1000:.1f}ms" if 'ingest_s' in r else '')
+                      + (f"  index {r['index_s'] * 1000:.1f}ms  indexed parse {r['indexed_parse_s'] * 1000:.1f}ms"
+                         f"  group pages {r['group_pages']}/{r['all_group_pages']}"
+                         if 'index_s' in r else '')
+                      + (f"  template {r['template_s'] * 1000:.1f}ms" if 'template_s' in r else ''))
+                if r.get('indexed_mismatch'):
+                    print(f"{'':>10}  indexed parse differs from full parse: {', '.join(r['indexed_mismatch'])}")
+    return results
+
+def print_groups(results):
+    names = [name for name, _ in FIELD_GROUPS]
+    print('\nParse time by field group (ms)')
+    print(f"{'':>10}  " + ' '.join(f'{n:>10}' for n in names))
+    for key, r in results.items():
+        print(f'{key:>10}  ' + ' '.join(f"{r['groups_s'][n] * 1000:10.2f}" for n in names))
+
+def compare(results, baseline, tolerance):
+    """Return the list of metrics that regressed beyond tolerance"""
+    regressions = []
+    for key, r in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        metrics = [('extract_s', r['extract_s'], base['extract_s']),
+                   ('parse_s', r['parse_s'], base['parse_s']),
+                   ('peak_kb', r['peak_kb'], base['peak_kb'])]
+        metrics += [(metric, r[metric], base[metric]) for metric in ('ingest_s', 'index_s', 'indexed_parse_s', 'template_s')
+                    if metric in r and metric in base]
+        metrics += [(f'group:{n}', t, base['groups_s'].get(n, 0)) for n, t in r['groups_s'].items()]
+        for metric, new, old in metrics:
+            floor = 64 if metric == 'peak_kb' else MIN_REGRESSION_SECONDS
+            if new > old * (1 + tolerance) and new - old > floor:
+                regressions.append(f'{key} {metric}: {old:.4g} -> {new:.4g} (+{(new / old - 1) * 100 if old else 100:.0f}%)')
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pages', default=','.join(map(str, DEFAULT_PAGES)), help='comma-separated page counts')
+    parser.add_argument('--formats', default=','.join(DEFAULT_FORMATS), help='comma-separated formats')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', help='write results as JSON (use as a baseline later)')
+    parser.add_argument('--compare', help='baseline JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='allowed slowdown before flagging')
+    args = parser.parse_args(argv)
+
+    results = run([int(p) for p in args.pages.split(',')], args.formats.split(','), args.repeat, args.seed)
+    print_groups(results)
+    mismatched = [key for key, r in results.items() if r.get('indexed_mismatch')]
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print('\nRegressions against baseline:')
+            for line in regressions:
+                print(f'  {line}')
+            return 1
+        print('\nNo regressions against baseline.')
+    if mismatched:
+        print(f"\nIndexed parse differs from full parse for {', '.join(mismatched)}")
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""
+Synthetic Ship fleets for benchmarking the ship endpoints.
+
+Rows look like the ones the wizard and ship-info screens produce: crews
+drawn from a small roster, operation dates spread over the past year and
+the next month, a mix of statuses with progress to match, and widget JSON
+blobs (deck progress, turnaround times, brand inventory, hourly quantities)
+sized the way ship-info writes them. Output is deterministic for a given
+seed.
+"""
+
+import json
+import random
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import create_engine
+
+from src.models import db
+from src.models.ship import Ship
+
+VESSELS = ['Atlantic Pioneer', 'Grande Mare', 'Morning Cara', 'Tonsberg', 'Hoegh Target', 'Glovis Sirius',
+           'Carmen', 'Tortugas', 'Elektra', 'Aniara', 'Thermopylae', 'Titus']
+LINES = ['Wallenius Wilhelmsen', 'Hoegh Autoliners', 'Grimaldi', 'K Line', 'Glovis', 'NYK']
+VESSEL_TYPES = ['Auto Only', 'Heavy Only', 'Auto + Heavy']
+OPERATION_TYPES = ['Discharge Only', 'Loading Only', 'Discharge + Loading']
+PORTS = ['Colonel Island', 'Brunswick', 'Savannah']
+LEADS = ['Colby Chapman', 'Spencer Wilkins', 'Ricky Ford', 'Dana White', 'Marcus Hill', 'Ann Lee']
+ASSISTANTS = ['Cole Bailey', 'Bruce Banner', 'Tina Ray', 'Omar Diaz']
+MANAGERS = ['John Smith', 'Jane Doe', 'Luis Ortega']
+BRANDS = ['Mercedes', 'BMW', 'Toyota', 'Honda', 'Hyundai', 'Kia', 'Nissan', 'Volvo']
+ZONES = ['BRV', 'ZEE', 'SOU']
+# Roughly a dashboard's worth of live operations; the rest are history
+STATUS_WEIGHTS = [('complete', 80), ('active', 10), ('loading', 3), ('discharge', 4), ('paused', 3)]
+
+def deck_data(rng, total, progress):
+    per_deck = -(-total // 8)
+    decks = []
+    for deck in range(1, 9):
+        deck_total = per_deck if deck < 8 else total - per_deck * 7
+        discharged = min(deck_total, round(deck_total * progress / 100 * rng.uniform(0.8, 1.2)))
+        decks.append({'deck': deck, 'total': deck_total, 'discharged': discharged, 'complete': discharged >= deck_total})
+    return decks
+
+def inventory_data(rng, total, progress):
+    brands = rng.sample(BRANDS, rng.randint(1, 5))
+    shares = [rng.random() for _ in brands]
+    inventory = {}
+    for brand, share in zip(brands, shares):
+        brand_total = round(total * share / sum(shares))
+        inventory[brand] = {'total': brand_total, 'discharged': round(brand_total * progress / 100),
+                            'zone': rng.choice(ZONES)}
+    return inventory
+
+def turnaround_data(rng):
+    best = round(rng.uniform(8, 14), 1)
+    return {'average': round(best + rng.uniform(2, 6), 1), 'best': best, 'worst': round(best + rng.uniform(8, 20), 1)}
+
+def hourly_data(rng, hours):
+    return {str(7 + hour): rng.randint(60, 220) for hour in range(hours)}
+
+def ship_row(rng, today):
+    """One Ship row as a column dict"""
+    total = rng.randint(200, 4000)
+    heavy = rng.randint(0, total // 10)
+    status = rng.choices([s for s, _ in STATUS_WEIGHTS], [w for _, w in STATUS_WEIGHTS])[0]
+    progress = 100 if status == 'complete' else rng.randint(0, 99)
+    start_hour = rng.choice([6, 7, 8])
+    shift_hours = rng.choice([8, 10, 12])
+    operation_date = today + timedelta(days=rng.randint(-365, 30))
+    created = datetime.combine(operation_date, datetime.min.time()) - timedelta(days=rng.randint(1, 14))
+    brv, zee = rng.randint(0, total // 3), rng.randint(0, total // 3)
+    return {
+        'vesselName': f'{rng.choice(VESSELS)} {rng.randint(1, 99)}',
+        'vesselType': rng.choice(VESSEL_TYPES),
+        'shippingLine': rng.choice(LINES),
+        'port': rng.choice(PORTS),
+        'operationDate': operation_date,
+        'company': 'APS Stevedoring',
+        'operationType': rng.choice(OPERATION_TYPES),
+        'berth': f'Berth {rng.randint(1, 6)}',
+        'operationManager': rng.choice(MANAGERS),
+        'autoOpsLead': rng.choice(LEADS),
+        'autoOpsAssistant': rng.choice(ASSISTANTS),
+        'heavyOpsLead': rng.choice(LEADS),
+        'heavyOpsAssistant': rng.choice(ASSISTANTS),
+        'totalVehicles': total,
+        'totalAutomobilesDischarge': total - heavy,
+        'heavyEquipmentDischarge': heavy,
+        'totalElectricVehicles': rng.randint(0, total // 5),
+        'totalStaticCargo': rng.randint(0, 40),
+        'brvTarget': brv,
+        'zeeTarget': zee,
+        'souTarget': total - brv - zee,
+        'expectedRate': rng.randint(80, 220),
+        'totalDrivers': rng.randint(10, 60),
+        'shiftStart': f'{start_hour:02d}:00',
+        'shiftEnd': f'{start_hour + shift_hours:02d}:00',
+        'breakDuration': rng.choice([0, 30, 60]),
+        'targetCompletion': f'{start_hour + shift_hours:02d}:00',
+        'ticoVans': rng.randint(0, 6),
+        'ticoStationWagons': rng.randint(0, 4),
+        'status': status,
+        'progress': progress,
+        'createdAt': created,
+        'updatedAt': created + timedelta(hours=rng.randint(1, 48)),
+        'startTime': f'{start_hour:02d}:00',
+        'estimatedCompletion': f'{start_hour + shift_hours:02d}:00',
+        'deck_data': json.dumps(deck_data(rng, total, progress)),
+        'turnaround_data': json.dumps(turnaround_data(rng)),
+        'inventory_data': json.dumps(inventory_data(rng, total, progress)),
+        'hourly_quantity_data': json.dumps(hourly_data(rng, shift_hours * progress // 100)),
+    }
+
+def generate_rows(count, seed=7, today=None):
+    rng = random.Random(seed)
+    today = today or date.today()
+    return [ship_row(rng, today) for _ in range(count)]
+
+def seed_database(database_url, count, seed=7, batch=5000):
+    """Create the schema at database_url and bulk insert count ships; returns the engine"""
+    engine = create_engine(database_url)
+    db.metadata.create_all(engine)
+    rows = generate_rows(count, seed)
+    with engine.begin() as conn:
+        for start in range(0, len(rows), batch):
+            conn.execute(Ship.__table__.insert(), rows[start:start + batch])
+    return engine
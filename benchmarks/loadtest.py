@@ -0,0 +1,433 @@
+"""
+Load test against a local gunicorn running gunicorn.conf.py.
+
+Seeds a throwaway SQLite database with a synthetic fleet, starts gunicorn on
+it and replays the production mix from virtual users, each a thread on its
+own schedule:
+
+  dashboards   master dashboards polling GET /api/ships every --poll-interval
+  screens      ship-info screens, each bound to one live ship, sending
+               PUT /api/ships/<id>/progress every --write-interval and a
+               status change on every --status-every'th write
+  extractors   upload a PDF manifest and POST /api/extract every
+               --extract-interval
+
+Users start at random offsets within their interval. Latency is measured
+from the scheduled start, so a server that falls behind is charged for the
+queueing it causes rather than hiding it. For every endpoint the report gives
+request count, throughput, p50/p95/p99 latency, error rate (non-2xx and
+connection failures) and SQLite busy errors scraped from /metrics; for each
+gunicorn it started it also gives the workers' mean RSS and PSS.
+
+Pass several worker classes and counts to run the matrix one configuration
+after another on a freshly seeded database each time:
+
+    python -m benchmarks.loadtest --dashboards 30 --screens 12 --duration 120
+    python -m benchmarks.loadtest --worker-classes sync,gthread --workers 1,2,4 --output sizing.json
+    python -m benchmarks.loadtest --url http://127.0.0.1:5000 --ship-ids 1,2,3   # an already running server
+    python -m benchmarks.loadtest --screens 60 --write-interval 1 --coalesce 0,1   # progress write coalescing
+    python -m benchmarks.loadtest --screens 60 --write-interval 1 --shard 0,1      # one database per port
+
+Shorten the intervals to compress time: --poll-interval 3 with 30 dashboards
+offers the same load as 300 dashboards at the real 30s.
+"""
+
+import argparse
+import http.client
+import importlib.util
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+from sqlalchemy import text
+
+from benchmarks.fleet import seed_database
+from benchmarks.manifests import write_manifest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+UPLOAD_FOLDER = os.path.join(REPO_ROOT, 'uploads')
+UPLOAD_PREFIX = 'loadtest-'
+WRITE_STATUSES = ['active', 'loading', 'discharge', 'paused']
+BUSY_METRIC = re.compile(r'^sqlite_busy_errors_total\{endpoint="([^"]*)"\} ([0-9.e+]+)$', re.MULTILINE)
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(int(round(q / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+class Recorder:
+    """Thread-safe latency and status samples per endpoint"""
+
+    def __init__(self, record_after):
+        self.record_after = record_after
+        self.samples = {}
+        self.lock = threading.Lock()
+
+    def add(self, endpoint, scheduled, seconds, status):
+        if scheduled < self.record_after:
+            return
+        with self.lock:
+            self.samples.setdefault(endpoint, []).append((seconds, status))
+
+    def summary(self, elapsed, busy):
+        endpoints = {}
+        for endpoint, samples in sorted(self.samples.items()):
+            latencies = sorted(seconds for seconds, _ in samples)
+            errors = sum(1 for _, status in samples if not 200 <= status < 300)
+            endpoints[endpoint] = {
+                'requests': len(samples),
+                'rps': len(samples) / elapsed,
+                'p50_ms': percentile(latencies, 50) * 1000,
+                'p95_ms': percentile(latencies, 95) * 1000,
+                'p99_ms': percentile(latencies, 99) * 1000,
+                'errors': errors,
+                'error_rate': errors / len(samples),
+                'sqlite_busy': busy.get(endpoint_rule(endpoint), 0) if busy is not None else None,
+            }
+        total = sum(e['requests'] for e in endpoints.values())
+        return {
+            'elapsed_s': elapsed,
+            'requests': total,
+            'rps': total / elapsed,
+            'error_rate': sum(e['errors'] for e in endpoints.values()) / total if total else 0,
+            'sqlite_busy': sum(busy.values()) if busy is not None else None,
+            'endpoints': endpoints,
+        }
+
+def endpoint_rule(endpoint):
+    """'PUT /api/ships/<int:ship_id>/progress' -> the Flask rule /metrics labels it with"""
+    return endpoint.split(' ', 1)[1]
+
+class Client:
+    """One keep-alive connection per virtual user, reopened after failures"""
+
+    def __init__(self, host, port, timeout):
+        self.host, self.port, self.timeout = host, port, timeout
+        self.conn = None
+
+    def request(self, method, path, body=None, headers=None):
+        """Returns (status, body bytes); status 0 means the connection failed"""
+        for attempt in range(2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self.conn.request(method, path, body=body, headers=headers or {})
+                response = self.conn.getresponse()
+                payload = response.read()
+                if response.getheader('Connection', '').lower() == 'close':
+                    self.close()
+                return response.status, payload
+            except (OSError, http.client.HTTPException):
+                self.close()
+                # A kept-alive connection the server already closed fails on first use; retry once
+                if attempt:
+                    return 0, b''
+        return 0, b''
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+def json_request(client, method, path, payload):
+    return client.request(method, path, json.dumps(payload), {'Content-Type': 'application/json'})
+
+def multipart_file(path, filename):
+    boundary = uuid.uuid4().hex
+    with open(path, 'rb') as f:
+        content = f.read()
+    body = (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+            f'Content-Type: application/pdf\r\n\r\n').encode() + content + f'\r\n--{boundary}--\r\n'.encode()
+    return body, {'Content-Type': f'multipart/form-data; boundary={boundary}'}
+
+class VirtualUser(threading.Thread):
+    """Runs step() every interval (with jitter) until the deadline"""
+
+    def __init__(self, client, recorder, interval, deadline, rng):
+        super().__init__(daemon=True)
+        self.client = client
+        self.recorder = recorder
+        self.interval = interval
+        self.deadline = deadline
+        self.rng = rng
+
+    def timed(self, endpoint, scheduled, call):
+        status, payload = call()
+        self.recorder.add(endpoint, scheduled, time.perf_counter() - scheduled, status)
+        return status, payload
+
+    def run(self):
+        scheduled = time.perf_counter() + self.rng.uniform(0, self.interval)
+        while scheduled < self.deadline:
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            self.step(scheduled)
+            scheduled += self.interval * self.rng.uniform(0.9, 1.1)
+        self.client.close()
+
+class Dashboard(VirtualUser):
+    def step(self, scheduled):
+        self.timed('GET /api/ships', scheduled, lambda: self.client.request('GET', '/api/ships'))
+
+class ShipScreen(VirtualUser):
+    def __init__(self, *args, ship_id, status_every):
+        super().__init__(*args)
+        self.ship_id = ship_id
+        self.status_every = status_every
+        self.progress = self.rng.randint(1, 50)
+        self.writes = 0
+
+    def step(self, scheduled):
+        # Stay below 100 so the ship never completes and leaves the live set
+        self.progress = self.progress % 99 + 1
+        self.writes += 1
+        self.timed('PUT /api/ships/<int:ship_id>/progress', scheduled, lambda: json_request(
+            self.client, 'PUT', f'/api/ships/{self.ship_id}/progress', {'progress': self.progress}))
+        if self.status_every and self.writes % self.status_every == 0:
+            self.timed('PUT /api/ships/<int:ship_id>/status', time.perf_counter(), lambda: json_request(
+                self.client, 'PUT', f'/api/ships/{self.ship_id}/status', {'status': self.rng.choice(WRITE_STATUSES)}))
+
+class Extractor(VirtualUser):
+    def __init__(self, *args, manifests):
+        super().__init__(*args)
+        self.manifests = manifests
+
+    def step(self, scheduled):
+        path = self.rng.choice(self.manifests)
+        body, headers = multipart_file(path, f'{UPLOAD_PREFIX}{uuid.uuid4().hex}.pdf')
+        status, payload = self.timed('POST /api/upload', scheduled,
+                                     lambda: self.client.request('POST', '/api/upload', body, headers))
+        if status != 200:
+            return
+        file_path = json.loads(payload)['file_path']
+        self.timed('POST /api/extract', time.perf_counter(),
+                   lambda: json_request(self.client, 'POST', '/api/extract', {'file_path': file_path}))
+
+def scrape_busy(host, port):
+    """sqlite_busy_errors_total by route, or None when /metrics is unavailable"""
+    status, payload = Client(host, port, 10).request('GET', '/metrics')
+    if status != 200:
+        return None
+    return {endpoint: float(value) for endpoint, value in BUSY_METRIC.findall(payload.decode())}
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def app_env(workdir, database_url, coalesce=False, shard=False):
+    """Environment for the app under test, with its databases and caches in workdir"""
+    env = dict(os.environ, DATABASE_URL=database_url, PROMETHEUS_MULTIPROC_DIR=os.path.join(workdir, 'metrics'),
+               PDF_INDEX_CACHE_DIR=os.path.join(workdir, 'page-index'), COALESCE_WRITES='1' if coalesce else '0',
+               SHARD_BY_PORT='1' if shard else '0')
+    # FLASK_ENV=development makes gunicorn.conf.py force a single reloading worker
+    env.pop('FLASK_ENV', None)
+    return env
+
+def start_server(workdir, env, worker_class, workers, threads):
+    """Start gunicorn with gunicorn.conf.py on a free port; returns (process, port)"""
+    port = free_port()
+    command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}',
+               '--access-logfile', '/dev/null', '--error-logfile', os.path.join(workdir, 'gunicorn.log')]
+    # Selected through gunicorn.conf.py's profile variables so it derives pool sizes as in production
+    env = dict(env, GUNICORN_WORKER_CLASS=worker_class, GUNICORN_WORKERS=str(workers), GUNICORN_THREADS=str(threads))
+    process = subprocess.Popen(command + ['main:app'], cwd=REPO_ROOT, env=env)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with {process.returncode}; see {workdir}/gunicorn.log')
+        if Client('127.0.0.1', port, 2).request('GET', '/health')[0] == 200:
+            return process, port
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError('gunicorn did not become healthy within 30s')
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+def worker_memory(master_pid):
+    """Mean RSS and PSS (shared pages split between sharers) of the master's workers, in MB (Linux only)"""
+    try:
+        with open(f'/proc/{master_pid}/task/{master_pid}/children') as f:
+            pids = f.read().split()
+        samples = []
+        for pid in pids:
+            with open(f'/proc/{pid}/smaps_rollup') as f:
+                values = dict(line.split()[:2] for line in f if line.startswith(('Rss:', 'Pss:')))
+            samples.append((int(values['Rss:']), int(values['Pss:'])))
+    except (OSError, KeyError):
+        return None
+    if not samples:
+        return None
+    return {'workers': len(samples),
+            'rss_mb': sum(rss for rss, _ in samples) / len(samples) / 1024,
+            'pss_mb': sum(pss for _, pss in samples) / len(samples) / 1024}
+
+def remove_uploads():
+    if os.path.isdir(UPLOAD_FOLDER):
+        for name in os.listdir(UPLOAD_FOLDER):
+            if name.startswith(UPLOAD_PREFIX):
+                os.remove(os.path.join(UPLOAD_FOLDER, name))
+
+def run_load(host, port, ship_ids, manifests, args):
+    """Drive one server for the configured duration and summarize"""
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    deadline = started + args.warmup + args.duration
+    recorder = Recorder(record_after=started + args.warmup)
+    busy_before = scrape_busy(host, port)
+
+    def client():
+        return Client(host, port, args.timeout)
+
+    def user_rng():
+        return random.Random(rng.random())
+
+    users = [Dashboard(client(), recorder, args.poll_interval, deadline, user_rng()) for _ in range(args.dashboards)]
+    users += [ShipScreen(client(), recorder, args.write_interval, deadline, user_rng(),
+                         ship_id=ship_ids[i % len(ship_ids)], status_every=args.status_every)
+              for i in range(args.screens)]
+    if manifests:
+        users += [Extractor(client(), recorder, args.extract_interval, deadline, user_rng(), manifests=manifests)
+                  for _ in range(args.extractors)]
+    for user in users:
+        user.start()
+    for user in users:
+        user.join()
+
+    busy_after = scrape_busy(host, port)
+    busy = None
+    if busy_before is not None and busy_after is not None:
+        busy = {endpoint: count - busy_before.get(endpoint, 0) for endpoint, count in busy_after.items()}
+    return recorder.summary(time.perf_counter() - started - args.warmup, busy)
+
+def run_config(worker_class, workers, manifests, args, coalesce=False, shard=False):
+    with tempfile.TemporaryDirectory() as workdir:
+        database_url = f"sqlite:///{os.path.join(workdir, 'loadtest.db')}"
+        engine = seed_database(database_url, args.ships, args.seed)
+        with engine.connect() as conn:
+            ship_ids = [row[0] for row in conn.execute(text("SELECT id FROM ship WHERE status != 'complete'"))]
+        engine.dispose()
+        env = app_env(workdir, database_url, coalesce, shard)
+        if shard:
+            # The fleet is seeded unsharded; move it to one database per port as an existing install would
+            cli_env = {k: v for k, v in env.items() if k != 'PROMETHEUS_MULTIPROC_DIR'}
+            subprocess.run([sys.executable, '-m', 'flask', '--app', 'main', 'shard-ships'], cwd=REPO_ROOT,
+                           env=cli_env, check=True, stdout=subprocess.DEVNULL)
+        process, port = start_server(workdir, env, worker_class, workers, args.threads)
+        try:
+            result = run_load('127.0.0.1', port, ship_ids, manifests, args)
+            result['worker_memory'] = worker_memory(process.pid)
+            return result
+        finally:
+            stop_server(process)
+            remove_uploads()
+
+def print_summary(label, result):
+    print(f"\n{label}: {result['requests']} requests in {result['elapsed_s']:.0f}s, {result['rps']:.1f} req/s, "
+          f"{result['error_rate'] * 100:.2f}% errors, sqlite busy {_count(result['sqlite_busy'])}")
+    memory = result.get('worker_memory')
+    if memory:
+        print(f"  {memory['workers']} workers, mean RSS {memory['rss_mb']:.1f}MB, PSS {memory['pss_mb']:.1f}MB")
+    print(f"  {'endpoint':<42} {'reqs':>7} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'err %':>6} {'busy':>5}")
+    for endpoint, e in result['endpoints'].items():
+        print(f"  {endpoint:<42} {e['requests']:>7} {e['rps']:>7.2f} {e['p50_ms']:>8.1f} {e['p95_ms']:>8.1f} "
+              f"{e['p99_ms']:>8.1f} {e['error_rate'] * 100:>6.2f} {_count(e['sqlite_busy']):>5}")
+
+def print_matrix(results):
+    print(f"\n{'configuration':<16} {'req/s':>7} {'err %':>6} {'busy':>5}  p95/p99 ms per endpoint")
+    for label, result in results.items():
+        latencies = '  '.join(f"{endpoint.split(' ')[0]} {endpoint_rule(endpoint).rsplit('/', 1)[-1]} "
+                              f"{e['p95_ms']:.0f}/{e['p99_ms']:.0f}" for endpoint, e in result['endpoints'].items())
+        print(f"{label:<16} {result['rps']:>7.1f} {result['error_rate'] * 100:>6.2f} "
+              f"{_count(result['sqlite_busy']):>5}  {latencies}")
+
+def _count(value):
+    return '-' if value is None else f'{value:.0f}'
+
+def available(worker_class):
+    module = {'gevent': 'gevent', 'eventlet': 'eventlet'}.get(worker_class)
+    return module is None or importlib.util.find_spec(module) is not None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--dashboards', type=int, default=20, help='master dashboards polling /api/ships')
+    parser.add_argument('--screens', type=int, default=10, help='ship-info screens writing progress/status')
+    parser.add_argument('--extractors', type=int, default=1, help='users uploading and extracting PDFs')
+    parser.add_argument('--poll-interval', type=float, default=30)
+    parser.add_argument('--write-interval', type=float, default=10)
+    parser.add_argument('--status-every', type=int, default=5, help='send a status change every Nth write (0: never)')
+    parser.add_argument('--extract-interval', type=float, default=60)
+    parser.add_argument('--pdf-pages', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=120, help='measured seconds')
+    parser.add_argument('--warmup', type=float, default=10, help='seconds run before measuring')
+    parser.add_argument('--ships', type=int, default=200, help='ships seeded into the database')
+    parser.add_argument('--worker-classes', default='sync', help='comma-separated gunicorn worker classes')
+    parser.add_argument('--workers', default='2', help='comma-separated worker counts')
+    parser.add_argument('--threads', type=int, default=4, help='threads per gthread worker')
+    parser.add_argument('--coalesce', default='0', help='comma-separated COALESCE_WRITES settings, e.g. 0,1')
+    parser.add_argument('--shard', default='0', help='comma-separated SHARD_BY_PORT settings, e.g. 0,1')
+    parser.add_argument('--timeout', type=float, default=60, help='client timeout per request')
+    parser.add_argument('--url', help='load an already running server instead of starting gunicorn')
+    parser.add_argument('--ship-ids', help='with --url: comma-separated ship ids for the screens')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', help='write results as JSON')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        manifests = []
+        if args.extractors:
+            manifests = [write_manifest(os.path.join(tmp, f'manifest_{seed}.pdf'), 'pdf', args.pdf_pages, seed)
+                         for seed in range(4)]
+
+        results = {}
+        if args.url:
+            if args.screens and not args.ship_ids:
+                parser.error('--url needs --ship-ids for the ship-info screens')
+            match = re.match(r'^https?://([^/:]+)(?::(\d+))?', args.url)
+            host, port = match.group(1), int(match.group(2) or 80)
+            ship_ids = [int(i) for i in args.ship_ids.split(',')] if args.ship_ids else []
+            try:
+                results[args.url] = run_load(host, port, ship_ids, manifests, args)
+            finally:
+                remove_uploads()
+            print_summary(args.url, results[args.url])
+        else:
+            for worker_class in args.worker_classes.split(','):
+                if not available(worker_class):
+                    print(f'Skipping {worker_class}: its library is not installed')
+                    continue
+                for workers in [int(w) for w in args.workers.split(',')]:
+                    for coalesce in [c == '1' for c in args.coalesce.split(',')]:
+                        for shard in [s == '1' for s in args.shard.split(',')]:
+                            label = (f'{worker_class}x{workers}'
+                                     + (f'x{args.threads}t' if worker_class == 'gthread' else '')
+                                     + ('+coalesce' if coalesce else '') + ('+shard' if shard else ''))
+                            print(f'Running {label} ...', flush=True)
+                            results[label] = run_config(worker_class, workers, manifests, args, coalesce, shard)
+                            print_summary(label, results[label])
+            if len(results) > 1:
+                print_matrix(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'settings': vars(args), 'results': results}, f, indent=2, sort_keys=True)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
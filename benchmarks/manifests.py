@@ -0,0 +1,166 @@
+"""
+Synthetic vessel manifests for benchmarking the file pipeline.
+
+Page 1 carries the header fields parse_maritime_data looks for (vessel,
+team, cargo, BRV/ZEE/SOU targets, ZEE compound details, TICO vans and
+wagons). Later pages alternate deck plans and VIN tables, each under a
+running title full of common words (vehicle, units, discharge, operation),
+with the odd zone summary or TICO line, the way long stowage plans do.
+Output is deterministic for a given seed.
+"""
+
+import csv
+import random
+
+LINES_PER_PAGE = 60
+CSV_ROWS_PER_PAGE = 50
+
+MAKES = [
+    ('MERCEDES-BENZ', 'WDD'), ('BMW', 'WBA'), ('LAND ROVER', 'SAL'),
+    ('ROLLS-ROYCE', 'SCA'), ('AUDI', 'WAU'), ('PORSCHE', 'WP0'),
+    ('MINI', 'WMW'), ('JAGUAR', 'SAJ'),
+]
+TERMINALS = ['BRV', 'ZEE', 'SOU']
+VIN_CHARS = 'ABCDEFGHJKLMNPRSTUVWXYZ0123456789'
+
+def header_lines(rng):
+    """Header page with every field group the parser extracts"""
+    lines = [
+        'VESSEL DISCHARGE PLAN',
+        f'Vessel Name: {rng.choice(["Atlantic Pioneer", "Grande Mare", "Morning Cara", "Tonsberg"])}',
+        'Vessel Type: Auto Carrier',
+        'Port: Colonel Island',
+        f'Operation Date: 2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}',
+        f'Berth Location: Berth {rng.randint(1, 3)}',
+        'Stevedoring Company: APS Stevedoring',
+        'Operation Type: Discharge + Loading',
+        'Operation Manager: John Smith',
+        'Auto Operations Team Lead Supervisor: Colby Chapman',
+        'Auto Operations Team Assistant Supervisor: Cole Bailey',
+        'High & Heavy Team Lead Supervisor: Spencer Wilkins',
+        'High & Heavy Team Assistant Supervisor: Bruce Banner',
+        f'Total Automobiles to Discharge: {rng.randint(800, 4000)}',
+        f'Heavy Equipment to Discharge: {rng.randint(10, 300)}',
+        f'Electric Vehicles: {rng.randint(0, 200)}',
+        f'Static Cargo Units: {rng.randint(0, 40)}',
+        'Cargo Brand/Type: Mercedes-Benz Premium',
+    ]
+    for make, _ in MAKES:
+        lines.append(f'{make.title()}: {rng.randint(20, 900)}')
+    lines += [
+        f'BRV Terminal: {rng.randint(100, 600)}',
+        f'ZEE Compound: {rng.randint(100, 600)}',
+        f'SOU Facility: {rng.randint(100, 600)}',
+        f'ZEE Automobiles: {rng.randint(50, 400)}',
+        f'ZEE Heavy Equipment: {rng.randint(0, 60)}',
+        f'ZEE Electric Vehicles: {rng.randint(0, 60)}',
+        f'ZEE Static Cargo: {rng.randint(0, 20)}',
+        'ZEE Cargo Type: Premium Automobiles',
+        f'ZEE Cargo Value: {rng.randint(100000, 900000)}',
+        'ZEE Priority: High',
+        f'Zone A: {rng.randint(100, 1500)}',
+        f'Zone B: {rng.randint(100, 1500)}',
+        f'Zone C: {rng.randint(100, 1500)}',
+        'Zone A Description: North Terminal Premium Processing',
+        f'Expected Rate: {rng.randint(100, 200)} cars/hour',
+        f'Total Drivers: {rng.randint(20, 60)}',
+        'Shift Start: 07:00',
+        'Shift End: 15:00',
+        f'Break Duration: {rng.choice([30, 45, 60])} minutes',
+        f'Number of Vans: {rng.randint(2, 8)}',
+        f'Number of Station Wagons: {rng.randint(1, 6)}',
+    ]
+    for i in range(1, 5):
+        lines.append(f'Van {i} ID: V{rng.randint(100, 999)}')
+        lines.append(f'Station Wagon {i} ID: W{rng.randint(100, 999)}')
+    return lines
+
+def vin(rng, prefix):
+    return prefix + ''.join(rng.choice(VIN_CHARS) for _ in range(14))
+
+def cargo_row(rng):
+    make, prefix = rng.choice(MAKES)
+    return [vin(rng, prefix), make, f'DECK {rng.randint(1, 12)}', f'LANE {rng.randint(1, 40)}', rng.choice(TERMINALS)]
+
+def body_lines(rng, page_num):
+    """A deck plan or VIN table page"""
+    if page_num % 2:
+        lines = [f'DECK PLAN - DECK {page_num % 12 + 1} - VEHICLE STOWAGE, UNITS PER LANE']
+        for lane in range(1, LINES_PER_PAGE - 1):
+            lines.append(f'LANE {lane:02d} | ' + ' '.join(rng.choice('XO.') for _ in range(40)))
+    else:
+        lines = ['DISCHARGE OPERATION - VEHICLE LIST (CARS AND HEAVY UNITS)',
+                 'VIN              MAKE            DECK     LANE     DEST']
+        for _ in range(LINES_PER_PAGE - 3):
+            lines.append('  '.join(cargo_row(rng)))
+    if page_num % 25 == 0:
+        lines.append(f'Zone B: {rng.randint(10, 200)}  TICO Van {page_num % 15 + 1} ID: V{rng.randint(100, 999)}')
+        lines.append(f'Shift note: {rng.randint(10, 90)} vehicles and {rng.randint(400, 900)} heavy equipment restowed')
+    return lines
+
+def generate_pages(pages, seed=7):
+    """Return a list of pages, each a list of text lines"""
+    rng = random.Random(seed)
+    return [header_lines(rng)] + [body_lines(rng, n) for n in range(2, pages + 1)]
+
+def write_txt(path, pages):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n\n'.join('\n'.join(lines) for lines in pages))
+
+def write_csv(path, pages, seed=7):
+    """Key/value header rows followed by one VIN row per cargo unit"""
+    rng = random.Random(seed)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        for line in pages[0]:
+            key, _, value = line.partition(':')
+            writer.writerow([key.strip(), value.strip()])
+        writer.writerow([])
+        writer.writerow(['VIN', 'Make', 'Deck', 'Lane', 'Terminal'])
+        for _ in range(CSV_ROWS_PER_PAGE * (len(pages) - 1)):
+            writer.writerow(cargo_row(rng))
+
+def _pdf_escape(line):
+    return line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+def write_pdf(path, pages):
+    """Minimal uncompressed PDF with one Helvetica text block per page"""
+    count = len(pages)
+    kids = ' '.join(f'{4 + 2 * i} 0 R' for i in range(count))
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        f'<< /Type /Pages /Kids [{kids}] /Count {count} >>'.encode(),
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+    ]
+    for i, lines in enumerate(pages):
+        content = 'BT /F1 8 Tf 11 TL 36 770 Td ' + ' '.join(f'({_pdf_escape(l)}) Tj T*' for l in lines) + ' ET'
+        stream = content.encode('latin-1')
+        objects.append(
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+            f'/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>'.encode()
+        )
+        objects.append(b'<< /Length %d >>\nstream\n' % len(stream) + stream + b'\nendstream')
+
+    out = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for num, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n' % num + body + b'\nendobj\n'
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    for offset in offsets:
+        out += b'%010d 00000 n \n' % offset
+    out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    with open(path, 'wb') as f:
+        f.write(out)
+
+WRITERS = {
+    'txt': lambda path, pages, seed: write_txt(path, pages),
+    'csv': write_csv,
+    'pdf': lambda path, pages, seed: write_pdf(path, pages),
+}
+
+def write_manifest(path, fmt, pages, seed=7):
+    """Generate a synthetic manifest of the given format and page count at path"""
+    WRITERS[fmt](path, generate_pages(pages, seed), seed)
+    return path
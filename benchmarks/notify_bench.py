@@ -0,0 +1,172 @@
+"""
+Push notification fan-out benchmark against a local mock push service.
+
+Starts an HTTP server standing in for the browser push services, registers
+--subscriptions devices through /api/notifications/subscribe, then changes
+ship statuses through PUT /api/ships/<id>/status. Each subscriber follows
+one ship or, for --fleet-fraction of them, every ship. A share of the
+endpoints answer 410 Gone (--gone-fraction) and a share fail with 503 a few
+times before accepting (--flaky-fraction). Every push takes --push-latency-ms.
+
+Reported:
+- status request latency, which should not grow with the number of
+  subscribers
+- time until the dispatcher has delivered, retried and pruned everything
+- push requests by endpoint kind
+- subscriptions left after pruning
+
+    python -m benchmarks.notify_bench --subscriptions 500 --updates 50
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.fleet import seed_database
+from src.main import create_app
+from src.models import db
+from src.models.notification import PushSubscription
+from src.services import notifications
+
+STATUSES = ['active', 'loading', 'discharge', 'paused']
+
+class MockPushService(ThreadingHTTPServer):
+    """Accepts pushes at /push/<mode>/<n>; modes: ok, gone, flaky (503 twice, then 201)"""
+
+    daemon_threads = True
+
+    def __init__(self, latency):
+        super().__init__(('127.0.0.1', 0), MockPushHandler)
+        self.latency = latency
+        self.received = Counter()
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+class MockPushHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        time.sleep(self.server.latency)
+        mode = self.path.split('/')[2]
+        with self.server.lock:
+            self.server.received[self.path] += 1
+            attempts = self.server.received[self.path]
+        if mode == 'gone':
+            status = 410
+        elif mode == 'flaky' and attempts % 3:
+            status = 503
+        else:
+            status = 201
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+def subscribe_all(client, service, count, ship_ids, fleet_fraction, gone_fraction, flaky_fraction, rng):
+    for n in range(count):
+        roll = rng.random()
+        mode = 'gone' if roll < gone_fraction else 'flaky' if roll < gone_fraction + flaky_fraction else 'ok'
+        response = client.post('/api/notifications/subscribe', json={
+            'subscription': {'endpoint': f'{service.url}/push/{mode}/{n}', 'keys': {'p256dh': 'x', 'auth': 'y'}},
+            'shipId': None if rng.random() < fleet_fraction else rng.choice(ship_ids),
+            'role': rng.choice(['manager', 'lead', None]),
+        })
+        if response.status_code not in (200, 201):
+            raise RuntimeError(f'subscribe answered {response.status_code}')
+
+def run(args):
+    rng = random.Random(args.seed)
+    notifications.PUSH_BACKOFF_SECONDS = args.backoff
+    # The mock service takes plain JSON on a loopback http endpoint
+    notifications.PUSH_TEST_MODE = True
+    service = MockPushService(args.push_latency_ms / 1000)
+    threading.Thread(target=service.serve_forever, daemon=True).start()
+    previous_url = os.environ.get('DATABASE_URL')
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = f"sqlite:///{os.path.join(tmp, 'notify.db')}"
+        seed_database(database_url, args.ships, args.seed).dispose()
+        os.environ['DATABASE_URL'] = database_url
+        try:
+            app = create_app()
+            with app.app_context():
+                db.create_all()
+                client = app.test_client()
+                ship_ids = list(range(1, args.ships + 1))
+                subscribe_all(client, service, args.subscriptions, ship_ids, args.fleet_fraction,
+                              args.gone_fraction, args.flaky_fraction, rng)
+                dispatcher = notifications.get_dispatcher(app)
+
+                latencies = []
+                started = time.perf_counter()
+                for _ in range(args.updates):
+                    ship_id = rng.choice(ship_ids)
+                    request_started = time.perf_counter()
+                    response = client.put(f'/api/ships/{ship_id}/status', json={'status': rng.choice(STATUSES)})
+                    latencies.append(time.perf_counter() - request_started)
+                    if response.status_code != 200:
+                        raise RuntimeError(f'status update answered {response.status_code}')
+                enqueued = time.perf_counter() - started
+                if not dispatcher.flush(args.timeout):
+                    print('Dispatcher did not finish within --timeout', file=sys.stderr)
+                drained = time.perf_counter() - started
+                remaining = PushSubscription.query.count()
+                db.engine.dispose()
+        finally:
+            if previous_url is None:
+                os.environ.pop('DATABASE_URL', None)
+            else:
+                os.environ['DATABASE_URL'] = previous_url
+    service.shutdown()
+
+    latencies.sort()
+    return {
+        'subscriptions': args.subscriptions,
+        'updates': args.updates,
+        'status_p50_ms': statistics.median(latencies) * 1000,
+        'status_p95_ms': latencies[int(len(latencies) * 0.95) - 1 if len(latencies) > 1 else 0] * 1000,
+        'enqueue_s': enqueued,
+        'drain_s': drained,
+        'pushes': dict(Counter(path.split('/')[2] for path in service.received.elements())),
+        'subscriptions_left': remaining,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--subscriptions', type=int, default=500)
+    parser.add_argument('--updates', type=int, default=50, help='status changes to make')
+    parser.add_argument('--ships', type=int, default=20, help='ships the subscribers follow')
+    parser.add_argument('--fleet-fraction', type=float, default=0.2, help='share of subscribers following every ship')
+    parser.add_argument('--gone-fraction', type=float, default=0.05, help='share of endpoints answering 410')
+    parser.add_argument('--flaky-fraction', type=float, default=0.05, help='share of endpoints failing twice first')
+    parser.add_argument('--push-latency-ms', type=float, default=20)
+    parser.add_argument('--backoff', type=float, default=0.2, help='first retry delay in seconds')
+    parser.add_argument('--timeout', type=float, default=120, help='seconds to wait for the dispatcher')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', help='write results as JSON')
+    args = parser.parse_args(argv)
+
+    result = run(args)
+    print(f"{result['updates']} status changes, {result['subscriptions']} subscriptions")
+    print(f"  status request   p50 {result['status_p50_ms']:.1f}ms  p95 {result['status_p95_ms']:.1f}ms")
+    print(f"  enqueued in {result['enqueue_s']:.2f}s, all pushes done after {result['drain_s']:.2f}s")
+    print('  push requests: ' + ', '.join(f'{mode} {count}' for mode, count in sorted(result['pushes'].items())))
+    print(f"  subscriptions left after pruning: {result['subscriptions_left']}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
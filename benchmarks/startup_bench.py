@@ -0,0 +1,72 @@
+"""
+Startup benchmark: what a fresh process pays before serving its first request.
+
+Each run is a new interpreter (so nothing is cached in sys.modules) that
+imports src.main, builds the WSGI app through main.py, and serves one
+request through the test client, timing each step. It also reports which heavy
+optional modules ended up imported without being used, since every one of
+them is paid for by each worker gunicorn starts or recycles.
+
+    python -m benchmarks.startup_bench --repeat 10
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ['pypdf', 'numpy', 'redis', 'gevent']
+
+PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+import src.main
+imported = time.perf_counter()
+from main import app
+built = time.perf_counter()
+response = app.test_client().get('/health')
+served = time.perf_counter()
+print(json.dumps({
+    'import_s': imported - started,
+    'build_s': built - imported,
+    'first_request_s': served - built,
+    'total_s': served - started,
+    'status': response.status_code,
+    'loaded': [name for name in %r if name in sys.modules],
+}))
+'''
+
+def probe(database_url):
+    env = dict(os.environ, DATABASE_URL=database_url, PYTHONPATH=REPO_ROOT)
+    output = subprocess.run([sys.executable, '-c', PROBE % HEAVY_MODULES], cwd=REPO_ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='write results as JSON')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = f"sqlite:///{os.path.join(tmp, 'startup.db')}"
+        runs = [probe(database_url) for _ in range(args.repeat)]
+
+    result = {metric: statistics.median(run[metric] for run in runs)
+              for metric in ('import_s', 'build_s', 'first_request_s', 'total_s')}
+    result['loaded'] = runs[-1]['loaded']
+    print(f"import {result['import_s'] * 1000:.1f}ms  build app {result['build_s'] * 1000:.1f}ms  first request {result['first_request_s'] * 1000:.1f}ms  "
+          f"total {result['total_s'] * 1000:.1f}ms  (median of {args.repeat})")
+    print(f"heavy modules loaded at startup: {', '.join(result['loaded']) or 'none'}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -20,19 +20,21 @@ echo "📦 Step 3: Installing production dependencies..."
 pip install -r requirements.txt
 
 echo "🗄️ Step 4: Initializing production database..."
-python -c "
-from src.main import app, db
-with app.app_context():
-    try:
-        db.create_all()
-        print('✅ Production database initialized successfully')
-    except Exception as e:
-        print(f'❌ Database initialization failed: {e}')
-"
+if flask --app main init-db; then
+    echo "✅ Production database initialized successfully"
+else
+    echo "❌ Database initialization failed"
+fi
+
+if flask --app main build-static; then
+    echo "✅ Static assets precompressed"
+else
+    echo "⚠️ Static asset build failed; assets will be served uncompressed"
+fi
 
 echo "🔍 Step 5: Running production health checks..."
 python -c "
-from src.main import app
+from main import app
 with app.test_client() as client:
     try:
         response = client.get('/health')
@@ -9,9 +9,29 @@ bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
 backlog = 2048
 
 # Worker processes
-workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = "sync"
-worker_connections = 1000
+# GUNICORN_WORKER_CLASS picks the profile:
+#   sync     one request per process; cpu_count*2+1 processes
+#   gthread  GUNICORN_THREADS requests per process on threads; cpu_count+1 processes
+#   gevent   up to worker_connections requests per process on greenlets, for many
+#            idle or slow clients (dashboards holding keep-alive connections); cpu_count processes
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+threads = int(os.environ.get('GUNICORN_THREADS', 8)) if worker_class == 'gthread' else 1
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+workers = int(os.environ.get('GUNICORN_WORKERS', {
+    'gthread': multiprocessing.cpu_count() + 1,
+    'gevent': multiprocessing.cpu_count(),
+}.get(worker_class, multiprocessing.cpu_count() * 2 + 1)))
+
+if worker_class == 'gevent':
+    # Patch before the app is preloaded so everything it imports sees cooperative sockets and threads
+    from gevent import monkey
+    monkey.patch_all()
+
+# One pooled connection per concurrent request. Greenlets beyond the gevent pool wait for a
+# connection instead of piling onto SQLite, which only ever admits one writer.
+os.environ.setdefault('DB_POOL_SIZE', str(threads if worker_class == 'gthread' else 10 if worker_class == 'gevent' else 1))
+if worker_class == 'gevent':
+    os.environ.setdefault('DB_MAX_OVERFLOW', '0')
 max_requests = 1000
 max_requests_jitter = 100
 preload_app = True
@@ -50,6 +70,46 @@ preload_app = True
 # Performance tuning
 worker_tmp_dir = "/dev/shm" if os.path.exists("/dev/shm") else None
 
+# Prometheus multiprocess mode: workers write metric samples here and /metrics
+# aggregates them. This file is read before the app (and prometheus_client) is
+# preloaded, so the directory is set up here; a previous run's samples are removed
+# in on_starting, which unlike this file is not run again on a SIGHUP reload.
+metrics_dir = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR',
+    os.path.join("/dev/shm" if os.path.exists("/dev/shm") else "/tmp", "stevedores-metrics")
+)
+os.makedirs(metrics_dir, exist_ok=True)
+
+def on_starting(server):
+    # Keep only the samples the preloaded app has already written from this master
+    own = f"_{os.getpid()}.db"
+    for name in os.listdir(metrics_dir):
+        if not name.endswith(own):
+            os.remove(os.path.join(metrics_dir, name))
+    # Create missing tables once, in the master, instead of on every app import
+    from src.main import create_app, init_db
+    from src.services import prefork, static_assets
+    app = server.app.wsgi() if server.cfg.preload_app else create_app()
+    init_db(app)
+    # Compress static files once here so workers only ever send precompressed bytes
+    written = static_assets.build(app.static_folder)
+    if written:
+        server.log.info("Wrote %d precompressed static files", written)
+    if server.cfg.preload_app and prefork.WARMUP:
+        prefork.warm_up(app)
+        server.log.info("Pre-fork warm-up done")
+
+def post_fork(server, worker):
+    # Never let a worker reuse database connections inherited from the master
+    if server.cfg.preload_app:
+        from src.services import prefork
+        prefork.after_fork(server.app.wsgi())
+
+def child_exit(server, worker):
+    from src.services import metrics, pattern_stats
+    metrics.mark_process_dead(worker.pid)
+    pattern_stats.retire(worker.pid)
+
 # Development vs Production
 if os.environ.get('FLASK_ENV') == 'development':
     reload = True
@@ -5,18 +5,17 @@ Railway-compatible deployment configuration.
 """
 
 import os
-import sys
 
-# Add the current directory to the Python path
-sys.path.insert(0, os.path.dirname(__file__))
+from src.main import create_app, init_db
 
-# Import the Flask app from the src directory
-from src.main import app
+# WSGI entry point (gunicorn main:app); tables are created by init_db, not here
+app = create_app()
 
 # Railway deployment configuration
 if __name__ == '__main__':
     # Get port from environment variable (Railway sets PORT automatically)
     port = int(os.environ.get('PORT', 5000))
     debug = os.environ.get('FLASK_ENV') != 'production'
-    
+    init_db(app)
+
     app.run(debug=debug, host='0.0.0.0', port=port)
\ No newline at end of file
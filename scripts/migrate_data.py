@@ -1,17 +1,17 @@
 import json
 import os
-import sys
 from datetime import datetime
 
-# Add project root to Python path
-project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
-if project_root not in sys.path:
-    sys.path.insert(0, project_root)
-
-from src.main import app, db
+from src.main import create_app, init_db
+from src.models import db
 from src.models.ship import Ship
 
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
 def migrate_data():
+    # Run from the project root: python -m scripts.migrate_data
+    app = create_app()
+    init_db(app)
     with app.app_context():
         # Load data from JSON file
         json_file_path = os.path.join(project_root, 'database', 'ships.json')
@@ -1,26 +1,34 @@
 #!/usr/bin/env python3
 """
 Main Flask application for the Maritime Dashboard.
+
+Importing this module has no side effects: create_app() builds an app without
+touching the database, and tables are created by init_db(), which runs once
+in the gunicorn master (gunicorn.conf.py), from `flask --app main init-db`,
+or before the development server starts.
 """
 
 import os
-import sys
-from flask import Flask, send_from_directory, jsonify, redirect
+import click
+from flask import Flask, jsonify, redirect
 from flask_cors import CORS
 
-# Add parent directory to path for imports
-current_dir = os.path.dirname(os.path.abspath(__file__))
-parent_dir = os.path.dirname(current_dir)
-if parent_dir not in sys.path:
-    sys.path.insert(0, parent_dir)
-
 # Import models and routes
 from src.models import db
 from src.models.user import User
 from src.models.ship import Ship
+from src.models.notification import PushSubscription
+from src.models.telemetry import ClientEvent
+from src.models.idempotency import IdempotencyRecord
+from src.models.shard import Shard, ShipShard
 from src.routes.user import user_bp
 from src.routes.file_processor import file_processor_bp
 from src.routes.ships import ships_bp
+from src.routes.admin import admin_bp
+from src.routes.metrics import metrics_bp
+from src.routes.notifications import notifications_bp
+from src.routes.telemetry import telemetry_bp
+from src.services import cache, idempotency, metrics, profiler, shards, sql_trace, static_assets
 
 def create_app():
     """Create and configure the Flask application."""
@@ -35,6 +43,23 @@ def create_app():
     app.register_blueprint(user_bp, url_prefix='/api')
     app.register_blueprint(file_processor_bp)
     app.register_blueprint(ships_bp)
+    app.register_blueprint(admin_bp)
+    app.register_blueprint(metrics_bp)
+    app.register_blueprint(notifications_bp)
+    app.register_blueprint(telemetry_bp)
+
+    # Request, SQL and extraction metrics for /metrics
+    metrics.init_app(app)
+    # Per-request SQL counts, slow-statement and N+1 logging, Server-Timing headers
+    sql_trace.init_app(app)
+    # Sampled request profiling, only hooked in when PROFILE_DIR is set
+    profiler.init_app(app)
+    # Idempotency-Key records written in the same transaction as the write they guard
+    idempotency.init_app(app)
+    # Hashed, precompressed /static files and ETag-validated HTML shells
+    static_assets.init_app(app)
+    # Shared response cache; only checks its Redis configuration here
+    cache.init_app(app)
 
     # Create database directory if it doesn't exist
     db_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database')
@@ -43,10 +68,36 @@ def create_app():
     # Database configuration with absolute path
     app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', f"sqlite:///{os.path.join(db_dir, 'app.db')}")
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Pool sized to the worker's concurrency; gunicorn.conf.py derives DB_POOL_SIZE from its threads
+    if os.environ.get('DB_POOL_SIZE'):
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+            'pool_size': int(os.environ['DB_POOL_SIZE']),
+            'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 2)),
+            'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        }
     db.init_app(app)
-
-    with app.app_context():
-        db.create_all()
+    # Ships in one database per port when SHARD_BY_PORT is set
+    shards.init_app(app)
+
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Create any database tables that do not exist yet."""
+        init_db(app)
+        click.echo('Database tables created')
+
+    @app.cli.command('build-static')
+    def build_static_command():
+        """Write precompressed copies of the static assets."""
+        written = static_assets.build(app.static_folder)
+        click.echo(f'{written} compressed static files written to {static_assets.BUILD_DIR}')
+
+    @app.cli.command('shard-ships')
+    def shard_ships_command():
+        """Move ships stored before sharding was enabled to their ports' databases."""
+        if not shards.ENABLED:
+            raise click.ClickException('Set SHARD_BY_PORT=1 to shard ships by port')
+        init_db(app)
+        click.echo(f'{shards.migrate(app)} ships moved to their port shards')
 
     # Route definitions
     @app.route('/')
@@ -55,23 +106,23 @@ def create_app():
 
     @app.route('/wizard')
     def wizard():
-        return send_from_directory(app.static_folder, 'index.html')
+        return static_assets.send_shell('index.html')
 
     @app.route('/master')
     def master_dashboard():
-        return send_from_directory(app.static_folder, 'master-dashboard.html')
+        return static_assets.send_shell('master-dashboard.html')
 
     @app.route('/calendar')
     def calendar_view():
-        return send_from_directory(app.static_folder, 'calendar.html')
+        return static_assets.send_shell('calendar.html')
 
     @app.route('/analytics')
     def analytics_view():
-        return send_from_directory(app.static_folder, 'analytics.html')
+        return static_assets.send_shell('analytics.html')
 
     @app.route('/ship-info')
     def ship_info():
-        return send_from_directory(app.static_folder, 'ship-info.html')
+        return static_assets.send_shell('ship-info.html')
 
     @app.route('/health')
     def health_check():
@@ -87,9 +138,18 @@ def create_app():
         return jsonify({'error': 'Internal server error'}), 500
 
     return app
-# Create the app instance
-app = create_app()
+
+def init_db(app):
+    """Create missing tables, then drop the connection so forked workers never share it"""
+    with app.app_context():
+        db.create_all()
+        db.engine.dispose()
+    shards.init_db(app)
 
 if __name__ == '__main__':
+    # python -m src.main
+    app = create_app()
+    init_db(app)
+    static_assets.build(app.static_folder)
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=True)
@@ -0,0 +1,17 @@
+from . import db
+from sqlalchemy import Integer, String, DateTime, Text
+
+class IdempotencyRecord(db.Model):
+    """The stored outcome of a write made with an Idempotency-Key header"""
+    key = db.Column(String(255), primary_key=True)
+    # sha256 of method, path and body; a reused key with a different request is refused
+    fingerprint = db.Column(String(64), nullable=False)
+    # Null until the response is recorded, right after the write commits
+    status_code = db.Column(Integer)
+    body = db.Column(Text)
+    content_type = db.Column(String(100))
+    created_at = db.Column(DateTime, nullable=False)
+    expires_at = db.Column(DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<IdempotencyRecord {self.key}>'
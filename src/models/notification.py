@@ -0,0 +1,24 @@
+from . import db
+from sqlalchemy import Integer, String, DateTime
+
+class PushSubscription(db.Model):
+    id = db.Column(Integer, primary_key=True)
+    endpoint = db.Column(String, unique=True, nullable=False)
+    p256dh = db.Column(String)
+    auth = db.Column(String)
+    # Null ship_id follows every ship; null role receives notifications for every role
+    ship_id = db.Column(Integer)
+    role = db.Column(String(40))
+    user_agent = db.Column(String)
+    # Consecutive deliveries that failed after all retries; the subscription is pruned at PUSH_MAX_FAILURES
+    failures = db.Column(Integer, default=0, nullable=False)
+    created_at = db.Column(DateTime, default=db.func.current_timestamp())
+
+    __table_args__ = (db.Index('ix_push_subscription_ship_role', 'ship_id', 'role'),)
+
+    def subscription_info(self):
+        """The PushSubscription JSON shape the browser produced"""
+        return {'endpoint': self.endpoint, 'keys': {'p256dh': self.p256dh, 'auth': self.auth}}
+
+    def __repr__(self):
+        return f'<PushSubscription {self.endpoint}>'
@@ -0,0 +1,20 @@
+from . import db
+from sqlalchemy import Integer, String
+
+class Shard(db.Model):
+    """A database holding the ships of one port, when ships are sharded by port"""
+    id = db.Column(String(80), primary_key=True)
+    port = db.Column(String)
+
+    def __repr__(self):
+        return f'<Shard {self.id}>'
+
+class ShipShard(db.Model):
+    """The shard each ship lives in; inserting here allocates ship ids unique across shards"""
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    ship_id = db.Column(Integer, primary_key=True)
+    shard = db.Column(String(80), nullable=False)
+
+    def __repr__(self):
+        return f'<ShipShard {self.ship_id} {self.shard}>'
@@ -0,0 +1,20 @@
+from . import db
+from sqlalchemy import Integer, String, DateTime, Float, Text
+
+class ClientEvent(db.Model):
+    """Append-only client telemetry; rows are bulk inserted by src.services.telemetry and never updated"""
+    id = db.Column(Integer, primary_key=True)
+    # page_load, server_response, interaction, error, session, ... and the page or event name within it
+    kind = db.Column(String(40), nullable=False)
+    name = db.Column(String(200))
+    # Milliseconds for timings, the raw number for anything else
+    value = db.Column(Float)
+    page = db.Column(String(200))
+    occurred_at = db.Column(DateTime)
+    received_at = db.Column(DateTime, nullable=False)
+    data = db.Column(Text)
+
+    __table_args__ = (db.Index('ix_client_event_kind_received', 'kind', 'received_at'),)
+
+    def __repr__(self):
+        return f'<ClientEvent {self.kind} {self.name}>'
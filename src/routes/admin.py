@@ -0,0 +1,48 @@
+from flask import Blueprint, request, jsonify, send_from_directory
+import hmac
+import os
+from src.services import pattern_stats, profiler
+
+admin_bp = Blueprint('admin', __name__)
+
+# Admin endpoints stay closed until a token is configured
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+def admin_authorized():
+    """Check the X-Admin-Token header against ADMIN_TOKEN"""
+    supplied = request.headers.get('X-Admin-Token', '')
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(supplied, ADMIN_TOKEN)
+
+@admin_bp.before_request
+def require_admin_token():
+    if not admin_authorized():
+        return jsonify({'error': 'Admin token required'}), 403
+
+@admin_bp.route('/api/admin/pattern-stats', methods=['GET'])
+def get_pattern_stats():
+    """Per-pattern extraction stats merged across workers"""
+    if not pattern_stats.enabled():
+        return jsonify({'error': 'Pattern instrumentation is disabled; set EXTRACTION_STATS_DIR'}), 404
+    return jsonify(pattern_stats.merged_stats())
+
+@admin_bp.route('/api/admin/pattern-stats', methods=['DELETE'])
+def reset_pattern_stats():
+    """Clear collected pattern stats in every worker"""
+    if not pattern_stats.enabled():
+        return jsonify({'error': 'Pattern instrumentation is disabled; set EXTRACTION_STATS_DIR'}), 404
+    pattern_stats.reset()
+    return jsonify({'message': 'Pattern stats reset successfully'})
+
+@admin_bp.route('/api/admin/profiles', methods=['GET'])
+def get_profiles():
+    """Request profiles on disk, newest first"""
+    if not profiler.enabled():
+        return jsonify({'error': 'Profiling is disabled; set PROFILE_DIR'}), 404
+    return jsonify(profiler.list_profiles())
+
+@admin_bp.route('/api/admin/profiles/<name>', methods=['GET'])
+def download_profile(name):
+    """One profile file (collapsed stacks or pstats)"""
+    if not profiler.enabled():
+        return jsonify({'error': 'Profiling is disabled; set PROFILE_DIR'}), 404
+    return send_from_directory(os.path.abspath(profiler.PROFILE_DIR), name, as_attachment=True)
@@ -1,9 +1,12 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 import os
 import re
 import json
+import time
 from werkzeug.utils import secure_filename
-from pypdf import PdfReader
+from src.services import admission, cache, chunked_uploads, metrics, offload, pattern_stats, pdf_index
+from src.services.csv_ingest import ingest_csv, sniff_encoding
+from src.services.templates import match_template
 
 file_processor_bp = Blueprint('file_processor', __name__)
 
@@ -12,54 +15,145 @@ UPLOAD_FOLDER = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '.
 ALLOWED_EXTENSIONS = {'txt', 'pdf', 'csv'}
 MAX_FILE_SIZE = 16 * 1024 * 1024  # 16MB
 
+# CPU seconds a single document may spend in pattern extraction (0 disables the limit)
+EXTRACTION_CPU_BUDGET = float(os.environ.get('EXTRACTION_CPU_BUDGET', 5))
+# Under a budget, longer texts are scanned this many characters at a time so one pattern cannot overrun it;
+# each window reaches SEGMENT_OVERLAP further so matches straddling its end are seen whole
+SEGMENT_CHARS = int(os.environ.get('EXTRACTION_SEGMENT_CHARS', 64 * 1024))
+SEGMENT_OVERLAP = 4096
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 def extract_text_from_pdf(file_path):
     """Extract text from PDF file - processes all pages"""
     try:
-        with open(file_path, 'rb') as file:
-            pdf_reader = PdfReader(file)
-            text = ""
-            total_pages = len(pdf_reader.pages)
-
-            for page_num, page in enumerate(pdf_reader.pages, 1):
-                page_text = page.extract_text() or ""
-                # Add page separator for better parsing
-                text += f"\n=== PAGE {page_num} OF {total_pages} ===\n"
-                text += page_text
-                text += f"\n=== END PAGE {page_num} ===\n"
-
-        return text
+        # Page separators help parsing across page boundaries
+        return pdf_index.join_pages(pdf_index.extract_pages(file_path))
     except Exception as e:
         return f"Error reading PDF: {str(e)}"
 
 def extract_data_from_csv(file_path):
-    """Extract data from CSV file"""
+    """Extract raw text from CSV file, decoded once with a sniffed encoding"""
     try:
-        # Try UTF-8 first, fallback to other encodings
-        for encoding in ['utf-8', 'latin-1', 'cp1252']:
-            try:
-                with open(file_path, 'r', encoding=encoding) as file:
-                    text = file.read()
-                return text
-            except UnicodeDecodeError:
-                continue
-        return "Error: Unable to decode file with supported encodings"
+        with open(file_path, 'r', encoding=sniff_encoding(file_path), errors='replace') as file:
+            return file.read()
     except Exception as e:
         return f"Error reading CSV file: {str(e)}"
 
-def parse_maritime_data(text):
-    """Parse maritime-specific data from extracted text - handles multi-page documents"""
+class ExtractionBudgetExceeded(Exception):
+    """Raised when a document has used up its extraction CPU budget"""
+
+class ExtractionBudget:
+    """Per-document CPU time budget, measured on the calling thread"""
+
+    def __init__(self, seconds=None):
+        self.seconds = EXTRACTION_CPU_BUDGET if seconds is None else seconds
+        self.started = time.thread_time()
+        self.exhausted = False
+
+    def check(self):
+        if self.seconds and time.thread_time() - self.started > self.seconds:
+            self.exhausted = True
+            raise ExtractionBudgetExceeded()
+
+class PatternMatcher:
+    """Case-insensitive regex helpers with an optional budget and per-pattern stats"""
+
+    def __init__(self, budget=None, stats=None):
+        self.budget = budget
+        self.stats = stats
+        self.group = None
+
+    def search(self, pattern, text):
+        return self._run(self._search, pattern, text)
+
+    def findall(self, pattern, text):
+        return self._run(self._findall, pattern, text)
+
+    def _run(self, func, pattern, text):
+        if self.budget:
+            self.budget.check()
+        if self.stats is None:
+            return func(re.compile(pattern, re.IGNORECASE), text)
+        started = time.perf_counter()
+        result = func(re.compile(pattern, re.IGNORECASE), text)
+        self.stats.record(pattern, self.group, time.perf_counter() - started, bool(result))
+        return result
+
+    def _segmented(self, text):
+        """Whether text is long enough that a budgeted scan has to go window by window"""
+        return bool(self.budget and self.budget.seconds) and len(text) > SEGMENT_CHARS + SEGMENT_OVERLAP
+
+    def _search(self, compiled, text):
+        if not self._segmented(text):
+            return compiled.search(text)
+        for start in range(0, len(text), SEGMENT_CHARS):
+            self.budget.check()
+            end = start + SEGMENT_CHARS
+            match = compiled.search(text, start, min(end + SEGMENT_OVERLAP, len(text)))
+            # A match starting in the overlap is found again, with more context, by the next window
+            if match and (match.start() < end or end + SEGMENT_OVERLAP >= len(text)):
+                return match
+        return None
+
+    def _findall(self, compiled, text):
+        if not self._segmented(text):
+            return compiled.findall(text)
+        results = []
+        position = 0
+        while position < len(text):
+            self.budget.check()
+            end = position + SEGMENT_CHARS
+            window_end = min(end + SEGMENT_OVERLAP, len(text))
+            resume = end
+            for match in compiled.finditer(text, position, window_end):
+                if match.start() >= end and window_end < len(text):
+                    break
+                self.budget.check()
+                groups = match.groups('')
+                results.append(match.group(0) if not groups else groups[0] if len(groups) == 1 else groups)
+                resume = max(end, match.end())
+            if window_end == len(text):
+                break
+            position = resume
+        return results
+
+def parse_maritime_data(text, budget=None, stats=None, page_index=None, fields=None):
+    """Parse maritime-specific data from extracted text - handles multi-page documents
+
+    When an ExtractionBudget is given, parsing stops once it is exhausted and
+    the fields found so far are returned; check budget.exhausted afterwards.
+    A PatternStats collects per-pattern timings and the fields each resolved.
+    With a PageIndex, each field group only reads the pages carrying its
+    keywords instead of the whole text. Given a list of fields, only the
+    groups producing them run and only those fields (plus the ones they are
+    derived from) are returned.
+    """
     data = {}
+    needed, groups = resolve_fields(fields) if fields is not None else (None, None)
+    if stats is not None:
+        stats.watch(data)
+    try:
+        _parse_fields(text, data, PatternMatcher(budget, stats), page_index, groups)
+    except ExtractionBudgetExceeded:
+        pass
+    if stats is not None:
+        stats.settle()
+    if needed is not None:
+        data = {field: value for field, value in data.items() if field in needed}
+    return data
 
-    # Clean up the text for better parsing across page boundaries
+def clean_extracted_text(text):
+    """Remove page markers and collapse whitespace so patterns can span page boundaries"""
     # Remove page markers but keep the content
     clean_text = re.sub(r'=== PAGE \d+ OF \d+ ===\n?', ' ', text)
     clean_text = re.sub(r'=== END PAGE \d+ ===\n?', ' ', clean_text)
     # Normalize whitespace
-    clean_text = re.sub(r'\s+', ' ', clean_text)
+    return re.sub(r'\s+', ' ', clean_text)
 
+def _parse_vessel_fields(text, clean_text, data, matcher):
+    """Vessel identity, port, date, company and operation type"""
     # More comprehensive vessel name patterns
     vessel_patterns = [
         r'vessel\s*name[:\s\-=]+([A-Za-z0-9\s\-\.]+)',
@@ -76,7 +170,7 @@ def parse_maritime_data(text):
 
     for pattern in vessel_patterns:
         # Search all occurrences, not just the first one
-        matches = re.findall(pattern, clean_text, re.IGNORECASE)
+        matches = matcher.findall(pattern, clean_text)
         if matches:
             # Take the first match that looks like a valid vessel name
             for match in matches:
@@ -98,7 +192,7 @@ def parse_maritime_data(text):
     ]
 
     for pattern in vessel_type_patterns:
-        matches = re.findall(pattern, clean_text, re.IGNORECASE)
+        matches = matcher.findall(pattern, clean_text)
         if matches:
             for match in matches:
                 vessel_type = str(match).strip().lower()
@@ -134,7 +228,7 @@ def parse_maritime_data(text):
     ]
 
     for pattern in port_patterns:
-        matches = re.findall(pattern, clean_text, re.IGNORECASE)
+        matches = matcher.findall(pattern, clean_text)
         if matches:
             for match in matches:
                 if isinstance(match, tuple):
@@ -149,7 +243,7 @@ def parse_maritime_data(text):
                 break
         else:
             # Check for direct matches
-            match = re.search(pattern, clean_text, re.IGNORECASE)
+            match = matcher.search(pattern, clean_text)
             if match:
                 if 'colonel' in match.group(0).lower():
                     data['port'] = 'Colonel Island'
@@ -170,7 +264,7 @@ def parse_maritime_data(text):
     ]
 
     for pattern in date_patterns:
-        matches = re.findall(pattern, clean_text, re.IGNORECASE)
+        matches = matcher.findall(pattern, clean_text)
         if matches:
             for date_str in matches:
                 if isinstance(date_str, tuple):
@@ -200,7 +294,7 @@ def parse_maritime_data(text):
     ]
 
     for pattern in company_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
+        match = matcher.search(pattern, text)
         if match:
             if 'aps' in match.group(0).lower():
                 data['company'] = 'APS Stevedoring'
@@ -212,6 +306,33 @@ def parse_maritime_data(text):
                 data['company'] = match.group(1).strip() if match.groups() else match.group(0).strip()
             break
 
+    # Enhanced operation type patterns
+    operation_patterns = [
+        r'operation[:\s\-=]+(discharge|loading|discharge\s*\+\s*loading|discharge\s*and\s*loading)',
+        r'(discharge\s*only|loading\s*only|discharge\s*and\s*loading)',
+        r'type\s*of\s*operation[:\s\-=]+(discharge|loading|both)',
+        r'operation\s*type[:\s\-=]+(discharge|loading|both)',
+        r'work\s*type[:\s\-=]+(discharge|loading|both)',
+        r'(discharge|loading|both)\s*operation',
+        r'cargo\s*operation[:\s\-=]+(discharge|loading|both)'
+    ]
+
+    for pattern in operation_patterns:
+        match = matcher.search(pattern, clean_text)
+        if match:
+            op_type = match.group(1).lower() if match.groups() else match.group(0).lower()
+            if 'discharge' in op_type and ('loading' in op_type or 'both' in op_type or '+' in op_type):
+                data['operationType'] = 'Discharge + Loading'
+            elif 'discharge' in op_type:
+                data['operationType'] = 'Discharge Only'
+            elif 'loading' in op_type:
+                data['operationType'] = 'Loading Only'
+            elif 'both' in op_type:
+                data['operationType'] = 'Discharge + Loading'
+            break
+
+def _parse_cargo_fields(text, clean_text, data, matcher):
+    """Discharge cargo counts, brand breakdown and cargo type"""
     # Vehicle count patterns - search all pages with more specific patterns
     vehicle_patterns = [
         r'total\s*automobiles?[:\s]+(\d+)',
@@ -220,13 +341,13 @@ def parse_maritime_data(text):
         r'automobiles?[:\s]+(\d+)',
         r'cars?[:\s]+(\d+)',
         r'units?[:\s]+(\d+)',
-        r'(\d+)\s*automobiles?',
-        r'(\d+)\s*vehicles?',
-        r'(\d+)\s*cars?'
+        r'(?<!\d)(\d+)\s*automobiles?',
+        r'(?<!\d)(\d+)\s*vehicles?',
+        r'(?<!\d)(\d+)\s*cars?'
     ]
 
     for pattern in vehicle_patterns:
-        matches = re.findall(pattern, clean_text, re.IGNORECASE)
+        matches = matcher.findall(pattern, clean_text)
         if matches:
             # Take the largest number found (likely the total)
             numbers = [int(match) for match in matches if match.isdigit()]
@@ -244,12 +365,12 @@ def parse_maritime_data(text):
         r'hh[:\s]+(\d+)',
         r'high\s*&\s*heavy[:\s]+(\d+)',
         r'high\s*and\s*heavy[:\s]+(\d+)',
-        r'(\d+)\s*heavy\s*equipment',
+        r'(?<!\d)(\d+)\s*heavy\s*equipment',
         r'equipment\s*units?[:\s]+(\d+)'
     ]
 
     for pattern in heavy_equipment_patterns:
-        matches = re.findall(pattern, clean_text, re.IGNORECASE)
+        matches = matcher.findall(pattern, clean_text)
         if matches:
             numbers = [int(match) for match in matches if match.isdigit()]
             if numbers:
@@ -267,37 +388,71 @@ def parse_maritime_data(text):
     }
 
     for brand, pattern in brand_patterns.items():
-        match = re.search(pattern, text, re.IGNORECASE)
+        match = matcher.search(pattern, text)
         if match:
             count = match.group(1) or match.group(2) if match.groups() else match.group(0)
             if count and count.isdigit():
                 data[f'{brand.lower()}Count'] = int(count)
 
-    # Enhanced operation type patterns
-    operation_patterns = [
-        r'operation[:\s\-=]+(discharge|loading|discharge\s*\+\s*loading|discharge\s*and\s*loading)',
-        r'(discharge\s*only|loading\s*only|discharge\s*and\s*loading)',
-        r'type\s*of\s*operation[:\s\-=]+(discharge|loading|both)',
-        r'operation\s*type[:\s\-=]+(discharge|loading|both)',
-        r'work\s*type[:\s\-=]+(discharge|loading|both)',
-        r'(discharge|loading|both)\s*operation',
-        r'cargo\s*operation[:\s\-=]+(discharge|loading|both)'
+    # Vehicle brand patterns (additional brands)
+    brand_patterns = [
+        r'audi[:\s]+(\d+)',
+        r'porsche[:\s]+(\d+)',
+        r'mini[:\s]+(\d+)',
+        r'jaguar[:\s]+(\d+)',
     ]
 
-    for pattern in operation_patterns:
-        match = re.search(pattern, clean_text, re.IGNORECASE)
+    for i, pattern in enumerate(brand_patterns):
+        match = matcher.search(pattern, text)
         if match:
-            op_type = match.group(1).lower() if match.groups() else match.group(0).lower()
-            if 'discharge' in op_type and ('loading' in op_type or 'both' in op_type or '+' in op_type):
-                data['operationType'] = 'Discharge + Loading'
-            elif 'discharge' in op_type:
-                data['operationType'] = 'Discharge Only'
-            elif 'loading' in op_type:
-                data['operationType'] = 'Loading Only'
-            elif 'both' in op_type:
-                data['operationType'] = 'Discharge + Loading'
+            if i == 0:
+                data['audi'] = match.group(1).strip()
+            elif i == 1:
+                data['porsche'] = match.group(1).strip()
+            elif i == 2:
+                data['mini'] = match.group(1).strip()
+            elif i == 3:
+                data['jaguar'] = match.group(1).strip()
+
+    # Additional cargo fields
+    electric_patterns = [
+        r'electric\s*vehicles?[:\s]+(\d+)',
+        r'ev[:\s]+(\d+)',
+        r'(?<!\d)(\d+)\s*electric\s*vehicles?'
+    ]
+
+    for pattern in electric_patterns:
+        match = matcher.search(pattern, text)
+        if match:
+            data['electricVehicles'] = match.group(1).strip()
+            break
+
+    static_cargo_patterns = [
+        r'static\s*cargo[:\s]+(\d+)',
+        r'static\s*cargo\s*units?[:\s]+(\d+)',
+        r'(?<!\d)(\d+)\s*static\s*cargo'
+    ]
+
+    for pattern in static_cargo_patterns:
+        match = matcher.search(pattern, text)
+        if match:
+            data['staticCargo'] = match.group(1).strip()
             break
 
+    cargo_type_patterns = [
+        r'cargo\s*brand[/\s]*type[:\s]+([A-Za-z\s\-]+)',
+        r'cargo\s*type[:\s]+([A-Za-z\s\-]+)',
+        r'brand[/\s]*type[:\s]+([A-Za-z\s\-]+)'
+    ]
+
+    for pattern in cargo_type_patterns:
+        match = matcher.search(pattern, text)
+        if match:
+            data['cargoType'] = match.group(1).strip()
+            break
+
+def _parse_team_fields(text, clean_text, data, matcher):
+    """Stevedore team leads, assistants and operation manager"""
     # Team assignment patterns
     # Auto Operations Team
     auto_lead_patterns = [
@@ -305,12 +460,12 @@ def parse_maritime_data(text):
         r'auto\s*operations?[:\s]*lead[:\s]+([A-Za-z\s]+)',
         r'lead\s*supervisor[:\s]+([A-Za-z\s]+)',
         r'colby\s+chapman',
-        r'auto.*lead.*([A-Za-z\s]+chapman)',
-        r'auto.*([A-Za-z\s]*colby[A-Za-z\s]*)'
+        r'auto(?>.{0,100}?lead).{0,100}?(chapman)',
+        r'auto.{0,100}?(colby)'
     ]
 
     for pattern in auto_lead_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
+        match = matcher.search(pattern, text)
         if match:
             if 'colby' in match.group(0).lower():
                 data['autoOperationsLead'] = 'Colby Chapman'
@@ -323,12 +478,12 @@ def parse_maritime_data(text):
         r'auto\s*operations?[:\s]*assistant[:\s]+([A-Za-z\s]+)',
         r'assistant\s*supervisor[:\s]+([A-Za-z\s]+)',
         r'cole\s+bailey',
-        r'auto.*assistant.*([A-Za-z\s]+bailey)',
-        r'auto.*([A-Za-z\s]*cole[A-Za-z\s]*)'
+        r'auto(?>.{0,100}?assistant).{0,100}?(bailey)',
+        r'auto.{0,100}?(cole)'
     ]
 
     for pattern in auto_assistant_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
+        match = matcher.search(pattern, text)
         if match:
             if 'cole' in match.group(0).lower():
                 data['autoOperationsAssistant'] = 'Cole Bailey'
@@ -342,12 +497,12 @@ def parse_maritime_data(text):
         r'high\s*&?\s*heavy[:\s]*lead[:\s]+([A-Za-z\s]+)',
         r'heavy\s*equipment[:\s]*lead[:\s]+([A-Za-z\s]+)',
         r'spencer\s+wilkins',
-        r'heavy.*lead.*([A-Za-z\s]+wilkins)',
-        r'heavy.*([A-Za-z\s]*spencer[A-Za-z\s]*)'
+        r'heavy(?>.{0,100}?lead).{0,100}?(wilkins)',
+        r'heavy.{0,100}?(spencer)'
     ]
 
     for pattern in heavy_lead_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
+        match = matcher.search(pattern, text)
         if match:
             if 'spencer' in match.group(0).lower():
                 data['heavyHeavyLead'] = 'Spencer Wilkins'
@@ -360,12 +515,12 @@ def parse_maritime_data(text):
         r'high\s*&?\s*heavy[:\s]*assistant[:\s]+([A-Za-z\s]+)',
         r'heavy\s*equipment[:\s]*assistant[:\s]+([A-Za-z\s]+)',
         r'bruce\s+banner',
-        r'heavy.*assistant.*([A-Za-z\s]+banner)',
-        r'heavy.*([A-Za-z\s]*bruce[A-Za-z\s]*)'
+        r'heavy(?>.{0,100}?assistant).{0,100}?(banner)',
+        r'heavy.{0,100}?(bruce)'
     ]
 
     for pattern in heavy_assistant_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
+        match = matcher.search(pattern, text)
         if match:
             if 'bruce' in match.group(0).lower():
                 data['heavyHeavyAssistant'] = 'Bruce Banner'
@@ -383,7 +538,7 @@ def parse_maritime_data(text):
     ]
 
     for pattern in manager_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
+        match = matcher.search(pattern, text)
         if match:
             if 'john' in match.group(0).lower():
                 data['operationManager'] = 'John Smith'
@@ -391,18 +546,20 @@ def parse_maritime_data(text):
                 data['operationManager'] = match.group(1).strip()
             break
 
+def _parse_berth_fields(text, clean_text, data, matcher):
+    """Berth assignment and its alternative field names"""
     # Enhanced berth location patterns
     berth_patterns = [
         r'berth\s*location[:\s\-=]+([A-Za-z0-9\s]+)',
         r'berth[:\s\-=]+([123456])',
         r'berth\s*([123456])',
-        r'assigned.*berth[:\s\-=]*([123456])',
+        r'assigned.{0,100}?berth[:\s\-=]*([123456])',
         r'berth\s*assignment[:\s\-=]+([A-Za-z0-9\s]+)',
         r'dock[:\s\-=]+([123456])',
         r'pier[:\s\-=]+([123456])',
         r'terminal\s*berth[:\s\-=]+([123456])',
-        r'vessel.*berth[:\s\-=]+([123456])',
-        r'ship.*berth[:\s\-=]+([123456])',
+        r'vessel.{0,100}?berth[:\s\-=]+([123456])',
+        r'ship.{0,100}?berth[:\s\-=]+([123456])',
         r'mooring[:\s\-=]+([A-Za-z0-9\s]+)',
         r'wharf[:\s\-=]+([A-Za-z0-9\s]+)',
         r'(?:at\s+)?berth\s*(\d+)',
@@ -410,7 +567,7 @@ def parse_maritime_data(text):
     ]
 
     for pattern in berth_patterns:
-        matches = re.findall(pattern, clean_text, re.IGNORECASE)
+        matches = matcher.findall(pattern, clean_text)
         if matches:
             for match in matches:
                 berth_identifier = str(match).strip()
@@ -439,18 +596,18 @@ def parse_maritime_data(text):
         data['berth'] = data['berthLocation']
         data['berthAssignment'] = data['berthLocation']
 
-    # Extract all additional operational parameters
-
+def _parse_operations_fields(text, clean_text, data, matcher):
+    """Expected rate, driver count, shift times and break duration"""
     # Expected Rate patterns
     rate_patterns = [
         r'expected\s*rate[:\s]+(\d+(?:\.\d+)?)',
         r'rate[:\s]+(\d+(?:\.\d+)?)\s*cars?/hour',
-        r'(\d+(?:\.\d+)?)\s*cars?/hour',
+        r'(?<!\d)(\d+(?:\.\d+)?)\s*cars?/hour',
         r'processing\s*rate[:\s]+(\d+(?:\.\d+)?)'
     ]
 
     for pattern in rate_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
+        match = matcher.search(pattern, text)
         if match:
             data['expectedRate'] = match.group(1).strip()
             break
@@ -459,11 +616,11 @@ def parse_maritime_data(text):
     driver_patterns = [
         r'total\s*drivers?[:\s]+(\d+)',
         r'drivers?[:\s]+(\d+)\s*drivers?',
-        r'(\d+)\s*drivers?\s*total'
+        r'(?<!\d)(\d+)\s*drivers?\s*total'
     ]
 
     for pattern in driver_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
+        match = matcher.search(pattern, text)
         if match:
             data['totalDrivers'] = match.group(1).strip()
             break
@@ -472,11 +629,11 @@ def parse_maritime_data(text):
     shift_start_patterns = [
         r'shift\s*start[:\s]+(\d{1,2}:\d{2}(?:\s*[AP]M)?)',
         r'start\s*time[:\s]+(\d{1,2}:\d{2}(?:\s*[AP]M)?)',
-        r'(\d{1,2}:\d{2}\s*AM).*shift',
+        r'(\d{1,2}:\d{2}\s*AM).{0,100}?shift',
     ]
 
     for pattern in shift_start_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
+        match = matcher.search(pattern, text)
         if match:
             data['shiftStart'] = match.group(1).strip()
             break
@@ -484,11 +641,11 @@ def parse_maritime_data(text):
     shift_end_patterns = [
         r'shift\s*end[:\s]+(\d{1,2}:\d{2}(?:\s*[AP]M)?)',
         r'end\s*time[:\s]+(\d{1,2}:\d{2}(?:\s*[AP]M)?)',
-        r'(\d{1,2}:\d{2}\s*PM).*shift',
+        r'(\d{1,2}:\d{2}\s*PM).{0,100}?shift',
     ]
 
     for pattern in shift_end_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
+        match = matcher.search(pattern, text)
         if match:
             data['shiftEnd'] = match.group(1).strip()
             break
@@ -497,46 +654,17 @@ def parse_maritime_data(text):
     break_patterns = [
         r'break\s*duration[:\s]+(\d+)',
         r'break[:\s]+(\d+)\s*minutes?',
-        r'(\d+)\s*minutes?\s*break',
+        r'(?<!\d)(\d+)\s*minutes?\s*break',
     ]
 
     for pattern in break_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
+        match = matcher.search(pattern, text)
         if match:
             data['breakDuration'] = match.group(1).strip()
             break
 
-    # Vehicle ID patterns
-    van_id_patterns = [
-        r'van\s*1\s*id[:\s]+([A-Za-z0-9]+)',
-        r'van\s*2\s*id[:\s]+([A-Za-z0-9]+)',
-        r'van\s*3\s*id[:\s]+([A-Za-z0-9]+)',
-        r'van\s*4\s*id[:\s]+([A-Za-z0-9]+)',
-        r'v(\d+)',
-    ]
-
-    # Extract individual van IDs
-    van_ids = []
-    for i, pattern in enumerate(van_id_patterns[:4]):  # First 4 patterns for specific vans
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            if i == 0:
-                data['van1Id'] = match.group(1).strip()
-            elif i == 1:
-                data['van2Id'] = match.group(1).strip()
-            elif i == 2:
-                data['van3Id'] = match.group(1).strip()
-            elif i == 3:
-                data['van4Id'] = match.group(1).strip()
-
-    # Generic van ID extraction
-    van_id_matches = re.findall(r'v(\d+)', text, re.IGNORECASE)
-    if van_id_matches and len(van_id_matches) >= 4:
-        data['van1Id'] = f'V{van_id_matches[0]}'
-        data['van2Id'] = f'V{van_id_matches[1]}'
-        data['van3Id'] = f'V{van_id_matches[2]}'
-        data['van4Id'] = f'V{van_id_matches[3]}'
-
+def _parse_zones_fields(text, clean_text, data, matcher):
+    """Zone allocations and descriptions"""
     # Zone allocation patterns
     zone_patterns = [
         r'zone\s*a[:\s]+(\d+)',
@@ -545,7 +673,7 @@ def parse_maritime_data(text):
     ]
 
     for i, pattern in enumerate(zone_patterns):
-        match = re.search(pattern, text, re.IGNORECASE)
+        match = matcher.search(pattern, text)
         if match:
             if i == 0:
                 data['zoneA'] = match.group(1).strip()
@@ -554,6 +682,25 @@ def parse_maritime_data(text):
             elif i == 2:
                 data['zoneC'] = match.group(1).strip()
 
+    # Zone description patterns
+    zone_desc_patterns = [
+        r'zone\s*a[:\s]*description[:\s]+([A-Za-z\s\-]+)',
+        r'zone\s*b[:\s]*description[:\s]+([A-Za-z\s\-]+)',
+        r'zone\s*c[:\s]*description[:\s]+([A-Za-z\s\-]+)',
+    ]
+
+    for i, pattern in enumerate(zone_desc_patterns):
+        match = matcher.search(pattern, text)
+        if match:
+            if i == 0:
+                data['zoneADescription'] = match.group(1).strip()
+            elif i == 1:
+                data['zoneBDescription'] = match.group(1).strip()
+            elif i == 2:
+                data['zoneCDescription'] = match.group(1).strip()
+
+def _parse_terminals_fields(text, clean_text, data, matcher):
+    """BRV / ZEE / SOU loading targets"""
     # Loading target patterns - enhanced with more variations
     brv_patterns = [
         r'brv\s*terminal[:\s]+(\d+)',
@@ -563,7 +710,7 @@ def parse_maritime_data(text):
     ]
 
     for pattern in brv_patterns:
-        matches = re.findall(pattern, clean_text, re.IGNORECASE)
+        matches = matcher.findall(pattern, clean_text)
         if matches:
             numbers = [int(match) for match in matches if match.isdigit()]
             if numbers:
@@ -578,7 +725,7 @@ def parse_maritime_data(text):
     ]
 
     for pattern in zee_patterns:
-        matches = re.findall(pattern, clean_text, re.IGNORECASE)
+        matches = matcher.findall(pattern, clean_text)
         if matches:
             numbers = [int(match) for match in matches if match.isdigit()]
             if numbers:
@@ -593,55 +740,24 @@ def parse_maritime_data(text):
     ]
 
     for pattern in sou_patterns:
-        matches = re.findall(pattern, clean_text, re.IGNORECASE)
+        matches = matcher.findall(pattern, clean_text)
         if matches:
             numbers = [int(match) for match in matches if match.isdigit()]
             if numbers:
                 data['souTarget'] = max(numbers)
                 break
 
-    # Vehicle brand patterns (additional brands)
-    brand_patterns = [
-        r'audi[:\s]+(\d+)',
-        r'porsche[:\s]+(\d+)',
-        r'mini[:\s]+(\d+)',
-        r'jaguar[:\s]+(\d+)',
-    ]
-
-    for i, pattern in enumerate(brand_patterns):
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            if i == 0:
-                data['audi'] = match.group(1).strip()
-            elif i == 1:
-                data['porsche'] = match.group(1).strip()
-            elif i == 2:
-                data['mini'] = match.group(1).strip()
-            elif i == 3:
-                data['jaguar'] = match.group(1).strip()
-
-    # Additional cargo fields
-    electric_patterns = [
-        r'electric\s*vehicles?[:\s]+(\d+)',
-        r'ev[:\s]+(\d+)',
-        r'(\d+)\s*electric\s*vehicles?'
-    ]
-
-    for pattern in electric_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            data['electricVehicles'] = match.group(1).strip()
-            break
-
+def _parse_zee_fields(text, clean_text, data, matcher):
+    """ZEE compound cargo details"""
     # ZEE Compound specific patterns
     zee_auto_patterns = [
         r'zee\s*automobiles?[:\s]+(\d+)',
         r'zee\s*compound\s*automobiles?[:\s]+(\d+)',
-        r'zee.*automobiles?[:\s]+(\d+)'
+        r'zee.{0,100}?automobiles?[:\s]+(\d+)'
     ]
 
     for pattern in zee_auto_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
+        match = matcher.search(pattern, text)
         if match:
             data['zeeAutomobiles'] = match.group(1).strip()
             break
@@ -649,11 +765,11 @@ def parse_maritime_data(text):
     zee_heavy_patterns = [
         r'zee\s*heavy\s*equipment[:\s]+(\d+)',
         r'zee\s*compound\s*heavy[:\s]+(\d+)',
-        r'zee.*heavy.*equipment[:\s]+(\d+)'
+        r'zee(?>.{0,100}?heavy).{0,100}?equipment[:\s]+(\d+)'
     ]
 
     for pattern in zee_heavy_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
+        match = matcher.search(pattern, text)
         if match:
             data['zeeHeavyEquipment'] = match.group(1).strip()
             break
@@ -661,11 +777,11 @@ def parse_maritime_data(text):
     zee_electric_patterns = [
         r'zee\s*electric\s*vehicles?[:\s]+(\d+)',
         r'zee\s*compound\s*electric[:\s]+(\d+)',
-        r'zee.*electric.*vehicles?[:\s]+(\d+)'
+        r'zee(?>.{0,100}?electric).{0,100}?vehicles?[:\s]+(\d+)'
     ]
 
     for pattern in zee_electric_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
+        match = matcher.search(pattern, text)
         if match:
             data['zeeElectricVehicles'] = match.group(1).strip()
             break
@@ -673,11 +789,11 @@ def parse_maritime_data(text):
     zee_static_patterns = [
         r'zee\s*static\s*cargo[:\s]+(\d+)',
         r'zee\s*compound\s*static[:\s]+(\d+)',
-        r'zee.*static.*cargo[:\s]+(\d+)'
+        r'zee(?>.{0,100}?static).{0,100}?cargo[:\s]+(\d+)'
     ]
 
     for pattern in zee_static_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
+        match = matcher.search(pattern, text)
         if match:
             data['zeeStaticCargo'] = match.group(1).strip()
             break
@@ -685,11 +801,11 @@ def parse_maritime_data(text):
     zee_cargo_type_patterns = [
         r'zee\s*cargo\s*type[:\s]+([A-Za-z\s\-]+)',
         r'zee\s*compound\s*cargo[:\s]+([A-Za-z\s\-]+)',
-        r'zee.*cargo.*type[:\s]+([A-Za-z\s\-]+)'
+        r'zee(?>.{0,100}?cargo).{0,100}?type[:\s]+([A-Za-z\s\-]+)'
     ]
 
     for pattern in zee_cargo_type_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
+        match = matcher.search(pattern, text)
         if match:
             data['zeeCargoType'] = match.group(1).strip()
             break
@@ -697,11 +813,11 @@ def parse_maritime_data(text):
     zee_value_patterns = [
         r'zee\s*cargo\s*value[:\s]+(\d+)',
         r'zee\s*compound\s*value[:\s]+(\d+)',
-        r'zee.*value[:\s]+(\d+)'
+        r'zee.{0,100}?value[:\s]+(\d+)'
     ]
 
     for pattern in zee_value_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
+        match = matcher.search(pattern, text)
         if match:
             data['zeeCargoValue'] = match.group(1).strip()
             break
@@ -709,11 +825,11 @@ def parse_maritime_data(text):
     zee_priority_patterns = [
         r'zee\s*priority[:\s]+([A-Za-z\s]+)',
         r'zee\s*compound\s*priority[:\s]+([A-Za-z\s]+)',
-        r'zee.*priority[:\s]+([A-Za-z\s]+)'
+        r'zee.{0,100}?priority[:\s]+([A-Za-z\s]+)'
     ]
 
     for pattern in zee_priority_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
+        match = matcher.search(pattern, text)
         if match:
             priority = match.group(1).strip().lower()
             if 'high' in priority:
@@ -726,56 +842,48 @@ def parse_maritime_data(text):
                 data['zeePriority'] = 'standard'
             break
 
-    static_cargo_patterns = [
-        r'static\s*cargo[:\s]+(\d+)',
-        r'static\s*cargo\s*units?[:\s]+(\d+)',
-        r'(\d+)\s*static\s*cargo'
-    ]
-
-    for pattern in static_cargo_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            data['staticCargo'] = match.group(1).strip()
-            break
-
-    cargo_type_patterns = [
-        r'cargo\s*brand[/\s]*type[:\s]+([A-Za-z\s\-]+)',
-        r'cargo\s*type[:\s]+([A-Za-z\s\-]+)',
-        r'brand[/\s]*type[:\s]+([A-Za-z\s\-]+)'
-    ]
-
-    for pattern in cargo_type_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            data['cargoType'] = match.group(1).strip()
-            break
-
-    # Zone description patterns
-    zone_desc_patterns = [
-        r'zone\s*a[:\s]*description[:\s]+([A-Za-z\s\-]+)',
-        r'zone\s*b[:\s]*description[:\s]+([A-Za-z\s\-]+)',
-        r'zone\s*c[:\s]*description[:\s]+([A-Za-z\s\-]+)',
+def _parse_tico_fields(text, clean_text, data, matcher):
+    """TICO transportation van and station wagon counts and IDs"""
+    # Vehicle ID patterns
+    van_id_patterns = [
+        r'van\s*1\s*id[:\s]+([A-Za-z0-9]+)',
+        r'van\s*2\s*id[:\s]+([A-Za-z0-9]+)',
+        r'van\s*3\s*id[:\s]+([A-Za-z0-9]+)',
+        r'van\s*4\s*id[:\s]+([A-Za-z0-9]+)',
+        r'v(\d+)',
     ]
 
-    for i, pattern in enumerate(zone_desc_patterns):
-        match = re.search(pattern, text, re.IGNORECASE)
+    # Extract individual van IDs
+    van_ids = []
+    for i, pattern in enumerate(van_id_patterns[:4]):  # First 4 patterns for specific vans
+        match = matcher.search(pattern, text)
         if match:
             if i == 0:
-                data['zoneADescription'] = match.group(1).strip()
+                data['van1Id'] = match.group(1).strip()
             elif i == 1:
-                data['zoneBDescription'] = match.group(1).strip()
+                data['van2Id'] = match.group(1).strip()
             elif i == 2:
-                data['zoneCDescription'] = match.group(1).strip()
+                data['van3Id'] = match.group(1).strip()
+            elif i == 3:
+                data['van4Id'] = match.group(1).strip()
+
+    # Generic van ID extraction
+    van_id_matches = matcher.findall(r'v(\d+)', text)
+    if van_id_matches and len(van_id_matches) >= 4:
+        data['van1Id'] = f'V{van_id_matches[0]}'
+        data['van2Id'] = f'V{van_id_matches[1]}'
+        data['van3Id'] = f'V{van_id_matches[2]}'
+        data['van4Id'] = f'V{van_id_matches[3]}'
 
     # TICO Transportation vehicle counts
     van_count_patterns = [
         r'number\s*of\s*vans[:\s]+(\d+)',
         r'vans?[:\s]+(\d+)',
-        r'(\d+)\s*vans?'
+        r'(?<!\d)(\d+)\s*vans?'
     ]
 
     for pattern in van_count_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
+        match = matcher.search(pattern, text)
         if match:
             data['numVans'] = match.group(1).strip()
             break
@@ -783,11 +891,11 @@ def parse_maritime_data(text):
     wagon_count_patterns = [
         r'number\s*of\s*station\s*wagons?[:\s]+(\d+)',
         r'station\s*wagons?[:\s]+(\d+)',
-        r'(\d+)\s*station\s*wagons?'
+        r'(?<!\d)(\d+)\s*station\s*wagons?'
     ]
 
     for pattern in wagon_count_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
+        match = matcher.search(pattern, text)
         if match:
             data['numStationWagons'] = match.group(1).strip()
             break
@@ -795,17 +903,84 @@ def parse_maritime_data(text):
     # Individual vehicle ID extraction (up to 15 vans and 15 wagons)
     for i in range(1, 16):
         van_id_pattern = rf'van\s*{i}\s*id[:\s]+([A-Za-z0-9]+)'
-        match = re.search(van_id_pattern, text, re.IGNORECASE)
+        match = matcher.search(van_id_pattern, text)
         if match:
             data[f'vanId{i}'] = match.group(1).strip()
 
     for i in range(1, 16):
         wagon_id_pattern = rf'(?:station\s*wagon|wagon)\s*{i}\s*id[:\s]+([A-Za-z0-9]+)'
-        match = re.search(wagon_id_pattern, text, re.IGNORECASE)
+        match = matcher.search(wagon_id_pattern, text)
         if match:
             data[f'wagonId{i}'] = match.group(1).strip()
 
-    return data
+# Field groups in cascade order; each parser fills data in place
+FIELD_GROUPS = [
+    ('vessel', _parse_vessel_fields),
+    ('cargo', _parse_cargo_fields),
+    ('team', _parse_team_fields),
+    ('berth', _parse_berth_fields),
+    ('operations', _parse_operations_fields),
+    ('zones', _parse_zones_fields),
+    ('terminals', _parse_terminals_fields),
+    ('zee', _parse_zee_fields),
+    ('tico', _parse_tico_fields),
+]
+
+# Fields each group can set, for field-selective extraction
+GROUP_FIELDS = {
+    'vessel': ['vesselName', 'vesselType', 'port', 'operationDate', 'company', 'operationType'],
+    'cargo': ['totalAutomobilesDischarge', 'totalAutomobiles', 'automobiles', 'heavyEquipmentDischarge',
+              'heavyEquipment', 'mbCount', 'bmwCount', 'lrCount', 'rrCount', 'audi', 'porsche', 'mini', 'jaguar',
+              'electricVehicles', 'staticCargo', 'cargoType'],
+    'team': ['autoOperationsLead', 'autoOperationsAssistant', 'heavyHeavyLead', 'heavyHeavyAssistant',
+             'operationManager'],
+    'berth': ['berthLocation', 'berth', 'berthAssignment'],
+    'operations': ['expectedRate', 'totalDrivers', 'shiftStart', 'shiftEnd', 'breakDuration'],
+    'zones': ['zoneA', 'zoneB', 'zoneC', 'zoneADescription', 'zoneBDescription', 'zoneCDescription'],
+    'terminals': ['brvTarget', 'zeeTarget', 'souTarget'],
+    'zee': ['zeeAutomobiles', 'zeeHeavyEquipment', 'zeeElectricVehicles', 'zeeStaticCargo', 'zeeCargoType',
+            'zeeCargoValue', 'zeePriority'],
+    'tico': ['van1Id', 'van2Id', 'van3Id', 'van4Id', 'numVans', 'numStationWagons']
+            + [f'vanId{i}' for i in range(1, 16)] + [f'wagonId{i}' for i in range(1, 16)],
+}
+FIELD_TO_GROUP = {field: name for name, fields in GROUP_FIELDS.items() for field in fields}
+
+# Derived fields and the fields they are computed from
+FIELD_DEPENDENCIES = {
+    'berth': ['berthLocation'],
+    'berthAssignment': ['berthLocation'],
+    'totalAutomobiles': ['totalAutomobilesDischarge'],
+    'automobiles': ['totalAutomobilesDischarge'],
+    'heavyEquipment': ['heavyEquipmentDischarge'],
+}
+
+def resolve_fields(fields):
+    """Requested field names plus their dependencies, and the groups that produce them
+
+    Raises ValueError naming any field no group produces.
+    """
+    unknown = sorted(field for field in fields if field not in FIELD_TO_GROUP)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    needed = set(fields)
+    for field in fields:
+        needed.update(FIELD_DEPENDENCIES.get(field, []))
+    return needed, {FIELD_TO_GROUP[field] for field in needed}
+
+def _parse_fields(text, data, matcher, page_index=None, groups=None):
+    """Run the pattern cascade over text, filling data in place"""
+    # Clean up the text for better parsing across page boundaries
+    clean_text = clean_extracted_text(text) if page_index is None else None
+    for name, parse_group in FIELD_GROUPS:
+        if groups is not None and name not in groups:
+            continue
+        matcher.group = name
+        if page_index is None:
+            parse_group(text, clean_text, data, matcher)
+            continue
+        group_text = page_index.text_for(name)
+        if group_text:
+            parse_group(group_text, clean_extracted_text(group_text), data, matcher)
 
 @file_processor_bp.route('/api/upload', methods=['POST'])
 def upload_file():
@@ -820,29 +995,105 @@ def upload_file():
     if not allowed_file(file.filename):
         return jsonify({'error': 'File type not supported'}), 400
 
-    # Check file size before saving
-    file.seek(0, 2)  # Seek to end
-    file_size = file.tell()
-    file.seek(0)  # Reset to beginning
-
-    if file_size > MAX_FILE_SIZE:
-        return jsonify({'error': f'File size exceeds {MAX_FILE_SIZE // (1024*1024)}MB limit'}), 400
-
     # Create upload directory if it doesn't exist
     os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
-    # Save file
+    # Save file, counting bytes as they are copied instead of seeking to measure first
     filename = secure_filename(file.filename)
     file_path = os.path.join(UPLOAD_FOLDER, filename)
-    file.save(file_path)
+    file_size = save_stream(file.stream, file_path, MAX_FILE_SIZE)
+    if file_size is None:
+        return jsonify({'error': f'File size exceeds {MAX_FILE_SIZE // (1024*1024)}MB limit'}), 400
 
     return jsonify({
         'success': True,
         'filename': filename,
         'file_path': file_path,
-        'file_size': os.path.getsize(file_path)
+        'file_size': file_size
     })
 
+def save_stream(stream, file_path, limit):
+    """Copy a stream to file_path; returns the size, or None (and no file) past limit"""
+    size = 0
+    with open(file_path, 'wb') as f:
+        while True:
+            block = stream.read(chunked_uploads.STREAM_BLOCK)
+            if not block:
+                break
+            size += len(block)
+            if size > limit:
+                break
+            f.write(block)
+    if size > limit:
+        os.remove(file_path)
+        return None
+    return size
+
+@file_processor_bp.route('/api/uploads', methods=['POST'])
+def create_upload():
+    """Start a resumable chunked upload"""
+    data = request.get_json() or {}
+    filename = secure_filename(data.get('filename') or '')
+    size = data.get('size')
+
+    if not filename or not allowed_file(filename):
+        return jsonify({'error': 'File type not supported'}), 400
+    # bool is an int subclass, so a JSON true would otherwise declare a 1-byte upload
+    if not isinstance(size, int) or isinstance(size, bool) or size <= 0:
+        return jsonify({'error': 'size must be a positive number of bytes'}), 400
+    if size > MAX_FILE_SIZE:
+        return jsonify({'error': f'File size exceeds {MAX_FILE_SIZE // (1024*1024)}MB limit'}), 400
+
+    try:
+        return jsonify(chunked_uploads.create_session(UPLOAD_FOLDER, filename, size, request.remote_addr)), 201
+    except chunked_uploads.UploadError as e:
+        return jsonify({'error': str(e)}), e.status
+
+@file_processor_bp.route('/api/uploads/<upload_id>', methods=['GET'])
+def get_upload(upload_id):
+    """Received and missing byte ranges of an upload"""
+    try:
+        return jsonify(chunked_uploads.get_status(UPLOAD_FOLDER, upload_id))
+    except chunked_uploads.UploadError as e:
+        return jsonify({'error': str(e)}), e.status
+
+@file_processor_bp.route('/api/uploads/<upload_id>/chunks/<int:index>', methods=['PUT'])
+def put_upload_chunk(upload_id, index):
+    """Write one chunk; X-Chunk-Offset defaults to index * chunk_size"""
+    offset = request.headers.get('X-Chunk-Offset', type=int)
+    try:
+        return jsonify(chunked_uploads.write_chunk(UPLOAD_FOLDER, upload_id, index, offset, request.stream,
+                                                   request.headers.get('X-Chunk-SHA256')))
+    except chunked_uploads.UploadError as e:
+        return jsonify({'error': str(e)}), e.status
+
+@file_processor_bp.route('/api/uploads/<upload_id>/finalize', methods=['POST'])
+def finalize_upload(upload_id):
+    """Assemble a complete upload; the response matches /api/upload"""
+    try:
+        filename = chunked_uploads.get_status(UPLOAD_FOLDER, upload_id)['filename']
+        file_path = os.path.join(UPLOAD_FOLDER, filename)
+        file_size, content_hash = chunked_uploads.finalize(UPLOAD_FOLDER, upload_id, file_path)
+    except chunked_uploads.UploadError as e:
+        return jsonify({'error': str(e)}), e.status
+
+    return jsonify({
+        'success': True,
+        'filename': filename,
+        'file_path': file_path,
+        'file_size': file_size,
+        'content_hash': content_hash
+    })
+
+@file_processor_bp.route('/api/uploads/<upload_id>', methods=['DELETE'])
+def abort_upload(upload_id):
+    """Discard an unfinished upload"""
+    try:
+        chunked_uploads.abort(UPLOAD_FOLDER, upload_id)
+    except chunked_uploads.UploadError as e:
+        return jsonify({'error': str(e)}), e.status
+    return jsonify({'message': 'Upload discarded'})
+
 @file_processor_bp.route('/api/extract', methods=['POST'])
 def extract_data():
     """Extract data from uploaded file"""
@@ -852,46 +1103,126 @@ def extract_data():
     if not file_path or not os.path.exists(file_path):
         return jsonify({'error': 'File not found'}), 404
 
+    # Optional field selection, as a list or comma-separated string in the body or query string
+    fields = data.get('fields', request.args.get('fields'))
+    if isinstance(fields, str):
+        fields = [field.strip() for field in fields.split(',') if field.strip()]
+    elif fields is not None and not (isinstance(fields, list) and all(isinstance(field, str) for field in fields)):
+        return jsonify({'error': 'fields must be a list of field names or a comma-separated string'}), 400
+    needed = None
+    if fields:
+        try:
+            needed, _ = resolve_fields(fields)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    else:
+        fields = None
+
     # Determine file type and extract text
     file_extension = file_path.split('.')[-1].lower()
+    if file_extension not in ('pdf', 'csv', 'txt'):
+        return jsonify({'error': 'Unsupported file type. Please use PDF, CSV, or TXT files.'}), 400
 
     try:
-        if file_extension == 'pdf':
-            text = extract_text_from_pdf(file_path)
-        elif file_extension == 'csv':
-            text = extract_data_from_csv(file_path)
-        elif file_extension == 'txt':
-            with open(file_path, 'r', encoding='utf-8') as f:
-                text = f.read()
-        else:
-            return jsonify({'error': 'Unsupported file type. Please use PDF, CSV, or TXT files.'}), 400
-
-        print(f"Extracted text length: {len(text)}")
-        print(f"First 500 characters: {text[:500]}")
-
-        # Parse maritime-specific data
-        extracted_data = parse_maritime_data(text)
-        
-        print(f"Extracted data: {extracted_data}")
-
-        # Clean up uploaded file
-        os.remove(file_path)
-
-        return jsonify({
-            'success': True,
-            'extracted_text': text[:1000] + '...' if len(text) > 1000 else text,  # Truncate for preview
-            'parsed_data': extracted_data,
-            'debug_info': {
-                'text_length': len(text),
-                'first_200_chars': text[:200],
-                'patterns_found': len(extracted_data)
-            }
-        })
-
+        # Same document and options, same result: cached by content hash across workers and nodes
+        options = [file_extension, ','.join(sorted(fields or [])), bool(data.get('all_pages')), bool(data.get('generic'))]
+        key = 'extract:' + ':'.join([pdf_index.file_sha256(file_path)] + [str(option) for option in options])
+        response = cache.cached_json(key, lambda: admitted_extraction(file_path, file_extension, needed, fields,
+                                                                      data.get('all_pages'), data.get('generic')),
+                                     cache.TTL_EXTRACTION,
+                                     # A result cut short by the CPU budget is served once, never reused
+                                     cacheable=lambda result: not result.get('partial'))
+        current_app.logger.debug('Extraction result for %s: %s', file_path, response.get_data(as_text=True))
+
+        # Clean up uploaded file; a concurrent request for the same file_path may have removed it already
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            pass
+
+        return response
+
+    except admission.Rejected as e:
+        # The upload is kept so the client can retry the same file_path
+        return jsonify({'error': 'Too many documents are being processed, please retry shortly',
+                        'retry_after': e.retry_after}), 503, {'Retry-After': str(e.retry_after)}
     except Exception as e:
-        print(f"Extraction error: {str(e)}")
+        current_app.logger.exception('Extraction error for %s', file_path)
         return jsonify({'error': f'Error processing file: {str(e)}'}), 500
 
+def admitted_extraction(*args):
+    """run_extraction under a node-wide extraction permit, so uploads cannot occupy every worker"""
+    with admission.EXTRACTION.permit():
+        # CPU-bound; moved off the event loop under gevent workers
+        return offload.run(run_extraction, *args)
+
+def run_extraction(file_path, file_extension, needed=None, fields=None, all_pages=False, generic=False):
+    """Read and parse one document into the /api/extract response body (no Flask context needed)"""
+    started = time.perf_counter()
+    csv_result = None
+    page_index = None
+    if file_extension == 'pdf':
+        if all_pages:
+            text = extract_text_from_pdf(file_path)
+        else:
+            # Keyword page index (cached by content hash) so each field group skips irrelevant pages
+            try:
+                page_index = pdf_index.load_or_build(file_path)
+                text = page_index.full_text()
+            except Exception as e:
+                text = f"Error reading PDF: {str(e)}"
+    elif file_extension == 'csv':
+        # Map columns structurally; fall back to free-text patterns if no header is recognised
+        csv_result = ingest_csv(file_path)
+        if csv_result['fields']:
+            text = csv_result['preview']
+        else:
+            csv_result = None
+            text = extract_data_from_csv(file_path)
+    else:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            text = f.read()
+
+    # Parse maritime-specific data within the per-document CPU budget
+    budget = ExtractionBudget()
+    template = None
+    extracted_data = None
+    if csv_result:
+        extracted_data = csv_result['fields']
+        if needed is not None:
+            extracted_data = {field: value for field, value in extracted_data.items() if field in needed}
+    elif not generic:
+        # Known templates are read through their labels; unknown ones use the generic cascade
+        template = match_template(text)
+        extracted_data = template.extract(text, needed) if template else None
+        if extracted_data is None:
+            template = None
+    if extracted_data is None:
+        stats = pattern_stats.PatternStats() if pattern_stats.enabled() else None
+        extracted_data = parse_maritime_data(text, budget, stats, page_index, fields)
+        if stats is not None:
+            pattern_stats.collect(stats)
+
+    pages = len(page_index.pages) if page_index else max(text.count('=== END PAGE'), 1)
+    metrics.observe_extraction(file_extension, pages, time.perf_counter() - started)
+
+    return {
+        'success': True,
+        'extracted_text': text[:1000] + '...' if len(text) > 1000 else text,  # Truncate for preview
+        'parsed_data': extracted_data,
+        'partial': budget.exhausted,
+        'debug_info': {
+            'text_length': len(text),
+            'first_200_chars': text[:200],
+            'patterns_found': len(extracted_data),
+            'cpu_budget_seconds': budget.seconds,
+            'page_index': page_index.summary() if page_index else None,
+            'template': template.name if template else None,
+            'fields_requested': sorted(needed) if needed is not None else None,
+            'csv': {key: csv_result[key] for key in ('encoding', 'delimiter', 'rows', 'cargo_rows')} if csv_result else None
+        }
+    }
+
 @file_processor_bp.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
@@ -0,0 +1,12 @@
+from flask import Blueprint, Response, jsonify
+from src.services import metrics
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus exposition, aggregated across gunicorn workers"""
+    if not metrics.enabled():
+        return jsonify({'error': 'Metrics unavailable; install prometheus_client'}), 503
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
@@ -0,0 +1,92 @@
+from flask import Blueprint, request, jsonify
+from src.models import db
+from src.models.notification import PushSubscription
+from src.services import notifications
+
+notifications_bp = Blueprint('notifications', __name__)
+
+def _optional_int(value):
+    return int(value) if value not in (None, '') else None
+
+@notifications_bp.route('/api/notifications/vapid-public-key', methods=['GET'])
+def vapid_public_key():
+    """Application server key browsers subscribe with"""
+    if not notifications.VAPID_PUBLIC_KEY or not notifications.delivery_configured():
+        return jsonify({'error': 'Push delivery is not configured'}), 503
+    return jsonify({'publicKey': notifications.VAPID_PUBLIC_KEY})
+
+@notifications_bp.route('/api/notifications/subscribe', methods=['POST'])
+def subscribe():
+    """Register (or re-register) a browser push subscription for a ship and role"""
+    data = request.get_json(silent=True) or {}
+    subscription = data.get('subscription') or {}
+    endpoint = subscription.get('endpoint')
+    if not endpoint:
+        return jsonify({'error': 'subscription.endpoint is required'}), 400
+    if not notifications.valid_endpoint(endpoint):
+        return jsonify({'error': 'subscription.endpoint must be an https URL on a browser push service'}), 400
+    try:
+        ship_id = _optional_int(data.get('shipId'))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'shipId must be an integer'}), 400
+    role = data.get('role') or None
+    if role is not None and (not isinstance(role, str) or len(role) > 40):
+        return jsonify({'error': 'role must be a string of at most 40 characters'}), 400
+
+    keys = subscription.get('keys') or {}
+    sub = PushSubscription.query.filter_by(endpoint=endpoint).first()
+    created = sub is None
+    if created:
+        sub = PushSubscription(endpoint=endpoint)
+        db.session.add(sub)
+    sub.p256dh = keys.get('p256dh')
+    sub.auth = keys.get('auth')
+    sub.ship_id = ship_id
+    sub.role = role
+    sub.user_agent = data.get('userAgent')
+    sub.failures = 0
+    db.session.commit()
+
+    return jsonify({'message': 'Subscribed', 'id': sub.id}), 201 if created else 200
+
+@notifications_bp.route('/api/notifications/unsubscribe', methods=['POST'])
+def unsubscribe():
+    """Forget a push subscription by endpoint"""
+    data = request.get_json(silent=True) or {}
+    endpoint = data.get('endpoint')
+    if not endpoint:
+        return jsonify({'error': 'endpoint is required'}), 400
+    PushSubscription.query.filter_by(endpoint=endpoint).delete()
+    db.session.commit()
+    return jsonify({'message': 'Unsubscribed'})
+
+@notifications_bp.route('/api/notifications/send', methods=['POST'])
+def send_notification():
+    """Queue a notification for delivery; fan-out happens in the background"""
+    from src.routes.admin import admin_authorized
+    if not admin_authorized():
+        return jsonify({'error': 'Admin token required'}), 403
+    if not notifications.delivery_configured():
+        return jsonify({'error': 'Push delivery is not configured'}), 503
+    data = request.get_json(silent=True) or {}
+    if not data.get('title') and not data.get('message'):
+        return jsonify({'error': 'title or message is required'}), 400
+    extra = data.get('data') if isinstance(data.get('data'), dict) else {}
+    try:
+        ship_id = _optional_int(data.get('shipId', extra.get('shipId')))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'shipId must be an integer'}), 400
+
+    payload = {
+        'type': data.get('type', 'info'),
+        'title': data.get('title', ''),
+        'message': data.get('message', ''),
+        'data': extra,
+        'priority': data.get('priority'),
+        'timestamp': data.get('timestamp'),
+    }
+    try:
+        notifications.send(payload, ship_id=ship_id, role=data.get('role') or None)
+    except notifications.QueueFull:
+        return jsonify({'error': 'Notification queue is full, please retry shortly'}), 503, {'Retry-After': '5'}
+    return jsonify({'message': 'Notification queued'}), 202
@@ -1,17 +1,17 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, abort, current_app, request, jsonify
+from sqlalchemy import func
 from src.models import db
 from src.models.ship import Ship
+from src.services import cache, coalescing, forecast, idempotency, notifications, shards
 from datetime import datetime, timedelta
 import json
 import os
 
 ships_bp = Blueprint('ships', __name__)
 
-@ships_bp.route('/api/ships', methods=['GET'])
-def get_ships():
-    """Get all ships"""
-    ships = Ship.query.all()
-    return jsonify([{
+def serialize_ship(ship):
+    """Full JSON representation of a ship operation, including progress and status not yet flushed"""
+    data = {
         'id': ship.id,
         'vesselName': ship.vesselName,
         'vesselType': ship.vesselType,
@@ -52,56 +52,26 @@ def get_ships():
         'turnaround_data': json.loads(ship.turnaround_data) if ship.turnaround_data else None,
         'inventory_data': json.loads(ship.inventory_data) if ship.inventory_data else None,
         'hourly_quantity_data': json.loads(ship.hourly_quantity_data) if ship.hourly_quantity_data else None
-    } for ship in ships])
+    }
+    data.update(coalescing.pending(ship.id))
+    return data
+
+@ships_bp.route('/api/ships', methods=['GET'])
+def get_ships():
+    """Get all ships"""
+    # Sorted here rather than in SQL: with SHARD_BY_PORT the rows come back one port at a time
+    return cache.cached_json('ships:all', lambda: [serialize_ship(ship) for ship in
+                                                   sorted(Ship.query.all(), key=lambda ship: ship.id)],
+                             cache.TTL_SHIPS, ['ships'])
 
 @ships_bp.route('/api/ships/<int:ship_id>', methods=['GET'])
 def get_ship(ship_id):
     """Get a specific ship"""
-    ship = Ship.query.get_or_404(ship_id)
-    return jsonify({
-        'id': ship.id,
-        'vesselName': ship.vesselName,
-        'vesselType': ship.vesselType,
-        'shippingLine': ship.shippingLine,
-        'port': ship.port,
-        'operationDate': ship.operationDate.isoformat() if ship.operationDate else None,
-        'company': ship.company,
-        'operationType': ship.operationType,
-        'berth': ship.berth,
-        'operationManager': ship.operationManager,
-        'autoOpsLead': ship.autoOpsLead,
-        'autoOpsAssistant': ship.autoOpsAssistant,
-        'heavyOpsLead': ship.heavyOpsLead,
-        'heavyOpsAssistant': ship.heavyOpsAssistant,
-        'totalVehicles': ship.totalVehicles,
-        'totalAutomobilesDischarge': ship.totalAutomobilesDischarge,
-        'heavyEquipmentDischarge': ship.heavyEquipmentDischarge,
-        'totalElectricVehicles': ship.totalElectricVehicles,
-        'totalStaticCargo': ship.totalStaticCargo,
-        'brvTarget': ship.brvTarget,
-        'zeeTarget': ship.zeeTarget,
-        'souTarget': ship.souTarget,
-        'expectedRate': ship.expectedRate,
-        'totalDrivers': ship.totalDrivers,
-        'shiftStart': ship.shiftStart,
-        'shiftEnd': ship.shiftEnd,
-        'breakDuration': ship.breakDuration,
-        'targetCompletion': ship.targetCompletion,
-        'ticoVans': ship.ticoVans,
-        'ticoStationWagons': ship.ticoStationWagons,
-        'status': ship.status,
-        'progress': ship.progress,
-        'createdAt': ship.createdAt.isoformat() if ship.createdAt else None,
-        'startTime': ship.startTime,
-        'estimatedCompletion': ship.estimatedCompletion,
-        'updatedAt': ship.updatedAt.isoformat() if ship.updatedAt else None,
-        'deck_data': json.loads(ship.deck_data) if ship.deck_data else None,
-        'turnaround_data': json.loads(ship.turnaround_data) if ship.turnaround_data else None,
-        'inventory_data': json.loads(ship.inventory_data) if ship.inventory_data else None,
-        'hourly_quantity_data': json.loads(ship.hourly_quantity_data) if ship.hourly_quantity_data else None
-    })
+    return cache.cached_json(f'ship:{ship_id}', lambda: serialize_ship(Ship.query.get_or_404(ship_id)),
+                             cache.TTL_SHIPS, [f'ship:{ship_id}'])
 
 @ships_bp.route('/api/ships', methods=['POST'])
+@idempotency.idempotent
 def create_ship():
     """Create a new ship operation"""
     data = request.get_json()
@@ -160,10 +130,12 @@ def create_ship():
     
     db.session.add(ship)
     db.session.commit()
+    cache.invalidate('ships')
     
     return jsonify({'id': ship.id}), 201
 
 @ships_bp.route('/api/ships/<int:ship_id>', methods=['PUT'])
+@idempotency.idempotent
 def update_ship(ship_id):
     """Update a ship operation"""
     ship = Ship.query.get_or_404(ship_id)
@@ -178,13 +150,44 @@ def update_ship(ship_id):
             setattr(ship, key, value)
     
     db.session.commit()
+    if 'port' in data:
+        shards.move(ship_id, ship.port)
+    cache.invalidate('ships', f'ship:{ship_id}')
     
     return jsonify({'message': 'Ship updated successfully'})
 
+def _coalesced_write(ship_id, values, response):
+    """Commit values with the next coalesced batch; an error response if that batch could not be stored"""
+    # End this request's read transaction so it cannot hold up the batch commit
+    db.session.rollback()
+    try:
+        coalescing.write(ship_id, values, idempotency.deferred_record(response))
+    except coalescing.NotFlushed:
+        return jsonify({'error': 'Update could not be saved, please retry'}), 503, {'Retry-After': '1'}
+    return None
+
+def _notify_status(ship_id, vessel_name, previous, status):
+    """Queue a status change notification for the devices following the ship"""
+    try:
+        notifications.send({
+            'type': 'completion' if status == 'complete' else 'status',
+            'title': f'{vessel_name or "Ship"} {status}',
+            'message': f'{vessel_name or "Ship"} changed from {previous or "unknown"} to {status}',
+            'data': {'shipId': ship_id, 'status': status},
+        }, ship_id=ship_id)
+    except notifications.QueueFull:
+        current_app.logger.warning('Push queue full; status notification for ship %s dropped', ship_id)
+
 @ships_bp.route('/api/ships/<int:ship_id>/progress', methods=['PUT'])
+@idempotency.idempotent
 def update_ship_progress(ship_id):
     """Update ship operation progress"""
-    ship = Ship.query.get_or_404(ship_id)
+    if coalescing.ENABLED:
+        # Existence check only; the write is committed with the coalesced batch
+        if db.session.query(Ship.id).filter_by(id=ship_id).first() is None:
+            abort(404)
+    else:
+        ship = Ship.query.get_or_404(ship_id)
     
     data = request.get_json()
     if not data or 'progress' not in data:
@@ -194,22 +197,35 @@ def update_ship_progress(ship_id):
     if not isinstance(progress, (int, float)) or progress < 0 or progress > 100:
         return jsonify({'error': 'Progress must be a number between 0 and 100'}), 400
     
-    ship.progress = progress
+    values = {'progress': progress}
     
     # Update status based on progress
     if progress >= 100:
-        ship.status = 'complete'
+        values['status'] = 'complete'
     elif progress > 0:
-        ship.status = 'active'
+        values['status'] = 'active'
+    
+    response = jsonify({'message': 'Progress updated successfully'})
+    if coalescing.ENABLED:
+        return _coalesced_write(ship_id, values, response) or response
     
+    for column, value in values.items():
+        setattr(ship, column, value)
     db.session.commit()
+    cache.invalidate('ships', f'ship:{ship_id}')
     
-    return jsonify({'message': 'Progress updated successfully'})
+    return response
 
 @ships_bp.route('/api/ships/<int:ship_id>/status', methods=['PUT'])
+@idempotency.idempotent
 def update_ship_status(ship_id):
     """Update ship operation status"""
-    ship = Ship.query.get_or_404(ship_id)
+    if coalescing.ENABLED:
+        ship = db.session.query(Ship.id, Ship.status, Ship.vesselName).filter_by(id=ship_id).first()
+        if ship is None:
+            abort(404)
+    else:
+        ship = Ship.query.get_or_404(ship_id)
     
     data = request.get_json()
     if not data or 'status' not in data:
@@ -221,12 +237,26 @@ def update_ship_status(ship_id):
     if status not in valid_statuses:
         return jsonify({'error': f'Status must be one of: {", ".join(valid_statuses)}'}), 400
     
-    ship.status = status
-    db.session.commit()
+    response = jsonify({'message': 'Status updated successfully'})
+    if coalescing.ENABLED:
+        previous = coalescing.pending(ship_id).get('status', ship.status)
+        error = _coalesced_write(ship_id, {'status': status}, response)
+        if error:
+            return error
+    else:
+        previous = ship.status
+        ship.status = status
+        db.session.commit()
+        cache.invalidate('ships', f'ship:{ship_id}')
+
+    if status != previous:
+        # Queued only; devices following this ship are notified in the background
+        _notify_status(ship.id, ship.vesselName, previous, status)
     
-    return jsonify({'message': 'Status updated successfully'})
+    return response
 
 @ships_bp.route('/api/ships/<int:ship_id>/decks', methods=['PUT'])
+@idempotency.idempotent
 def update_ship_decks(ship_id):
     """Update ship deck data"""
     ship = Ship.query.get_or_404(ship_id)
@@ -237,10 +267,12 @@ def update_ship_decks(ship_id):
         
     ship.deck_data = json.dumps(data['decks'])
     db.session.commit()
+    cache.invalidate('ships', f'ship:{ship_id}')
     
     return jsonify({'message': 'Deck data updated successfully'})
 
 @ships_bp.route('/api/ships/<int:ship_id>/turnaround', methods=['PUT'])
+@idempotency.idempotent
 def update_ship_turnaround(ship_id):
     """Update ship turnaround data"""
     ship = Ship.query.get_or_404(ship_id)
@@ -251,10 +283,12 @@ def update_ship_turnaround(ship_id):
         
     ship.turnaround_data = json.dumps(data['turnaround'])
     db.session.commit()
+    cache.invalidate('ships', f'ship:{ship_id}')
     
     return jsonify({'message': 'Turnaround data updated successfully'})
 
 @ships_bp.route('/api/ships/<int:ship_id>/inventory', methods=['PUT'])
+@idempotency.idempotent
 def update_ship_inventory(ship_id):
     """Update ship inventory data"""
     ship = Ship.query.get_or_404(ship_id)
@@ -265,10 +299,12 @@ def update_ship_inventory(ship_id):
         
     ship.inventory_data = json.dumps(data['inventory'])
     db.session.commit()
+    cache.invalidate('ships', f'ship:{ship_id}')
     
     return jsonify({'message': 'Inventory data updated successfully'})
 
 @ships_bp.route('/api/ships/<int:ship_id>/hourly', methods=['PUT'])
+@idempotency.idempotent
 def update_ship_hourly(ship_id):
     """Update ship hourly quantity data"""
     ship = Ship.query.get_or_404(ship_id)
@@ -279,21 +315,28 @@ def update_ship_hourly(ship_id):
         
     ship.hourly_quantity_data = json.dumps(data['hourly'])
     db.session.commit()
+    cache.invalidate('ships', f'ship:{ship_id}')
     
     return jsonify({'message': 'Hourly data updated successfully'})
 
 @ships_bp.route('/api/ships/<int:ship_id>', methods=['DELETE'])
+@idempotency.idempotent
 def delete_ship(ship_id):
     """Delete a ship operation"""
     ship = Ship.query.get_or_404(ship_id)
     db.session.delete(ship)
     db.session.commit()
+    cache.invalidate('ships', f'ship:{ship_id}')
     
     return jsonify({'message': 'Ship operation deleted successfully'})
 
 @ships_bp.route('/api/ships/berths', methods=['GET'])
 def get_berth_status():
     """Get berth occupancy status"""
+    return cache.cached_json('berths', berth_status, cache.TTL_SHIPS, ['ships'])
+
+def berth_status():
+    """Each berth with the live ship occupying it, if any"""
     berths = {f'Berth {i}': None for i in range(1, 7)}
     active_ships = Ship.query.filter(Ship.status != 'complete').all()
     
@@ -306,13 +349,18 @@ def get_berth_status():
                 'progress': ship.progress
             }
     
-    return jsonify(berths)
+    return berths
 
 @ships_bp.route('/api/ships/stats', methods=['GET'])
 def get_operations_stats():
     """Get overall operations statistics"""
+    return cache.cached_json('stats', operations_stats, cache.TTL_SHIPS, ['ships'])
+
+def operations_stats():
+    """Dashboard KPIs over the live operations"""
     active_ships = Ship.query.filter(Ship.status != 'complete').all()
-    total_ships = Ship.query.count()
+    # One count per shard when ships are sharded by port
+    total_ships = sum(count for count, in db.session.query(func.count(Ship.id)))
     
     stats = {
         'activeShips': len(active_ships),
@@ -323,7 +371,12 @@ def get_operations_stats():
         'averageProgress': sum(s.progress for s in active_ships) / len(active_ships) if active_ships else 0
     }
     
-    return jsonify(stats)
+    return stats
+
+@ships_bp.route('/api/ships/forecast', methods=['GET'])
+def get_completion_forecast():
+    """Forecast completion time for every live operation"""
+    return cache.cached_json('forecast', forecast.forecast, forecast.FORECAST_TTL, ['ships'])
 
 @ships_bp.route('/api/health', methods=['GET'])
 def health_check():
@@ -334,7 +387,11 @@ def health_check():
 def get_analytics():
     """Get analytics data for specified period"""
     period_days = int(request.args.get('period', 30))
-    
+    return cache.cached_json(f'analytics:{period_days}', lambda: analytics(period_days),
+                             cache.TTL_ANALYTICS, ['ships'])
+
+def analytics(period_days):
+    """Hours, vehicles and team performance over the last period_days"""
     # Filter ships by date range
     end_date = datetime.now()
     start_date = end_date - timedelta(days=period_days)
@@ -431,4 +488,4 @@ def get_analytics():
         'teamPerformance': team_performance
     }
     
-    return jsonify(analytics_data)
+    return analytics_data
@@ -0,0 +1,150 @@
+from flask import Blueprint, request, jsonify
+from src.models import db
+from src.models.telemetry import ClientEvent
+from src.services import metrics, telemetry
+from datetime import datetime, timedelta
+from itertools import groupby
+
+telemetry_bp = Blueprint('telemetry', __name__)
+
+# performance-monitor.js pageLoad fields, stored as page_load events named after the field
+PAGE_LOAD_FIELDS = ['totalTime', 'serverResponse', 'domContentLoaded', 'loadComplete', 'domProcessing',
+                    'dnsLookup', 'tcpConnection']
+MAX_PERIOD_HOURS = 24 * 31
+
+def _batch():
+    """The request's JSON body, or an error response when it is too large or not JSON"""
+    if request.content_length and request.content_length > telemetry.TELEMETRY_MAX_BYTES:
+        return None, (jsonify({'error': f'Batch larger than {telemetry.TELEMETRY_MAX_BYTES} bytes'}), 413)
+    data = request.get_json(silent=True)
+    if data is None:
+        return None, (jsonify({'error': 'JSON body required'}), 400)
+    return data, None
+
+def _accept(rows, submitted):
+    """Buffer the valid rows and report how many of the submitted events were kept"""
+    rows = [row for row in rows if row is not None]
+    rejected = submitted - len(rows)
+    if len(rows) > telemetry.TELEMETRY_MAX_EVENTS:
+        return jsonify({'error': f'At most {telemetry.TELEMETRY_MAX_EVENTS} events per batch'}), 400
+    try:
+        telemetry.ingest(rows)
+    except telemetry.BufferFull:
+        metrics.count_telemetry_events('refused', len(rows))
+        return jsonify({'error': 'Telemetry buffer is full, please retry later'}), 503, {'Retry-After': '30'}
+    metrics.count_telemetry_events('accepted', len(rows))
+    metrics.count_telemetry_events('rejected', rejected)
+    return jsonify({'accepted': len(rows), 'rejected': rejected}), 202
+
+@telemetry_bp.route('/api/analytics/events', methods=['POST'])
+def ingest_events():
+    """Batched client events: {"events": [{"kind", "name", "value", "page", "timestamp", "data"}, ...]}"""
+    data, error = _batch()
+    if error:
+        return error
+    events = data.get('events') if isinstance(data, dict) else data
+    if not isinstance(events, list):
+        return jsonify({'error': 'events must be a list'}), 400
+    if len(events) > telemetry.TELEMETRY_MAX_EVENTS:
+        return jsonify({'error': f'At most {telemetry.TELEMETRY_MAX_EVENTS} events per batch'}), 400
+    received = datetime.utcnow()
+    rows = [telemetry.make_row(e.get('kind') or e.get('type'), e.get('name'), e.get('value'), e.get('page'),
+                               e.get('timestamp'), e.get('data'), received) if isinstance(e, dict) else None
+            for e in events]
+    return _accept(rows, len(events))
+
+@telemetry_bp.route('/api/analytics/offline', methods=['POST'])
+def ingest_offline():
+    """Analytics advanced-pwa.js collected while offline: {"sessions", "interactions", "errors"}"""
+    data, error = _batch()
+    if error:
+        return error
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected an object with sessions, interactions and errors'}), 400
+    received = datetime.utcnow()
+    rows, submitted = [], 0
+    for key, kind in (('sessions', 'session'), ('interactions', 'interaction'), ('errors', 'error')):
+        events = data.get(key) or []
+        if not isinstance(events, list):
+            return jsonify({'error': f'{key} must be a list'}), 400
+        submitted += len(events)
+        if submitted > telemetry.TELEMETRY_MAX_EVENTS:
+            return jsonify({'error': f'At most {telemetry.TELEMETRY_MAX_EVENTS} events per batch'}), 400
+        for event in events:
+            if not isinstance(event, dict):
+                rows.append(None)
+                continue
+            extra = {k: v for k, v in event.items() if k not in ('type', 'url', 'timestamp', 'duration')}
+            rows.append(telemetry.make_row(kind, event.get('type'), event.get('duration'), event.get('url'),
+                                           event.get('timestamp'), extra, received))
+    return _accept(rows, submitted)
+
+@telemetry_bp.route('/api/analytics/performance', methods=['POST'])
+def ingest_performance():
+    """A performance-monitor.js report: page load timings, FPS samples and the interaction summary"""
+    data, error = _batch()
+    if error:
+        return error
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a performance report object'}), 400
+    received = datetime.utcnow()
+    page = data.get('page')
+    occurred = data.get('timestamp')
+    rows = []
+    page_load = data.get('pageLoad') if isinstance(data.get('pageLoad'), dict) else {}
+    for field in PAGE_LOAD_FIELDS:
+        if field in page_load:
+            rows.append(telemetry.make_row('page_load', field, page_load[field], page, occurred, None, received))
+    fps = data.get('fps') if isinstance(data.get('fps'), list) else []
+    for sample in fps[:telemetry.TELEMETRY_MAX_EVENTS]:
+        if isinstance(sample, dict):
+            rows.append(telemetry.make_row('fps', 'fps', sample.get('value'), page, sample.get('timestamp'),
+                                           None, received))
+    summary = data.get('summary') if isinstance(data.get('summary'), dict) else {}
+    if summary.get('averageInteractionTime'):
+        rows.append(telemetry.make_row('interaction', 'averageInteractionTime', summary['averageInteractionTime'],
+                                       page, occurred, None, received))
+    if summary.get('memoryUsage'):
+        rows.append(telemetry.make_row('memory', 'usedMB', summary['memoryUsage'], page, occurred, None, received))
+    return _accept(rows, len(rows))
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+@telemetry_bp.route('/api/analytics/performance', methods=['GET'])
+def get_client_performance():
+    """Client-side timings over the last ?hours (default 24), per kind, name and page"""
+    try:
+        hours = min(float(request.args.get('hours', 24)), MAX_PERIOD_HOURS)
+    except ValueError:
+        return jsonify({'error': 'hours must be a number'}), 400
+    since = datetime.utcnow() - timedelta(hours=hours)
+
+    query = db.session.query(ClientEvent.kind, ClientEvent.name, ClientEvent.page, ClientEvent.value).filter(
+        ClientEvent.received_at >= since)
+    if request.args.get('kind'):
+        query = query.filter(ClientEvent.kind == request.args['kind'])
+    if request.args.get('page'):
+        query = query.filter(ClientEvent.page == request.args['page'])
+    # Sorted by group and value so each group's percentiles come from one pass over the stream
+    rows = query.order_by(ClientEvent.kind, ClientEvent.name, ClientEvent.page, ClientEvent.value).yield_per(5000)
+
+    groups = []
+    for (kind, name, page), group in groupby(rows, key=lambda row: (row.kind, row.name, row.page)):
+        values = []
+        count = 0
+        for row in group:
+            count += 1
+            if row.value is not None:
+                values.append(row.value)
+        entry = {'kind': kind, 'name': name, 'page': page, 'count': count}
+        if values:
+            entry.update({
+                'avg': round(sum(values) / len(values), 1),
+                'p50': _percentile(values, 0.5),
+                'p95': _percentile(values, 0.95),
+                'max': values[-1],
+            })
+        groups.append(entry)
+
+    return jsonify({'period_hours': hours, 'since': since.isoformat(), 'groups': groups})
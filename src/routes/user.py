@@ -1,5 +1,6 @@
 from flask import Blueprint, request, jsonify
 from src.models.user import db, User
+from src.services import idempotency
 
 user_bp = Blueprint('user', __name__)
 
@@ -15,6 +16,7 @@ def get_users():
     } for user in users])
 
 @user_bp.route('/users', methods=['POST'])
+@idempotency.idempotent
 def create_user():
     """Create a new user"""
     data = request.get_json()
@@ -55,6 +57,7 @@ def get_user(user_id):
     })
 
 @user_bp.route('/users/<int:user_id>', methods=['DELETE'])
+@idempotency.idempotent
 def delete_user(user_id):
     """Delete a user"""
     user = User.query.get_or_404(user_id)
@@ -0,0 +1,105 @@
+"""
+Cross-worker admission control for CPU-heavy work.
+
+A burst of PDF uploads at shift change can otherwise put every gunicorn
+worker inside pypdf at once, leaving dashboard polls queued behind them until
+the worker timeout fires. A Limiter hands out a fixed number of permits
+shared by all workers on the node: each permit is a lock file, held with
+flock for the duration of the work, so a permit is returned even when the
+process holding it is killed.
+
+Requests that find no free permit wait in a bounded queue (itself a set of
+lock files, so its length is shared too) for up to a few seconds; when the
+queue is full or the wait runs out they are rejected and the route answers
+503 with Retry-After. Queue depth, waits and rejections are exported through
+src.services.metrics.
+"""
+
+import fcntl
+import os
+import time
+from contextlib import contextmanager
+
+from src.services import metrics
+
+LOCK_DIR = os.environ.get('ADMISSION_LOCK_DIR', os.path.join(
+    '/dev/shm' if os.path.isdir('/dev/shm') else '/tmp', 'stevedores-admission'))
+EXTRACTION_PERMITS = int(os.environ.get('EXTRACTION_PERMITS', os.cpu_count() or 1))
+EXTRACTION_QUEUE_LIMIT = int(os.environ.get('EXTRACTION_QUEUE_LIMIT', EXTRACTION_PERMITS))
+EXTRACTION_QUEUE_SECONDS = float(os.environ.get('EXTRACTION_QUEUE_SECONDS', 2))
+EXTRACTION_RETRY_AFTER = int(os.environ.get('EXTRACTION_RETRY_AFTER', 5))
+# How often a queued request retries for a permit
+POLL_SECONDS = 0.05
+
+class Rejected(Exception):
+    """No permit became free; retry_after is the suggested client back-off in seconds"""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+class Limiter:
+    """Counting semaphore over flock'ed files, shared by every process using the same directory"""
+
+    def __init__(self, name, permits, queue_limit, wait_seconds, retry_after, lock_dir=LOCK_DIR):
+        self.name = name
+        self.permits = permits
+        self.queue_limit = queue_limit
+        self.wait_seconds = wait_seconds
+        self.retry_after = retry_after
+        self.lock_dir = lock_dir
+
+    def _try_lock(self, kind, count):
+        """An open, flock'ed file for the first free slot of this kind, or None"""
+        os.makedirs(self.lock_dir, exist_ok=True)
+        for slot in range(count):
+            # A fresh open file per attempt: flock excludes other threads of this process too
+            f = open(os.path.join(self.lock_dir, f'{self.name}-{kind}-{slot}.lock'), 'a')
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return f
+            except BlockingIOError:
+                f.close()
+        return None
+
+    def _reject(self, reason):
+        metrics.count_admission_rejection(self.name, reason)
+        raise Rejected(reason, self.retry_after)
+
+    def _acquire(self):
+        permit = self._try_lock('permit', self.permits)
+        if permit is not None:
+            return permit
+        place = self._try_lock('queue', self.queue_limit) if self.wait_seconds > 0 else None
+        if place is None:
+            self._reject('queue_full')
+        started = time.perf_counter()
+        metrics.track_admission_queue(self.name, 1)
+        try:
+            deadline = started + self.wait_seconds
+            while time.perf_counter() < deadline:
+                time.sleep(POLL_SECONDS)
+                permit = self._try_lock('permit', self.permits)
+                if permit is not None:
+                    return permit
+            self._reject('timeout')
+        finally:
+            metrics.track_admission_queue(self.name, -1)
+            metrics.observe_admission_wait(self.name, time.perf_counter() - started)
+            place.close()
+
+    @contextmanager
+    def permit(self):
+        """Hold one permit for the duration of the block; raises Rejected when none frees up in time"""
+        f = self._acquire()
+        metrics.track_admission_active(self.name, 1)
+        try:
+            yield
+        finally:
+            metrics.track_admission_active(self.name, -1)
+            # Closing the file releases the flock
+            f.close()
+
+EXTRACTION = Limiter('extraction', EXTRACTION_PERMITS, EXTRACTION_QUEUE_LIMIT,
+                     EXTRACTION_QUEUE_SECONDS, EXTRACTION_RETRY_AFTER)
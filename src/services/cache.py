@@ -0,0 +1,381 @@
+"""
+Two-tier cache for serialized API payloads.
+
+Tier one is an in-process LRU holding recently served bodies. Tier two is
+shared: Redis when REDIS_URL is set (redis-py is optional), so every worker
+and app node reuses one computation, or MemoryTier, an in-process stand-in
+with the same few commands for tests and single-node runs.
+
+Invalidation is by tag. Every tag has a version counter, and entries record
+the versions of their tags when they were computed; bumping a tag (the ship
+write routes call invalidate()) makes every entry carrying it stale at once,
+in both tiers and in every process. Versions live in Redis when it is
+configured and otherwise in a small shared-memory file, so invalidations
+reach all gunicorn workers on the node even without Redis.
+
+Misses are single-flight: within a process one thread computes while the
+others wait for its result, and across processes a short lock in the shared
+tier lets one worker compute while the rest poll for the value. Lookups are
+counted per tier in cache_lookups_total.
+
+Set CACHE_ENABLED=0 to compute everything on every request.
+"""
+
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from flask import current_app
+
+from src.services import metrics
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+ENABLED = os.environ.get('CACHE_ENABLED', '1') != '0'
+REDIS_URL = os.environ.get('REDIS_URL')
+KEY_PREFIX = os.environ.get('CACHE_KEY_PREFIX', 'stevedores:')
+L1_SIZE = int(os.environ.get('CACHE_L1_SIZE', 512))
+VERSIONS_FILE = os.environ.get('CACHE_VERSIONS_FILE', os.path.join(
+    '/dev/shm' if os.path.isdir('/dev/shm') else '/tmp', 'stevedores-cache-versions'))
+TTL_SHIPS = int(os.environ.get('CACHE_TTL_SHIPS', 60))
+TTL_ANALYTICS = int(os.environ.get('CACHE_TTL_ANALYTICS', 300))
+TTL_EXTRACTION = int(os.environ.get('CACHE_TTL_EXTRACTION', 3600))
+# How long a recomputation may hold the cross-process lock, and how often waiters poll
+LOCK_SECONDS = 10
+POLL_SECONDS = 0.05
+
+class Uncacheable(Exception):
+    """Raised by a compute function for a value that must be served but not stored"""
+
+    def __init__(self, value):
+        super().__init__()
+        self.value = value
+
+class CacheUnavailable(Exception):
+    """The shared tier could not be reached; callers compute without caching"""
+
+class LRUCache:
+    """Thread-safe in-process LRU of key -> (value, expires, versions)"""
+
+    def __init__(self, maxsize=L1_SIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def set(self, key, value, ttl, versions):
+        with self.lock:
+            self.entries[key] = (value, time.time() + ttl, versions)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+class MemoryTier:
+    """In-process stand-in for the Redis commands the cache uses"""
+
+    def __init__(self, maxsize=L1_SIZE * 2):
+        self.maxsize = maxsize
+        self.data = {}
+        self.lock = threading.Lock()
+
+    def _live(self, key):
+        entry = self.data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.time():
+            del self.data[key]
+            return None
+        return entry
+
+    def get(self, key):
+        with self.lock:
+            entry = self._live(key)
+            return entry[0] if entry else None
+
+    def set(self, key, value, ttl=None, nx=False):
+        with self.lock:
+            if nx and self._live(key) is not None:
+                return False
+            self.data[key] = (value, time.time() + ttl if ttl else None)
+            if len(self.data) > self.maxsize:
+                self._evict()
+            return True
+
+    def _evict(self):
+        """Drop expired keys, then the oldest, like Redis with an LRU-ish maxmemory policy"""
+        for key in list(self.data):
+            self._live(key)
+        while len(self.data) > self.maxsize:
+            del self.data[next(iter(self.data))]
+
+    def delete(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+    def incr(self, key):
+        with self.lock:
+            entry = self._live(key)
+            value = int(entry[0]) + 1 if entry else 1
+            self.data[key] = (str(value), None)
+            return value
+
+    def mget(self, keys):
+        with self.lock:
+            return [entry[0] if entry else None for entry in map(self._live, keys)]
+
+class RedisTier:
+    """The same commands against Redis, with connection errors surfaced as CacheUnavailable"""
+
+    def __init__(self, url):
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+
+    def _call(self, method, *args, **kwargs):
+        try:
+            return getattr(self.client, method)(*args, **kwargs)
+        except redis.RedisError as e:
+            raise CacheUnavailable(str(e))
+
+    def get(self, key):
+        value = self._call('get', key)
+        return value.decode('utf-8') if value is not None else None
+
+    def set(self, key, value, ttl=None, nx=False):
+        return bool(self._call('set', key, value, ex=ttl, nx=nx))
+
+    def delete(self, key):
+        self._call('delete', key)
+
+    def incr(self, key):
+        return self._call('incr', key)
+
+    def mget(self, keys):
+        return [value.decode('utf-8') if value is not None else None for value in self._call('mget', keys)]
+
+class SharedVersions:
+    """Tag versions in a memory-mapped file shared by every process on the node.
+
+    Tags hash into a fixed table of counters; a collision only costs an
+    unnecessary recomputation. Increments take an flock so none are lost.
+    """
+
+    SLOTS = 4096
+
+    def __init__(self, path=VERSIONS_FILE):
+        self.path = path
+        self._map = None
+        self._pid = None
+
+    def _table(self):
+        if self._map is None or self._pid != os.getpid():
+            size = self.SLOTS * 8
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                if os.fstat(fd).st_size < size:
+                    os.ftruncate(fd, size)
+                self._map = mmap.mmap(fd, size)
+            finally:
+                os.close(fd)
+            self._pid = os.getpid()
+        return self._map
+
+    def _slot(self, tag):
+        return zlib.crc32(tag.encode('utf-8')) % self.SLOTS * 8
+
+    def mget(self, tags):
+        table = self._table()
+        return [struct.unpack_from('Q', table, self._slot(tag))[0] for tag in tags]
+
+    def bump(self, tags):
+        table = self._table()
+        with open(self.path, 'rb') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                for tag in tags:
+                    slot = self._slot(tag)
+                    struct.pack_into('Q', table, slot, struct.unpack_from('Q', table, slot)[0] + 1)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+class TierVersions:
+    """Tag versions kept as counters in the shared tier (Redis)"""
+
+    def __init__(self, tier):
+        self.tier = tier
+
+    def mget(self, tags):
+        return [int(value or 0) for value in self.tier.mget([f'{KEY_PREFIX}tag:{tag}' for tag in tags])]
+
+    def bump(self, tags):
+        for tag in tags:
+            self.tier.incr(f'{KEY_PREFIX}tag:{tag}')
+
+class Cache:
+    """LRU in front of a shared tier, with tag versions and single-flight misses"""
+
+    def __init__(self, shared, versions, l1=None):
+        self.l1 = l1 or LRUCache()
+        self.shared = shared
+        self.versions = versions
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+
+    def _current(self, tags):
+        return ','.join(map(str, self.versions.mget(tags))) if tags else ''
+
+    def _lookup(self, key, versions):
+        """Cached value whose tag versions are still current, or None"""
+        namespace = key.split(':', 1)[0]
+        entry = self.l1.get(key)
+        hit = entry is not None and entry[2] == versions
+        metrics.count_cache_lookup(f'{namespace}.l1', hit)
+        if hit:
+            return entry[0]
+        stored = self.shared.get(KEY_PREFIX + key)
+        stored_versions, _, value = stored.partition('|') if stored is not None else ('', '', None)
+        hit = value is not None and stored_versions == versions
+        metrics.count_cache_lookup(f'{namespace}.shared', hit)
+        return value if hit else None
+
+    def get_or_compute(self, key, compute, ttl, tags=()):
+        """Cached string for key, computing and storing it with compute() on a miss"""
+        if not ENABLED:
+            return compute()
+        try:
+            versions = self._current(tags)
+            value = self._lookup(key, versions)
+        except CacheUnavailable:
+            return compute()
+        if value is not None:
+            self.l1.set(key, value, ttl, versions)
+            return value
+
+        # One computation per key within this process; the others wait for it
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = threading.Event()
+        if not leader:
+            flight.wait(LOCK_SECONDS)
+            entry = self.l1.get(key)
+            if entry is not None and entry[2] == versions:
+                return entry[0]
+            return compute()
+        try:
+            value = self._compute_shared(key, compute, ttl, versions)
+            self.l1.set(key, value, ttl, versions)
+            return value
+        finally:
+            with self._flights_lock:
+                del self._flights[key]
+            flight.set()
+
+    def _compute_shared(self, key, compute, ttl, versions):
+        """Compute under a short cross-process lock so other workers reuse the result"""
+        lock_key = f'{KEY_PREFIX}lock:{key}'
+        try:
+            locked = self.shared.set(lock_key, '1', LOCK_SECONDS, nx=True)
+            if not locked:
+                deadline = time.time() + LOCK_SECONDS
+                while time.time() < deadline:
+                    time.sleep(POLL_SECONDS)
+                    stored = self.shared.get(KEY_PREFIX + key)
+                    if stored is not None and stored.partition('|')[0] == versions:
+                        return stored.partition('|')[2]
+                    if self.shared.get(lock_key) is None:
+                        # The computing worker finished without storing a value (an error or Uncacheable)
+                        break
+            try:
+                value = compute()
+            except BaseException:
+                # Release early (e.g. on a 404) so waiters stop polling
+                if locked:
+                    self.shared.delete(lock_key)
+                raise
+            self.shared.set(KEY_PREFIX + key, f'{versions}|{value}', ttl)
+            if locked:
+                self.shared.delete(lock_key)
+            return value
+        except CacheUnavailable:
+            return compute()
+
+    def invalidate(self, *tags):
+        if not ENABLED:
+            return
+        try:
+            self.versions.bump(tags)
+        except CacheUnavailable:
+            # Entries still expire by TTL; nothing better to do while the shared tier is down
+            pass
+
+def init_app(app):
+    """Warn at startup when REDIS_URL is set but redis-py is missing, leaving the cache per node"""
+    if REDIS_URL and redis is None:
+        app.logger.warning('REDIS_URL is set but the redis package is not installed; '
+                           'caching in process memory on each node instead')
+
+def _build():
+    if REDIS_URL and redis is not None:
+        tier = RedisTier(REDIS_URL)
+        return Cache(tier, TierVersions(tier))
+    return Cache(MemoryTier(), SharedVersions())
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = _build()
+    return _cache
+
+def set_cache(cache):
+    """Swap the process-wide cache, e.g. for a Cache(MemoryTier(), ...) in tests"""
+    global _cache
+    _cache = cache
+
+def get_or_compute(key, compute, ttl, tags=()):
+    return get_cache().get_or_compute(key, compute, ttl, tags)
+
+def invalidate(*tags):
+    get_cache().invalidate(*tags)
+
+def cached_json(key, compute, ttl, tags=(), cacheable=None):
+    """JSON response for compute()'s value, served from cache while its tags are unchanged
+
+    Values for which cacheable(value) is false are served but not stored.
+    """
+    def render():
+        value = compute()
+        body = current_app.json.response(value).get_data(as_text=True)
+        if cacheable is not None and not cacheable(value):
+            raise Uncacheable(body)
+        return body
+
+    try:
+        body = get_or_compute(key, render, ttl, tags)
+    except Uncacheable as e:
+        body = e.value
+    return current_app.response_class(body, mimetype=current_app.json.mimetype)
@@ -0,0 +1,231 @@
+"""
+Resumable chunked uploads.
+
+An upload session lives in its own directory under UPLOAD_FOLDER/.sessions:
+a preallocated data file that every chunk is written into at its offset,
+and meta.json recording the declared size, the client that started it and
+the byte ranges received so far. Sessions are plain files guarded by a lock file,
+so chunks of one upload may land on any gunicorn worker, in any order, and a
+client that lost its connection asks for the received ranges and resends
+only what is missing.
+
+Each chunk is hashed while it streams to disk so X-Chunk-SHA256 can be
+checked. The upload's content hash is the SHA-256 of the assembled file,
+the same value pdf_index.file_sha256 and a client hashing the whole file
+compute. Every session reserves its declared size on disk, so open
+sessions are capped in total (UPLOAD_MAX_SESSIONS) and per client
+(UPLOAD_MAX_SESSIONS_PER_CLIENT).
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+
+from src.services import pdf_index
+
+CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', 1024 * 1024))
+SESSION_TTL = int(os.environ.get('UPLOAD_SESSION_TTL', 24 * 3600))
+MAX_SESSIONS = int(os.environ.get('UPLOAD_MAX_SESSIONS', 100))
+MAX_SESSIONS_PER_CLIENT = int(os.environ.get('UPLOAD_MAX_SESSIONS_PER_CLIENT', 5))
+STREAM_BLOCK = 64 * 1024
+
+class UploadError(Exception):
+    """A chunk or session request the client has to correct"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+def _sessions_dir(upload_folder):
+    return os.path.join(upload_folder, '.sessions')
+
+def _session_dir(upload_folder, upload_id):
+    # Ids are generated as uuid4 hex; anything else cannot name a session
+    if not upload_id.isalnum():
+        raise UploadError('Upload not found', 404)
+    path = os.path.join(_sessions_dir(upload_folder), upload_id)
+    if not os.path.isdir(path):
+        raise UploadError('Upload not found', 404)
+    return path
+
+@contextmanager
+def _locked(session_dir, name='lock', shared=False):
+    try:
+        lock = open(os.path.join(session_dir, name), 'w')
+    except FileNotFoundError:
+        # Finalized or aborted meanwhile
+        raise UploadError('Upload not found', 404) from None
+    with lock:
+        fcntl.flock(lock, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+def _read_meta(session_dir):
+    with open(os.path.join(session_dir, 'meta.json')) as f:
+        return json.load(f)
+
+def _write_meta(session_dir, meta):
+    path = os.path.join(session_dir, 'meta.json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump(meta, f)
+    os.replace(path + '.tmp', path)
+
+def _merge_range(ranges, start, end):
+    """Add [start, end) to a sorted list of disjoint ranges"""
+    merged = []
+    for lo, hi in sorted(ranges + [[start, end]]):
+        if merged and lo <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], hi)
+        else:
+            merged.append([lo, hi])
+    return merged
+
+def _missing(ranges, size):
+    missing, position = [], 0
+    for lo, hi in ranges:
+        if lo > position:
+            missing.append([position, lo])
+        position = max(position, hi)
+    if position < size:
+        missing.append([position, size])
+    return missing
+
+def status(meta, upload_id):
+    missing = _missing(meta['received'], meta['size'])
+    return {
+        'upload_id': upload_id,
+        'filename': meta['filename'],
+        'size': meta['size'],
+        'chunk_size': meta['chunk_size'],
+        'received': meta['received'],
+        'received_bytes': sum(hi - lo for lo, hi in meta['received']),
+        'missing': missing,
+        'complete': not missing,
+    }
+
+def sweep_expired(upload_folder):
+    """Remove sessions untouched for longer than SESSION_TTL"""
+    root = _sessions_dir(upload_folder)
+    if not os.path.isdir(root):
+        return
+    cutoff = time.time() - SESSION_TTL
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        try:
+            if os.path.getmtime(os.path.join(path, 'meta.json')) < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+        except OSError:
+            pass
+
+@contextmanager
+def _creation_lock(upload_folder):
+    """Serialize session creation across workers so the caps hold"""
+    root = _sessions_dir(upload_folder)
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, '.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield root
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+def _open_sessions(root):
+    """Client of every open session"""
+    clients = []
+    for name in os.listdir(root):
+        if not name.isalnum():
+            continue
+        try:
+            clients.append(_read_meta(os.path.join(root, name)).get('client'))
+        except (OSError, ValueError):
+            # Being created or removed right now
+            continue
+    return clients
+
+def create_session(upload_folder, filename, size, client=None):
+    """Start an upload of size bytes for client (e.g. its address) and return its status"""
+    sweep_expired(upload_folder)
+    upload_id = uuid.uuid4().hex
+    with _creation_lock(upload_folder) as root:
+        clients = _open_sessions(root)
+        if len(clients) >= MAX_SESSIONS:
+            raise UploadError('Too many uploads in progress, please retry later', 429)
+        if client is not None and clients.count(client) >= MAX_SESSIONS_PER_CLIENT:
+            raise UploadError(f'At most {MAX_SESSIONS_PER_CLIENT} uploads may be in progress at once; '
+                              'finish or discard one first', 429)
+        session_dir = os.path.join(root, upload_id)
+        os.makedirs(session_dir)
+        meta = {'filename': filename, 'size': size, 'chunk_size': CHUNK_SIZE, 'client': client,
+                'received': [], 'created': time.time()}
+        _write_meta(session_dir, meta)
+    # Preallocate (sparsely) so chunks can be written at any offset
+    with open(os.path.join(session_dir, 'data'), 'wb') as f:
+        f.truncate(size)
+    return status(meta, upload_id)
+
+def get_status(upload_folder, upload_id):
+    return status(_read_meta(_session_dir(upload_folder, upload_id)), upload_id)
+
+def write_chunk(upload_folder, upload_id, index, offset, stream, expected_sha256=None):
+    """Stream one chunk into the data file at offset and record its range and hash"""
+    session_dir = _session_dir(upload_folder, upload_id)
+    meta = _read_meta(session_dir)
+    if offset is None:
+        offset = index * meta['chunk_size']
+    if offset < 0 or offset >= meta['size']:
+        raise UploadError('Chunk offset outside the declared file size')
+    limit = min(meta['chunk_size'], meta['size'] - offset)
+
+    # Chunks hold the session lock shared so they can stream in parallel, while finalize holds it exclusively
+    # and never moves the data file out from under a chunk being written or recorded
+    with _locked(session_dir, shared=True):
+        digest = hashlib.sha256()
+        written = 0
+        try:
+            f = open(os.path.join(session_dir, 'data'), 'r+b')
+        except FileNotFoundError:
+            raise UploadError('Upload not found', 404) from None
+        with f:
+            f.seek(offset)
+            while True:
+                block = stream.read(STREAM_BLOCK)
+                if not block:
+                    break
+                written += len(block)
+                if written > limit:
+                    raise UploadError(f'Chunk exceeds {limit} bytes allowed at offset {offset}', 413)
+                digest.update(block)
+                f.write(block)
+        if not written:
+            raise UploadError('Empty chunk')
+        chunk_hash = digest.hexdigest()
+        if expected_sha256 and expected_sha256.lower() != chunk_hash:
+            # Leave the range unrecorded so the client resends it
+            raise UploadError('Chunk checksum mismatch', 422)
+
+        with _locked(session_dir, 'meta.lock'):
+            meta = _read_meta(session_dir)
+            meta['received'] = _merge_range(meta['received'], offset, offset + written)
+            _write_meta(session_dir, meta)
+    return status(meta, upload_id)
+
+def finalize(upload_folder, upload_id, target_path):
+    """Move a complete upload to target_path; returns (size, content hash)"""
+    session_dir = _session_dir(upload_folder, upload_id)
+    with _locked(session_dir):
+        meta = _read_meta(session_dir)
+        if _missing(meta['received'], meta['size']):
+            raise UploadError('Upload is incomplete', 409)
+        os.replace(os.path.join(session_dir, 'data'), target_path)
+    shutil.rmtree(session_dir, ignore_errors=True)
+    return meta['size'], pdf_index.file_sha256(target_path)
+
+def abort(upload_folder, upload_id):
+    shutil.rmtree(_session_dir(upload_folder, upload_id), ignore_errors=True)
@@ -0,0 +1,182 @@
+"""
+Write coalescing for ship progress and status updates.
+
+With COALESCE_WRITES=1, the progress and status routes don't commit their
+own transactions. They put the new column values into this worker's
+pending batch, keyed by ship with the last write winning. A flusher thread
+then writes the batch in one transaction COALESCE_WINDOW_MS after its first
+write arrived. Each request waits for that commit before it responds, so a
+successful response still means the update is stored. On SQLite this
+turns a burst of taps into one write lock per window instead of one per
+tap.
+
+Values are applied in the order the requests arrived, and progress updates
+carry the status they imply, so the result matches running the requests
+one after another. Requests carrying an Idempotency-Key have their
+key record and response inserted in the same transaction.
+
+Until its batch is committed, a pending value is visible to ship payloads
+served by the same worker (see pending()). Other workers and the berth,
+stats and analytics aggregates see it after the commit. If the commit
+fails, every request in the batch gets NotFlushed and nothing from the
+batch is stored. With SHARD_BY_PORT the batch is committed one port
+database at a time, so ports committed before a failure keep their
+values; retrying those requests writes the same values again.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import and_, bindparam, select, update
+
+from src.models import db
+from src.models.idempotency import IdempotencyRecord
+from src.models.ship import Ship
+from src.services import cache, metrics, shards
+
+ENABLED = os.environ.get('COALESCE_WRITES', '0') == '1'
+COALESCE_WINDOW_MS = float(os.environ.get('COALESCE_WINDOW_MS', 50))
+# How long a request waits for its batch to be committed before giving up with 503
+COALESCE_TIMEOUT = float(os.environ.get('COALESCE_TIMEOUT', 10))
+
+class NotFlushed(Exception):
+    """The batch holding this write failed to commit or did not commit in time"""
+
+class Batch:
+    """Writes collected during one window and the event set once they are committed"""
+
+    def __init__(self):
+        self.ships = {}
+        self.records = {}
+        self.requests = 0
+        self.done = threading.Event()
+        self.error = None
+
+class Coalescer:
+    """Pending batch and flusher thread for one worker process"""
+
+    def __init__(self, app, window=COALESCE_WINDOW_MS / 1000):
+        self.app = app
+        self.window = window
+        self.lock = threading.Lock()
+        self.batch = Batch()
+        # The batch being committed, still visible to pending() until the commit finishes
+        self.flushing = None
+        self.wake = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='write-coalescer', daemon=True)
+        self.thread.start()
+
+    def submit(self, ship_id, values, record=None):
+        """Add values for ship_id to the pending batch; returns the batch to wait on"""
+        with self.lock:
+            batch = self.batch
+            batch.ships.setdefault(ship_id, {}).update(values)
+            if record is not None:
+                # A duplicate in the same batch applied the same values; the first one's record stands
+                batch.records.setdefault(record['key'], (ship_id, record))
+            batch.requests += 1
+        self.wake.set()
+        return batch
+
+    def pending(self, ship_id):
+        """Values written for ship_id that are not committed yet"""
+        with self.lock:
+            values = dict(self.flushing.ships.get(ship_id, ())) if self.flushing else {}
+            values.update(self.batch.ships.get(ship_id, ()))
+        return values
+
+    def _run(self):
+        while True:
+            self.wake.wait()
+            time.sleep(self.window)
+            self.wake.clear()
+            self.flush()
+
+    def flush(self):
+        """Commit the pending batch and release the requests waiting on it"""
+        with self.lock:
+            batch, self.batch = self.batch, Batch()
+            self.flushing = batch
+        if not batch.requests:
+            self.flushing = None
+            return batch
+        try:
+            with self.app.app_context():
+                self._write(batch)
+        except Exception as e:
+            self.app.logger.exception('Coalesced write of %d ships failed', len(batch.ships))
+            batch.error = e
+        finally:
+            with self.lock:
+                self.flushing = None
+            with self.app.app_context():
+                cache.invalidate('ships', *(f'ship:{ship_id}' for ship_id in batch.ships))
+            batch.done.set()
+        metrics.count_coalesced_writes('failed' if batch.error else 'stored', batch.requests)
+        return batch
+
+    def _write(self, batch):
+        ship = Ship.__table__
+        record = IdempotencyRecord.__table__
+        # One transaction per database holding the batch's ships (only the primary unless SHARD_BY_PORT is set)
+        for engine, ship_ids in shards.owner_engines(list(batch.ships)).items():
+            # One executemany UPDATE per combination of columns written
+            groups = {}
+            for ship_id in ship_ids:
+                values = batch.ships[ship_id]
+                groups.setdefault(tuple(sorted(values)), []).append(
+                    dict({f'new_{column}': value for column, value in values.items()}, ship_id=ship_id))
+            owned = set(ship_ids)
+            records = {key: row for key, (ship_id, row) in batch.records.items() if ship_id in owned}
+            with engine.begin() as conn:
+                for columns, rows in groups.items():
+                    statement = update(ship).where(ship.c.id == bindparam('ship_id')).values(
+                        {column: bindparam(f'new_{column}') for column in columns})
+                    conn.execute(statement, rows)
+                if records:
+                    # Keys past their expiry are reused, as on the uncoalesced path
+                    conn.execute(record.delete().where(and_(record.c.key.in_(list(records)),
+                                                            record.c.expires_at <= datetime.utcnow())))
+                    # Another worker may have stored one of these keys while this batch was pending
+                    taken = set(conn.execute(select(record.c.key).where(record.c.key.in_(list(records)))).scalars())
+                    rows = [row for key, row in records.items() if key not in taken]
+                    if rows:
+                        conn.execute(record.insert(), rows)
+
+_coalescer = None
+_coalescer_pid = None
+_coalescer_lock = threading.Lock()
+
+def get_coalescer(app=None):
+    """This process's coalescer, started after the fork that created the worker"""
+    global _coalescer, _coalescer_pid
+    if _coalescer is None or _coalescer_pid != os.getpid():
+        with _coalescer_lock:
+            if _coalescer is None or _coalescer_pid != os.getpid():
+                _coalescer = Coalescer(app or current_app._get_current_object())
+                _coalescer_pid = os.getpid()
+    return _coalescer
+
+def set_coalescer(coalescer):
+    """Swap the process-wide coalescer, e.g. for one with a longer window in benchmarks"""
+    global _coalescer, _coalescer_pid
+    _coalescer, _coalescer_pid = coalescer, os.getpid()
+
+def pending(ship_id):
+    """Uncommitted values for ship_id in this worker, empty when coalescing is off"""
+    if not ENABLED or _coalescer is None or _coalescer_pid != os.getpid():
+        return {}
+    return _coalescer.pending(ship_id)
+
+def write(ship_id, values, record=None):
+    """Store values for ship_id with the next batch, returning once that batch is committed"""
+    coalescer = get_coalescer()
+    batch = coalescer.submit(ship_id, values, record)
+    cache.invalidate('ships', f'ship:{ship_id}')
+    if not batch.done.wait(COALESCE_TIMEOUT):
+        raise NotFlushed()
+    if batch.error is not None:
+        raise NotFlushed() from batch.error
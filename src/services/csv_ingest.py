@@ -0,0 +1,287 @@
+"""
+Structured, streaming CSV ingestion for manifests and cargo lists.
+
+The encoding is sniffed from a leading byte sample, rows are streamed with
+the csv module, and header names are mapped to the same field names
+parse_maritime_data produces through an alias table. Three layouts are
+understood, in any mix:
+
+- key/value rows ("Vessel Name,Atlantic Pioneer")
+- a header row of field names followed by a row of values
+- a cargo table (a VIN column, or make and quantity columns, plus any of
+  terminal / type) whose rows are aggregated into vehicle counts by terminal,
+  brand and cargo type
+
+Only counters are kept while streaming, so memory stays flat however many VIN
+rows the file has. Extra aliases can be supplied as JSON through
+CSV_ALIASES_FILE, e.g. {"vesselName": ["carrier name"]}.
+"""
+
+import codecs
+import csv
+import functools
+import json
+import os
+import re
+
+SNIFF_BYTES = 64 * 1024
+PREVIEW_CHARS = 1000
+
+# Header aliases for single-value fields, keyed by parsed field name
+CSV_FIELD_ALIASES = {
+    'vesselName': ['vessel name', 'vessel', 'ship name', 'ship', 'name of vessel'],
+    'vesselType': ['vessel type', 'ship type'],
+    'shippingLine': ['shipping line', 'line', 'carrier'],
+    'port': ['port', 'discharge port', 'loading port', 'destination port'],
+    'operationDate': ['operation date', 'date', 'eta'],
+    'company': ['stevedoring company', 'company', 'stevedore'],
+    'operationType': ['operation type', 'operation', 'type of operation'],
+    'berthLocation': ['berth location', 'berth', 'berth assignment'],
+    'operationManager': ['operation manager', 'manager'],
+    'autoOperationsLead': ['auto operations lead', 'auto operations team lead supervisor', 'auto ops lead', 'auto lead'],
+    'autoOperationsAssistant': ['auto operations assistant', 'auto operations team assistant supervisor',
+                                'auto ops assistant', 'auto assistant'],
+    'heavyHeavyLead': ['high & heavy lead', 'high & heavy team lead supervisor', 'heavy ops lead', 'heavy lead'],
+    'heavyHeavyAssistant': ['high & heavy assistant', 'high & heavy team assistant supervisor',
+                            'heavy ops assistant', 'heavy assistant'],
+    'totalAutomobilesDischarge': ['total automobiles', 'total automobiles to discharge', 'automobiles discharge',
+                                  'total vehicles', 'automobiles'],
+    'heavyEquipmentDischarge': ['heavy equipment', 'heavy equipment to discharge', 'high & heavy', 'hh'],
+    'electricVehicles': ['electric vehicles', 'ev'],
+    'staticCargo': ['static cargo', 'static cargo units'],
+    'cargoType': ['cargo type', 'cargo brand/type', 'brand/type'],
+    'brvTarget': ['brv', 'brv target', 'brv terminal', 'brv loading target'],
+    'zeeTarget': ['zee', 'zee target', 'zee compound', 'zee loading target'],
+    'souTarget': ['sou', 'sou target', 'sou facility', 'sou loading target'],
+    'expectedRate': ['expected rate', 'rate', 'processing rate'],
+    'totalDrivers': ['total drivers', 'drivers'],
+    'shiftStart': ['shift start', 'start time'],
+    'shiftEnd': ['shift end', 'end time'],
+    'breakDuration': ['break duration', 'break'],
+    'numVans': ['number of vans', 'vans'],
+    'numStationWagons': ['number of station wagons', 'station wagons'],
+    'zoneA': ['zone a'],
+    'zoneB': ['zone b'],
+    'zoneC': ['zone c'],
+}
+
+# Cargo table columns; a row naming vin plus another, or make plus quantity, starts a table
+CSV_COLUMN_ALIASES = {
+    'vin': ['vin', 'vin number', 'chassis', 'chassis number'],
+    'make': ['make', 'brand', 'manufacturer'],
+    'terminal': ['terminal', 'dest', 'destination', 'facility'],
+    'cargo': ['cargo', 'type', 'category', 'vehicle type', 'unit type'],
+    'quantity': ['quantity', 'qty', 'units', 'count'],
+}
+
+# Brand counts, named as parse_maritime_data names them
+BRAND_FIELDS = {
+    'mercedes-benz': 'mbCount', 'mercedes': 'mbCount', 'mb': 'mbCount',
+    'bmw': 'bmwCount',
+    'land rover': 'lrCount', 'lr': 'lrCount',
+    'rolls-royce': 'rrCount', 'rolls royce': 'rrCount', 'rr': 'rrCount',
+    'audi': 'audi', 'porsche': 'porsche', 'mini': 'mini', 'jaguar': 'jaguar',
+}
+
+TERMINAL_FIELDS = {
+    'brv': 'brvTarget', 'brunswick': 'brvTarget',
+    'zee': 'zeeTarget',
+    'sou': 'souTarget', 'southern': 'souTarget',
+}
+
+NUMERIC_FIELDS = {
+    'totalAutomobilesDischarge', 'heavyEquipmentDischarge', 'electricVehicles', 'staticCargo',
+    'brvTarget', 'zeeTarget', 'souTarget', 'totalDrivers', 'breakDuration', 'numVans',
+    'numStationWagons', 'zoneA', 'zoneB', 'zoneC',
+} | set(BRAND_FIELDS.values())
+
+def _normalize(name):
+    return re.sub(r'[^a-z0-9&/\-]+', ' ', name.lower()).strip(' -')
+
+def _build_lookup(aliases):
+    return {_normalize(alias): key for key, names in aliases.items() for alias in names}
+
+def _load_aliases():
+    aliases = {field: list(names) for field, names in CSV_FIELD_ALIASES.items()}
+    extra_path = os.environ.get('CSV_ALIASES_FILE')
+    if extra_path:
+        with open(extra_path) as f:
+            for field, names in json.load(f).items():
+                aliases.setdefault(field, []).extend(names)
+    return aliases
+
+FIELD_LOOKUP = _build_lookup(_load_aliases())
+COLUMN_LOOKUP = _build_lookup(CSV_COLUMN_ALIASES)
+BRAND_LOOKUP = {_normalize(name): field for name, field in BRAND_FIELDS.items()}
+
+def sniff_encoding(file_path):
+    """Guess a text encoding from the first SNIFF_BYTES of the file"""
+    with open(file_path, 'rb') as f:
+        sample = f.read(SNIFF_BYTES)
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+    try:
+        # final=False tolerates a multi-byte character cut off by the sample
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        pass
+    try:
+        sample.decode('cp1252')
+        return 'cp1252'
+    except UnicodeDecodeError:
+        return 'latin-1'
+
+def _number(value):
+    match = re.search(r'\d+', value.replace(',', ''))
+    return int(match.group(0)) if match else None
+
+def _set_field(fields, field, value):
+    value = value.strip()
+    if not value or field in fields:
+        return
+    if field in NUMERIC_FIELDS:
+        value = _number(value)
+        if value is None:
+            return
+    fields[field] = value
+
+# Cargo cells repeat a handful of values, so classify each distinct value once
+@functools.lru_cache(maxsize=1024)
+def _cargo_field(value):
+    cargo = _normalize(value)
+    if 'heavy' in cargo or cargo in ('hh', 'h&h'):
+        return 'heavyEquipmentDischarge'
+    if 'electric' in cargo or cargo == 'ev':
+        return 'electricVehicles'
+    if 'static' in cargo:
+        return 'staticCargo'
+    return 'totalAutomobilesDischarge'
+
+@functools.lru_cache(maxsize=1024)
+def _brand_field(value):
+    return BRAND_LOOKUP.get(_normalize(value))
+
+@functools.lru_cache(maxsize=1024)
+def _terminal_field(value):
+    return TERMINAL_FIELDS.get(_normalize(value).split(' ')[0])
+
+@functools.lru_cache(maxsize=1024)
+def _column(cell):
+    return COLUMN_LOOKUP.get(_normalize(cell))
+
+def _is_table_header(row):
+    """Cheap check for a cargo table header, safe to run on every row"""
+    columns = set()
+    for cell in row:
+        name = cell.strip().lower()
+        # Plain alphanumeric cells (VINs, counts) are already normalized and too varied to cache
+        column = COLUMN_LOOKUP.get(name) if name.isalnum() else _column(name)
+        if column:
+            columns.add(column)
+    # Each VIN row is one unit; a make column needs a quantity column to count with. Terminal or type
+    # columns alone are key/value headers ("Terminal,Units") rather than a table.
+    return 'vin' in columns and len(columns) >= 2 or {'make', 'quantity'} <= columns
+
+class _CargoTable:
+    """Single-pass aggregation over cargo table rows"""
+
+    def __init__(self, header):
+        self.columns = {}
+        for index, cell in enumerate(header):
+            column = _column(cell)
+            if column and column not in self.columns:
+                self.columns[column] = index
+        self.rows = 0
+        self.counts = {}
+
+    def _cell(self, row, column):
+        index = self.columns.get(column)
+        return row[index] if index is not None and index < len(row) else ''
+
+    def _add(self, field, units):
+        if field:
+            self.counts[field] = self.counts.get(field, 0) + units
+
+    def add(self, row):
+        units = _number(self._cell(row, 'quantity')) if 'quantity' in self.columns else 1
+        if not units:
+            return
+        self.rows += 1
+        self._add(_cargo_field(self._cell(row, 'cargo')), units)
+        self._add(_brand_field(self._cell(row, 'make')), units)
+        self._add(_terminal_field(self._cell(row, 'terminal')), units)
+
+def ingest_csv(file_path):
+    """Stream a CSV file once and map it onto parsed field names
+
+    Returns a dict with the mapped 'fields' plus the detected encoding,
+    delimiter, row counts and a short text preview.
+    """
+    encoding = sniff_encoding(file_path)
+    with open(file_path, 'r', encoding=encoding, errors='replace', newline='') as f:
+        preview = f.read(PREVIEW_CHARS)
+        try:
+            dialect = csv.Sniffer().sniff(preview, delimiters=',;\t|')
+        except csv.Error:
+            dialect = csv.excel
+        f.seek(0)
+
+        fields = {}
+        tables = []
+        header_fields = None
+        rows = 0
+        for row in csv.reader(f, dialect):
+            rows += 1
+            if _is_table_header(row):
+                tables.append(_CargoTable(row))
+                header_fields = None
+                continue
+            if tables:
+                if any(row):
+                    tables[-1].add(row)
+                continue
+
+            cells = [cell.strip() for cell in row]
+            if not any(cells):
+                continue
+            names = [_normalize(cell) for cell in cells]
+
+            if header_fields is not None:
+                for field, value in zip(header_fields, cells):
+                    if field:
+                        _set_field(fields, field, value)
+                header_fields = None
+                continue
+            mapped = [FIELD_LOOKUP.get(name) or BRAND_LOOKUP.get(name) for name in names]
+            if sum(1 for field in mapped if field) >= 2:
+                header_fields = mapped
+            elif mapped[0] and len(cells) > 1:
+                _set_field(fields, mapped[0], next((cell for cell in cells[1:] if cell), ''))
+
+    # Explicit header values win over counts aggregated from cargo rows
+    cargo_rows = 0
+    for table in tables:
+        cargo_rows += table.rows
+        for field, count in table.counts.items():
+            if field not in fields:
+                fields[field] = count
+
+    # Alternative names parse_maritime_data also sets
+    if 'totalAutomobilesDischarge' in fields:
+        fields['totalAutomobiles'] = fields['automobiles'] = fields['totalAutomobilesDischarge']
+    if 'heavyEquipmentDischarge' in fields:
+        fields['heavyEquipment'] = fields['heavyEquipmentDischarge']
+    if 'berthLocation' in fields:
+        fields['berth'] = fields['berthAssignment'] = fields['berthLocation']
+
+    return {
+        'fields': fields,
+        'encoding': encoding,
+        'delimiter': dialect.delimiter,
+        'rows': rows,
+        'cargo_rows': cargo_rows,
+        'preview': preview,
+    }
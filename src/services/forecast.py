@@ -0,0 +1,278 @@
+"""
+Completion forecasts for every live ship operation.
+
+Each ship's discharge rate blends the hourly counts recorded on its
+ship-info screen with its planned expectedRate. Recent hours weigh more
+(FORECAST_HALF_LIFE_HOURS), and the observed rate takes over fully once
+FORECAST_BLEND_HOURS have been recorded. When turnaround times are known,
+the rate is capped by what totalDrivers can move:
+drivers * 60 / average round trip minutes per hour. The vehicles left are
+then laid out over the ship's shift windows (shiftStart to shiftEnd,
+overnight shifts included, with breakDuration taken mid-shift) to give the
+time the last one comes off.
+
+All live ships are forecast in one vectorized pass over a matrix of their
+inputs with NumPy when it is installed (pip install numpy), and one ship at
+a time otherwise. Each worker keeps every live ship's row of that matrix and
+rebuilds it only when the ship's updatedAt, progress or JSON blobs change,
+so a pass reads one narrow column set and parses nothing new for ships that
+did not move. Shift times are local time, as
+entered in the wizard.
+"""
+
+import json
+import math
+import os
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+from src.models import db
+from src.models.ship import Ship
+
+FORECAST_TTL = int(os.environ.get('FORECAST_TTL', 60))
+FORECAST_HOURS = int(os.environ.get('FORECAST_HOURS', 12))
+FORECAST_HALF_LIFE_HOURS = float(os.environ.get('FORECAST_HALF_LIFE_HOURS', 2))
+FORECAST_BLEND_HOURS = float(os.environ.get('FORECAST_BLEND_HOURS', 3))
+EPOCH = datetime(1970, 1, 1)
+
+_numpy = None
+
+def _load_numpy():
+    """NumPy, imported on the first forecast rather than at startup; False when it is not installed"""
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = False
+    return _numpy
+
+def _hours(value, default):
+    """'HH:MM' as hours since midnight"""
+    try:
+        hours, minutes = str(value).split(':')[:2]
+        return int(hours) % 24 + int(minutes) / 60
+    except (TypeError, ValueError):
+        return default
+
+def _number(value, default=0.0):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return default
+    return number if math.isfinite(number) else default
+
+def _hourly(blob):
+    """(recorded total, last FORECAST_HOURS counts oldest first) from hourly_quantity_data"""
+    try:
+        data = json.loads(blob) if blob else {}
+    except ValueError:
+        data = {}
+    if not isinstance(data, dict):
+        return 0.0, ()
+    counts = []
+    for hour, quantity in data.items():
+        try:
+            counts.append((int(hour), max(_number(quantity), 0.0)))
+        except (TypeError, ValueError):
+            continue
+    counts.sort()
+    return sum(q for _, q in counts), tuple(q for _, q in counts[-FORECAST_HOURS:])
+
+def _turnaround(blob):
+    """Average driver round trip in minutes, or 0 when unknown"""
+    try:
+        data = json.loads(blob) if blob else {}
+    except ValueError:
+        return 0.0
+    return max(_number(data.get('average')), 0.0) if isinstance(data, dict) else 0.0
+
+def _seconds(moment):
+    return (moment - EPOCH).total_seconds()
+
+def _minute(seconds):
+    return EPOCH + timedelta(seconds=round(seconds / 60) * 60)
+
+# Leading columns of a ship's feature row; FORECAST_HOURS hourly counts and as many "count recorded" flags follow
+FIELDS = ('total', 'progress', 'recorded', 'expected', 'drivers', 'turnaround', 'start', 'length', 'pause',
+          'opening')
+
+def _features(row):
+    """A ship's forecast inputs as one row of floats, in FIELDS order followed by its hourly window"""
+    recorded, counts = _hourly(row.hourly_quantity_data)
+    start = _hours(row.shiftStart, 7.0)
+    opening = 0.0
+    if row.operationDate:
+        opening = _seconds(datetime.combine(row.operationDate, datetime.min.time())) + start * 3600
+    padding = FORECAST_HOURS - len(counts)
+    return (
+        max(_number(row.totalVehicles), 0.0),
+        min(max(_number(row.progress), 0.0), 100.0),
+        recorded,
+        max(_number(row.expectedRate), 0.0),
+        max(_number(row.totalDrivers), 0.0),
+        _turnaround(row.turnaround_data),
+        start,
+        (_hours(row.shiftEnd, start + 8) - start) % 24 or 24.0,
+        max(_number(row.breakDuration), 0.0) / 60,
+        opening,
+    ) + (0.0,) * padding + counts + (0.0,) * padding + (1.0,) * len(counts)
+
+def _forecast_numpy(features, now):
+    """Completion time (seconds since EPOCH, NaN if unknown), rate, hours of work and vehicles left per ship"""
+    np = _load_numpy()
+    matrix = np.array(features, dtype=float)
+    total, progress, recorded, expected, drivers, turnaround, start, length, pause, opening = (
+        matrix[:, i] for i in range(len(FIELDS)))
+    counts = matrix[:, len(FIELDS):len(FIELDS) + FORECAST_HOURS]
+    observed = matrix[:, len(FIELDS) + FORECAST_HOURS:]
+
+    weights = 0.5 ** (np.arange(FORECAST_HOURS - 1, -1, -1) / FORECAST_HALF_LIFE_HOURS) * observed
+    weight_sum = weights.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        observed_rate = np.where(weight_sum > 0, (counts * weights).sum(axis=1) / weight_sum, 0.0)
+        blend = np.minimum(observed.sum(axis=1) / FORECAST_BLEND_HOURS, 1.0)
+        planned = np.where(expected > 0, expected, observed_rate)
+        rate = blend * observed_rate + (1 - blend) * planned
+        rate = np.where(turnaround > 0, np.minimum(rate, drivers * 60 / turnaround), rate)
+
+        remaining = np.maximum(total - np.maximum(total * progress / 100, recorded), 0.0)
+        work = np.where(remaining == 0, 0.0, np.where(rate > 0, remaining / rate, np.nan))
+
+        pause = np.minimum(pause, length)
+        shift_work = length - pause
+        pause_at = (length - pause) / 2
+
+        # Hours since the latest shift start, and the working hours of that shift already gone
+        since_start = ((now % 86400) / 3600 - start) % 24
+        anchor = now - since_start * 3600
+        worked = np.clip(since_start, 0, length) - np.clip(since_start - pause_at, 0, pause)
+        upcoming = opening > now
+        anchor = np.where(upcoming, opening, anchor)
+        worked = np.where(upcoming, 0.0, worked)
+
+        # Whole shifts the work still fills, then the working hours into the shift it ends in
+        target = worked + work
+        days = np.maximum(np.ceil(target / shift_work) - 1, 0)
+        into_shift = target - days * shift_work
+        finish_after = into_shift + np.where(into_shift > pause_at, pause, 0.0)
+        finish = np.where(shift_work > 0, anchor + days * 86400 + finish_after * 3600, np.nan)
+        finish = np.where(remaining == 0, now, finish)
+    return finish, rate, work, remaining
+
+def _forecast_python(features, now):
+    """_forecast_numpy one ship at a time, for installs without NumPy"""
+    finish, rates, works, remainings = [], [], [], []
+    decay = [0.5 ** ((FORECAST_HOURS - 1 - i) / FORECAST_HALF_LIFE_HOURS) for i in range(FORECAST_HOURS)]
+    for row in features:
+        total, progress, recorded, expected, drivers, turnaround, start, length, pause, opening = row[:len(FIELDS)]
+        counts = row[len(FIELDS):len(FIELDS) + FORECAST_HOURS]
+        observed = row[len(FIELDS) + FORECAST_HOURS:]
+
+        weights = [w * o for w, o in zip(decay, observed)]
+        weight_sum = sum(weights)
+        observed_rate = sum(c * w for c, w in zip(counts, weights)) / weight_sum if weight_sum else 0.0
+        blend = min(sum(observed) / FORECAST_BLEND_HOURS, 1.0)
+        planned = expected if expected > 0 else observed_rate
+        rate = blend * observed_rate + (1 - blend) * planned
+        if turnaround > 0:
+            rate = min(rate, drivers * 60 / turnaround)
+
+        remaining = max(total - max(total * progress / 100, recorded), 0.0)
+        work = 0.0 if remaining == 0 else remaining / rate if rate > 0 else math.nan
+
+        pause = min(pause, length)
+        shift_work = length - pause
+        pause_at = (length - pause) / 2
+        if opening > now:
+            anchor, worked = opening, 0.0
+        else:
+            since_start = ((now % 86400) / 3600 - start) % 24
+            anchor = now - since_start * 3600
+            worked = min(max(since_start, 0), length) - min(max(since_start - pause_at, 0), pause)
+
+        if remaining == 0:
+            finish.append(now)
+        elif shift_work > 0 and not math.isnan(work):
+            target = worked + work
+            days = max(math.ceil(target / shift_work) - 1, 0)
+            into_shift = target - days * shift_work
+            finish.append(anchor + days * 86400 + (into_shift + (pause if into_shift > pause_at else 0.0)) * 3600)
+        else:
+            finish.append(math.nan)
+        rates.append(rate)
+        works.append(work)
+        remainings.append(remaining)
+    return finish, rates, works, remainings
+
+class Forecaster:
+    """Feature rows of the live ships for one worker, rebuilt only for the ships whose rows changed"""
+
+    def __init__(self):
+        # ship id -> (signature, vessel name, feature row)
+        self.ships = {}
+        self.lock = threading.Lock()
+
+    def _refresh(self):
+        """(id, vessel name, feature row) for every ship that is not complete, in id order"""
+        signatures = {ship_id: signature for ship_id, *signature in db.session.query(
+            Ship.id, Ship.updatedAt, Ship.progress, func.length(Ship.hourly_quantity_data),
+            func.length(Ship.turnaround_data)).filter(Ship.status != 'complete').order_by(Ship.id)}
+        with self.lock:
+            stale = [ship_id for ship_id, signature in signatures.items()
+                     if ship_id not in self.ships or self.ships[ship_id][0] != signature]
+        fresh = {}
+        for start in range(0, len(stale), 500):
+            for row in Ship.query.filter(Ship.id.in_(stale[start:start + 500])):
+                if row.id in signatures:
+                    fresh[row.id] = (signatures[row.id], row.vesselName, _features(row))
+        with self.lock:
+            self.ships.update(fresh)
+            # Ships completed or deleted since the last pass drop out
+            for ship_id in self.ships.keys() - signatures.keys():
+                del self.ships[ship_id]
+            # Sorted again: sharded queries return their rows one port at a time
+            return [(ship_id,) + self.ships[ship_id][1:] for ship_id in sorted(signatures) if ship_id in self.ships]
+
+    def forecast(self, now=None):
+        """Forecast for every ship that is not complete, in ship id order"""
+        now = now or datetime.now()
+        ships = self._refresh()
+        features = [row for _, _, row in ships]
+        compute = _forecast_numpy if features and _load_numpy() else _forecast_python
+        finish, rate, work, remaining = compute(features, _seconds(now))
+
+        forecasts = []
+        for i, (ship_id, name, _) in enumerate(ships):
+            done_at, hours = float(finish[i]), float(work[i])
+            forecasts.append({
+                'shipId': ship_id,
+                'vesselName': name,
+                'remainingVehicles': int(round(float(remaining[i]))),
+                'ratePerHour': round(float(rate[i]), 1),
+                'workHoursRemaining': None if math.isnan(hours) else round(hours, 2),
+                'estimatedCompletion': None if math.isnan(done_at) else _minute(done_at).isoformat(),
+            })
+        return {'generatedAt': now.replace(microsecond=0).isoformat(), 'ships': forecasts}
+
+_forecaster = None
+_forecaster_lock = threading.Lock()
+
+def get_forecaster():
+    global _forecaster
+    if _forecaster is None:
+        with _forecaster_lock:
+            if _forecaster is None:
+                _forecaster = Forecaster()
+    return _forecaster
+
+def set_forecaster(forecaster):
+    """Swap the process-wide forecaster, e.g. for a fresh one per fleet in benchmarks"""
+    global _forecaster
+    _forecaster = forecaster
+
+def forecast(now=None):
+    return get_forecaster().forecast(now)
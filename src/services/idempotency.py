@@ -0,0 +1,173 @@
+"""
+Idempotency-Key support for mutating routes.
+
+Clients that retry writes (offline-storage.js replaying its queue, a tablet
+resending after a dropped response) send the same Idempotency-Key header
+with every attempt. The first attempt runs the route. Its key record is
+inserted from a before_commit hook, so it is written in the same
+transaction as the route's own changes: either both are stored or neither
+is. The response is then attached to the record. Later attempts with that
+key do no work and get the stored response back, marked with an
+Idempotent-Replayed header. A retry that arrives before the response has
+been stored gets 409 with Retry-After. A record still without a response
+IDEMPOTENCY_ABANDON_SECONDS after it was written belongs to a worker that
+died between the two commits; it is dropped and the retry runs the route
+again, so the client is not locked out until the key expires.
+
+Two attempts racing each other both run the route. Only one commit can
+insert the key, so the loser's transaction, including its write, is rolled
+back on the primary key conflict. It then waits briefly for the winner's
+response and replays it.
+
+Requests without the header are not affected. Routes that fail before
+committing (validation errors, 404s) store nothing, so a corrected retry
+with the same key still runs. Records expire after IDEMPOTENCY_TTL and are
+swept at most every IDEMPOTENCY_SWEEP_SECONDS by the request that records
+a response.
+"""
+
+import functools
+import hashlib
+import os
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app, g, has_request_context, jsonify, request
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from src.models import db
+from src.models.idempotency import IdempotencyRecord
+from src.services import metrics
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+IDEMPOTENCY_TTL = int(os.environ.get('IDEMPOTENCY_TTL', 24 * 3600))
+IDEMPOTENCY_SWEEP_SECONDS = int(os.environ.get('IDEMPOTENCY_SWEEP_SECONDS', 300))
+# How long a request that lost a race waits for the winner's response before answering 409
+IDEMPOTENCY_WAIT_SECONDS = float(os.environ.get('IDEMPOTENCY_WAIT_SECONDS', 2))
+# How long a key may go without a response before its request is taken to have died
+IDEMPOTENCY_ABANDON_SECONDS = float(os.environ.get('IDEMPOTENCY_ABANDON_SECONDS', 5 * IDEMPOTENCY_WAIT_SECONDS))
+MAX_KEY_LENGTH = 255
+
+_last_sweep = None
+
+def _fingerprint():
+    digest = hashlib.sha256(f'{request.method} {request.path}\n'.encode('utf-8'))
+    digest.update(request.get_data())
+    return digest.hexdigest()
+
+def _replay(record, fingerprint):
+    """The stored response for a repeated key, or why it cannot be given"""
+    if record.fingerprint != fingerprint:
+        metrics.count_idempotent_request('mismatch')
+        return jsonify({'error': f'{HEADER} was already used for a different request'}), 422
+    if record.status_code is None:
+        metrics.count_idempotent_request('in_progress')
+        return jsonify({'error': f'A request with this {HEADER} is still being processed'}), 409, {'Retry-After': '1'}
+    metrics.count_idempotent_request('replayed')
+    response = current_app.response_class(record.body, status=record.status_code, content_type=record.content_type)
+    response.headers[REPLAYED_HEADER] = 'true'
+    return response
+
+def _before_commit(session):
+    """Insert the request's key record with the first commit the route makes"""
+    state = g.get('idempotency') if has_request_context() else None
+    if state is None or state['record'] is not None:
+        return
+    now = datetime.utcnow()
+    state['record'] = IdempotencyRecord(key=state['key'], fingerprint=state['fingerprint'], created_at=now,
+                                        expires_at=now + timedelta(seconds=IDEMPOTENCY_TTL))
+    session.add(state['record'])
+
+def deferred_record(response):
+    """The request's key record with its response, for routes whose write is committed elsewhere (coalescing)"""
+    state = g.get('idempotency') if has_request_context() else None
+    if state is None:
+        return None
+    state['deferred'] = True
+    now = datetime.utcnow()
+    return {'key': state['key'], 'fingerprint': state['fingerprint'], 'status_code': response.status_code,
+            'body': response.get_data(as_text=True), 'content_type': response.content_type, 'created_at': now,
+            'expires_at': now + timedelta(seconds=IDEMPOTENCY_TTL)}
+
+def _sweep(now):
+    """Delete expired records, at most once per IDEMPOTENCY_SWEEP_SECONDS in this process"""
+    global _last_sweep
+    if _last_sweep is not None and (now - _last_sweep).total_seconds() < IDEMPOTENCY_SWEEP_SECONDS:
+        return
+    _last_sweep = now
+    IdempotencyRecord.query.filter(IdempotencyRecord.expires_at < now).delete(synchronize_session=False)
+
+def _await_response(key):
+    """The record that won a race for key, given a moment to have its response attached"""
+    deadline = time.time() + IDEMPOTENCY_WAIT_SECONDS
+    while True:
+        record = db.session.get(IdempotencyRecord, key, populate_existing=True)
+        if record is None or record.status_code is not None or time.time() >= deadline:
+            return record
+        db.session.rollback()
+        time.sleep(0.05)
+
+def idempotent(view):
+    """Make a mutating route safe to retry with an Idempotency-Key header"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return view(*args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return jsonify({'error': f'{HEADER} must be 1-{MAX_KEY_LENGTH} characters'}), 400
+
+        fingerprint = _fingerprint()
+        now = datetime.utcnow()
+        record = db.session.get(IdempotencyRecord, key)
+        if record is not None and record.expires_at <= now:
+            # Expired but not swept yet: removed in the same commit that stores the new one
+            db.session.delete(record)
+            db.session.flush()
+            record = None
+        elif (record is not None and record.status_code is None
+              and (now - record.created_at).total_seconds() > IDEMPOTENCY_ABANDON_SECONDS):
+            # Abandoned; conditional so two retries racing to drop it cannot fail on a missing row
+            metrics.count_idempotent_request('abandoned')
+            db.session.expunge(record)
+            IdempotencyRecord.query.filter_by(key=key, status_code=None).delete(synchronize_session=False)
+            db.session.flush()
+            record = None
+        if record is not None:
+            return _replay(record, fingerprint)
+
+        g.idempotency = {'key': key, 'fingerprint': fingerprint, 'record': None}
+        try:
+            response = current_app.make_response(view(*args, **kwargs))
+        except IntegrityError:
+            # Another attempt with this key committed first; this one's write has not been applied
+            db.session.rollback()
+            record = _await_response(key)
+            if record is None:
+                raise
+            return _replay(record, fingerprint)
+        finally:
+            state = g.pop('idempotency')
+
+        if state.get('deferred'):
+            if response.status_code < 400:
+                metrics.count_idempotent_request('new')
+            return response
+        record = state['record']
+        if record is not None:
+            metrics.count_idempotent_request('new')
+            record.status_code = response.status_code
+            record.body = response.get_data(as_text=True)
+            record.content_type = response.content_type
+            _sweep(now)
+            db.session.commit()
+        return response
+    return wrapper
+
+def init_app(app):
+    """Hook key records into the transactions of idempotent requests"""
+    if not event.contains(Session, 'before_commit', _before_commit):
+        event.listen(Session, 'before_commit', _before_commit)
@@ -0,0 +1,219 @@
+"""
+Prometheus metrics for the dashboard.
+
+Gunicorn runs several worker processes, so metrics use prometheus_client's
+multiprocess mode whenever PROMETHEUS_MULTIPROC_DIR is set (gunicorn.conf.py
+points it at /dev/shm): every worker writes its samples to memory-mapped
+files in that directory and /metrics aggregates them at scrape time. Without
+it (the development server) the in-process registry is used.
+
+prometheus_client is optional; without it every helper here is a no-op and
+/metrics answers 503.
+"""
+
+import os
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+try:
+    import prometheus_client
+    from prometheus_client import Counter, Gauge, Histogram
+    from prometheus_client import multiprocess
+except ImportError:
+    prometheus_client = None
+
+MULTIPROC_DIR = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+
+# Page counts are bucketed to keep label cardinality bounded
+PAGE_BUCKETS = [(1, '1'), (10, '2-10'), (50, '11-50'), (200, '51-200')]
+
+def enabled():
+    return prometheus_client is not None
+
+if enabled():
+    REQUEST_LATENCY = Histogram(
+        'http_request_duration_seconds', 'Request latency by route',
+        ['method', 'endpoint', 'status'])
+    REQUESTS_IN_PROGRESS = Gauge(
+        'http_requests_in_progress', 'Requests currently being handled',
+        ['method', 'endpoint'], multiprocess_mode='livesum')
+    DB_QUERY_DURATION = Histogram(
+        'db_query_duration_seconds', 'SQL statement duration by statement type',
+        ['operation'], buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5))
+    DB_COMMIT_DURATION = Histogram(
+        'db_commit_duration_seconds', 'Session commit duration; SQLite write-lock waits land here',
+        buckets=(.001, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10))
+    SQLITE_BUSY_ERRORS = Counter(
+        'sqlite_busy_errors_total', 'Statements that gave up waiting for a SQLite lock, by route',
+        ['endpoint'])
+    EXTRACTION_DURATION = Histogram(
+        'extraction_duration_seconds', 'Document extraction time by file type and page count',
+        ['file_type', 'pages'], buckets=(.01, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60))
+    CACHE_LOOKUPS = Counter(
+        'cache_lookups_total', 'Cache lookups by cache and result (hit or miss)',
+        ['cache', 'result'])
+    ADMISSION_QUEUE = Gauge(
+        'admission_queue_depth', 'Requests waiting for an admission permit, across workers',
+        ['limiter'], multiprocess_mode='livesum')
+    ADMISSION_ACTIVE = Gauge(
+        'admission_permits_in_use', 'Admission permits currently held, across workers',
+        ['limiter'], multiprocess_mode='livesum')
+    ADMISSION_WAIT = Histogram(
+        'admission_wait_seconds', 'Time queued requests waited for a permit (admitted or not)',
+        ['limiter'], buckets=(.05, .1, .25, .5, 1, 2, 5, 10))
+    ADMISSION_REJECTIONS = Counter(
+        'admission_rejections_total', 'Requests turned away with 503, by reason (queue_full or timeout)',
+        ['limiter', 'reason'])
+    PUSH_QUEUE = Gauge(
+        'push_queue_depth', 'Notifications waiting for the push dispatcher, across workers',
+        multiprocess_mode='livesum')
+    PUSH_DELIVERIES = Counter(
+        'push_deliveries_total', 'Push deliveries by result (delivered, retried, failed, gone, pruned)',
+        ['result'])
+    TELEMETRY_BUFFER = Gauge(
+        'telemetry_buffered_events', 'Client telemetry rows waiting for the next bulk insert, across workers',
+        multiprocess_mode='livesum')
+    TELEMETRY_EVENTS = Counter(
+        'telemetry_events_total', 'Client telemetry events by result (accepted, rejected, refused, stored)',
+        ['result'])
+    IDEMPOTENT_REQUESTS = Counter(
+        'idempotent_requests_total',
+        'Writes carrying an Idempotency-Key, by result (new, replayed, in_progress, abandoned, mismatch)',
+        ['result'])
+    COALESCED_REQUESTS = Counter(
+        'coalesced_write_requests_total', 'Progress and status writes committed in coalesced batches, by result',
+        ['result'])
+    COALESCED_FLUSHES = Counter(
+        'coalesced_write_flushes_total', 'Coalesced batch commits by result (stored or failed)',
+        ['result'])
+
+def page_bucket(pages):
+    for limit, label in PAGE_BUCKETS:
+        if pages <= limit:
+            return label
+    return '200+'
+
+def observe_extraction(file_type, pages, seconds):
+    if enabled():
+        EXTRACTION_DURATION.labels(file_type, page_bucket(pages)).observe(seconds)
+
+def count_cache_lookup(cache, hit):
+    if enabled():
+        CACHE_LOOKUPS.labels(cache, 'hit' if hit else 'miss').inc()
+
+def track_admission_queue(limiter, delta):
+    if enabled():
+        ADMISSION_QUEUE.labels(limiter).inc(delta)
+
+def track_admission_active(limiter, delta):
+    if enabled():
+        ADMISSION_ACTIVE.labels(limiter).inc(delta)
+
+def observe_admission_wait(limiter, seconds):
+    if enabled():
+        ADMISSION_WAIT.labels(limiter).observe(seconds)
+
+def count_admission_rejection(limiter, reason):
+    if enabled():
+        ADMISSION_REJECTIONS.labels(limiter, reason).inc()
+
+def track_push_queue(delta):
+    if enabled() and delta:
+        PUSH_QUEUE.inc(delta)
+
+def count_push_delivery(result, count=1):
+    if enabled() and count:
+        PUSH_DELIVERIES.labels(result).inc(count)
+
+def track_telemetry_buffer(delta):
+    if enabled() and delta:
+        TELEMETRY_BUFFER.inc(delta)
+
+def count_telemetry_events(result, count=1):
+    if enabled() and count:
+        TELEMETRY_EVENTS.labels(result).inc(count)
+
+def count_idempotent_request(result):
+    if enabled():
+        IDEMPOTENT_REQUESTS.labels(result).inc()
+
+def count_coalesced_writes(result, requests):
+    if enabled():
+        COALESCED_REQUESTS.labels(result).inc(requests)
+        COALESCED_FLUSHES.labels(result).inc()
+
+def _endpoint():
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+def _before_request():
+    g.metrics_started = time.perf_counter()
+    g.metrics_endpoint = _endpoint()
+    REQUESTS_IN_PROGRESS.labels(request.method, g.metrics_endpoint).inc()
+
+def _after_request(response):
+    started = g.pop('metrics_started', None)
+    if started is not None:
+        REQUEST_LATENCY.labels(request.method, g.metrics_endpoint, response.status_code).observe(
+            time.perf_counter() - started)
+    return response
+
+def _teardown_request(exc):
+    endpoint = g.pop('metrics_endpoint', None)
+    if endpoint is not None:
+        REQUESTS_IN_PROGRESS.labels(request.method, endpoint).dec()
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['metrics_started'].pop()
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'OTHER'
+    DB_QUERY_DURATION.labels(operation).observe(time.perf_counter() - started)
+
+def _handle_error(context):
+    conn = context.connection
+    if conn is not None and conn.info.get('metrics_started'):
+        conn.info['metrics_started'].pop()
+    if 'database is locked' in str(context.original_exception):
+        SQLITE_BUSY_ERRORS.labels(_endpoint() if has_request_context() else 'none').inc()
+
+def _before_commit(session):
+    session.info['metrics_commit_started'] = time.perf_counter()
+
+def _after_commit(session):
+    started = session.info.pop('metrics_commit_started', None)
+    if started is not None:
+        DB_COMMIT_DURATION.observe(time.perf_counter() - started)
+
+def init_app(app):
+    """Instrument requests and SQL statements"""
+    if not enabled():
+        return
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+        event.listen(Session, 'before_commit', _before_commit)
+        event.listen(Session, 'after_commit', _after_commit)
+
+def render():
+    """Exposition text and content type, aggregated across workers in multiprocess mode"""
+    if MULTIPROC_DIR:
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return prometheus_client.generate_latest(registry), prometheus_client.CONTENT_TYPE_LATEST
+
+def mark_process_dead(pid):
+    """Drop a dead worker's live gauges (gunicorn child_exit hook)"""
+    if enabled() and MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid)
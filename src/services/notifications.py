@@ -0,0 +1,286 @@
+"""
+Asynchronous, batched Web Push fan-out.
+
+send() only puts a notification on this worker's in-memory queue, so a
+status change notifies any number of devices without slowing the write
+request. A dispatcher thread, started on first use in each worker process,
+drains the queue in batches (PUSH_BATCH_SIZE notifications, or whatever
+arrived within PUSH_BATCH_SECONDS). It resolves every recipient of a batch
+with one subscription query and delivers on a pool of PUSH_WORKERS threads.
+
+Deliveries that fail with a connection error, 429 or 5xx are retried with
+exponential backoff, honouring Retry-After. A 404 or 410 means the browser
+dropped the subscription, so it is deleted. So is one that fails
+PUSH_MAX_FAILURES notifications in a row.
+
+Payloads are encrypted and signed with VAPID through pywebpush, so nothing
+is queued until VAPID_PRIVATE_KEY is set. Subscriptions are only accepted
+for https endpoints on the browser push services (PUSH_ALLOWED_HOSTS), so
+the server never POSTs to an address a client made up. PUSH_TEST_MODE=1
+lifts both rules for a local mock push service (see
+benchmarks/notify_bench.py): payloads go out as plain JSON to any endpoint.
+Never set it in production.
+
+Notifications still queued when a worker exits are lost. Each one targets
+the devices subscribed at the time it is dispatched.
+"""
+
+import heapq
+import itertools
+import json
+import os
+import queue
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from flask import current_app
+from sqlalchemy import or_
+
+from src.models import db
+from src.models.notification import PushSubscription
+from src.services import metrics
+
+try:
+    from pywebpush import WebPushException, webpush
+except ImportError:
+    webpush = None
+
+ENABLED = os.environ.get('PUSH_ENABLED', '1') != '0'
+PUSH_WORKERS = int(os.environ.get('PUSH_WORKERS', 8))
+PUSH_BATCH_SIZE = int(os.environ.get('PUSH_BATCH_SIZE', 100))
+PUSH_BATCH_SECONDS = float(os.environ.get('PUSH_BATCH_SECONDS', 0.1))
+PUSH_QUEUE_SIZE = int(os.environ.get('PUSH_QUEUE_SIZE', 10000))
+PUSH_RETRIES = int(os.environ.get('PUSH_RETRIES', 3))
+PUSH_BACKOFF_SECONDS = float(os.environ.get('PUSH_BACKOFF_SECONDS', 1))
+PUSH_MAX_FAILURES = int(os.environ.get('PUSH_MAX_FAILURES', 5))
+PUSH_TIMEOUT = float(os.environ.get('PUSH_TIMEOUT', 10))
+# How long push services keep an undelivered message for an offline device
+PUSH_TTL = int(os.environ.get('PUSH_TTL', 3600))
+VAPID_PRIVATE_KEY = os.environ.get('VAPID_PRIVATE_KEY')
+# Public half of the VAPID key pair, handed to browsers as the applicationServerKey
+VAPID_PUBLIC_KEY = os.environ.get('VAPID_PUBLIC_KEY')
+VAPID_SUBJECT = os.environ.get('VAPID_SUBJECT', 'mailto:ops@example.com')
+# Hosts (and their subdomains) of the push services browsers hand out endpoints on
+PUSH_ALLOWED_HOSTS = [host.strip().lower() for host in os.environ.get(
+    'PUSH_ALLOWED_HOSTS', 'fcm.googleapis.com,android.googleapis.com,updates.push.services.mozilla.com,'
+                          'push.apple.com,notify.windows.com').split(',') if host.strip()]
+# Plain JSON pushes to any endpoint, for a local mock push service only
+PUSH_TEST_MODE = os.environ.get('PUSH_TEST_MODE', '0') == '1'
+# Status codes meaning the subscription is gone for good
+GONE = {404, 410}
+
+class QueueFull(Exception):
+    """The dispatcher queue is at PUSH_QUEUE_SIZE"""
+
+def valid_endpoint(endpoint):
+    """Whether endpoint is an https URL on one of the PUSH_ALLOWED_HOSTS push services"""
+    try:
+        url = urlsplit(endpoint)
+    except (TypeError, ValueError):
+        return False
+    if PUSH_TEST_MODE:
+        return url.scheme in ('http', 'https') and bool(url.hostname)
+    host = (url.hostname or '').lower()
+    return url.scheme == 'https' and any(host == allowed or host.endswith('.' + allowed)
+                                         for allowed in PUSH_ALLOWED_HOSTS)
+
+def delivery_configured():
+    """Whether pushes can be sent: pywebpush with a VAPID key, or test mode"""
+    return PUSH_TEST_MODE or (webpush is not None and bool(VAPID_PRIVATE_KEY))
+
+def post_push(subscription_info, data):
+    """Deliver one payload; returns (status code or 0 for a connection error, Retry-After)"""
+    if not PUSH_TEST_MODE:
+        try:
+            response = webpush(subscription_info=subscription_info, data=data, ttl=PUSH_TTL, timeout=PUSH_TIMEOUT,
+                               vapid_private_key=VAPID_PRIVATE_KEY, vapid_claims={'sub': VAPID_SUBJECT})
+            return response.status_code, None
+        except WebPushException as e:
+            if e.response is None:
+                return 0, None
+            return e.response.status_code, e.response.headers.get('Retry-After')
+    req = urllib.request.Request(subscription_info['endpoint'], data=data.encode('utf-8'), method='POST',
+                                 headers={'Content-Type': 'application/json', 'TTL': str(PUSH_TTL)})
+    try:
+        with urllib.request.urlopen(req, timeout=PUSH_TIMEOUT) as response:
+            return response.status, None
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers.get('Retry-After')
+    except OSError:
+        return 0, None
+
+def _retry_delay(attempt, retry_after):
+    if retry_after and retry_after.isdigit():
+        return float(retry_after)
+    return PUSH_BACKOFF_SECONDS * 2 ** attempt * random.uniform(0.8, 1.2)
+
+class Dispatcher:
+    """Queue, batching thread and delivery pool for one worker process"""
+
+    def __init__(self, app, sender=post_push, workers=PUSH_WORKERS):
+        self.app = app
+        self.sender = sender
+        self.queue = queue.Queue(PUSH_QUEUE_SIZE)
+        # (due, sequence, attempt, subscription id, subscription info, payload)
+        self.retries = []
+        self.sequence = itertools.count()
+        self.pool = ThreadPoolExecutor(workers, thread_name_prefix='push')
+        self.lock = threading.Lock()
+        # Queued notifications plus scheduled and in-flight retries; zero means idle
+        self.outstanding = 0
+        self.thread = threading.Thread(target=self._run, name='push-dispatcher', daemon=True)
+        self.thread.start()
+
+    def enqueue(self, notification):
+        with self.lock:
+            try:
+                self.queue.put_nowait(notification)
+            except queue.Full:
+                raise QueueFull()
+            self.outstanding += 1
+        metrics.track_push_queue(1)
+
+    def _take_batch(self):
+        """Up to PUSH_BATCH_SIZE notifications, waiting for the first no longer than until the next retry is due"""
+        with self.lock:
+            timeout = max(0, self.retries[0][0] - time.time()) if self.retries else None
+        batch = []
+        try:
+            batch.append(self.queue.get(timeout=timeout))
+            deadline = time.time() + PUSH_BATCH_SECONDS
+            while len(batch) < PUSH_BATCH_SIZE:
+                batch.append(self.queue.get(timeout=max(0, deadline - time.time())))
+        except queue.Empty:
+            pass
+        metrics.track_push_queue(-len(batch))
+        return batch
+
+    def _due_retries(self):
+        now = time.time()
+        due = []
+        with self.lock:
+            while self.retries and self.retries[0][0] <= now:
+                due.append(heapq.heappop(self.retries)[2:])
+        return due
+
+    def _recipients(self, batch):
+        """(attempt, subscription id, info, payload) for every device each notification targets"""
+        ship_ids = {n['ship_id'] for n in batch}
+        query = PushSubscription.query
+        if None not in ship_ids:
+            # Only broadcasts need every subscription; otherwise the (ship_id, role) index narrows it
+            query = query.filter(or_(PushSubscription.ship_id.in_(ship_ids), PushSubscription.ship_id.is_(None)))
+        subscriptions = query.all()
+        deliveries = []
+        for notification in batch:
+            payload = json.dumps(notification['payload'])
+            for sub in subscriptions:
+                if not valid_endpoint(sub.endpoint):
+                    # Stored before endpoints were restricted to push services
+                    continue
+                if notification['ship_id'] is not None and sub.ship_id not in (None, notification['ship_id']):
+                    continue
+                if notification['role'] and sub.role not in (None, notification['role']):
+                    continue
+                deliveries.append((0, sub.id, sub.subscription_info(), payload))
+        return deliveries
+
+    def _deliver(self, delivery):
+        attempt, sub_id, info, payload = delivery
+        status, retry_after = self.sender(info, payload)
+        return delivery, status, retry_after
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            retries = self._due_retries()
+            if not batch and not retries:
+                continue
+            with self.app.app_context():
+                try:
+                    deliveries = (self._recipients(batch) if batch else []) + retries
+                    self._record(list(self.pool.map(self._deliver, deliveries)))
+                except Exception:
+                    self.app.logger.exception('Push dispatch failed')
+                finally:
+                    db.session.remove()
+            with self.lock:
+                self.outstanding -= len(batch) + len(retries)
+
+    def _record(self, results):
+        """Schedule retries, prune gone subscriptions and keep failure counts, in one transaction"""
+        gone, failed, recovered = set(), set(), set()
+        for (attempt, sub_id, info, payload), status, retry_after in results:
+            if 200 <= status < 300:
+                metrics.count_push_delivery('delivered')
+                recovered.add(sub_id)
+            elif status in GONE:
+                metrics.count_push_delivery('gone')
+                gone.add(sub_id)
+            elif (status == 0 or status == 429 or status >= 500) and attempt < PUSH_RETRIES:
+                metrics.count_push_delivery('retried')
+                with self.lock:
+                    heapq.heappush(self.retries, (time.time() + _retry_delay(attempt, retry_after), next(self.sequence),
+                                                  attempt + 1, sub_id, info, payload))
+                    self.outstanding += 1
+            else:
+                metrics.count_push_delivery('failed')
+                failed.add(sub_id)
+
+        if gone:
+            PushSubscription.query.filter(PushSubscription.id.in_(gone)).delete(synchronize_session=False)
+        if failed:
+            PushSubscription.query.filter(PushSubscription.id.in_(failed - gone)).update(
+                {PushSubscription.failures: PushSubscription.failures + 1}, synchronize_session=False)
+            pruned = PushSubscription.query.filter(PushSubscription.id.in_(failed),
+                                                   PushSubscription.failures >= PUSH_MAX_FAILURES)
+            metrics.count_push_delivery('pruned', pruned.count())
+            pruned.delete(synchronize_session=False)
+        if recovered:
+            PushSubscription.query.filter(PushSubscription.id.in_(recovered - gone - failed),
+                                          PushSubscription.failures > 0).update(
+                {PushSubscription.failures: 0}, synchronize_session=False)
+        if gone or failed or recovered:
+            db.session.commit()
+
+    def flush(self, timeout=30):
+        """Wait until every queued notification and retry has been handled; returns False on timeout"""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if not self.outstanding:
+                return True
+            time.sleep(0.01)
+        return False
+
+_dispatcher = None
+_dispatcher_pid = None
+_dispatcher_lock = threading.Lock()
+
+def get_dispatcher(app=None):
+    """This process's dispatcher, started after the fork that created the worker"""
+    global _dispatcher, _dispatcher_pid
+    if _dispatcher is None or _dispatcher_pid != os.getpid():
+        with _dispatcher_lock:
+            if _dispatcher is None or _dispatcher_pid != os.getpid():
+                _dispatcher = Dispatcher(app or current_app._get_current_object())
+                _dispatcher_pid = os.getpid()
+    return _dispatcher
+
+def set_dispatcher(dispatcher):
+    """Swap the process-wide dispatcher, e.g. for one with a recording sender in tests"""
+    global _dispatcher, _dispatcher_pid
+    _dispatcher, _dispatcher_pid = dispatcher, os.getpid()
+
+def send(payload, ship_id=None, role=None):
+    """Queue a notification for the devices following ship_id (all ships if None) in role (all if None)"""
+    if not ENABLED:
+        return
+    if not delivery_configured():
+        current_app.logger.warning('Push notification dropped: pywebpush and VAPID_PRIVATE_KEY are required')
+        return
+    get_dispatcher().enqueue({'payload': payload, 'ship_id': ship_id, 'role': role})
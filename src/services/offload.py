@@ -0,0 +1,41 @@
+"""
+Keep CPU-bound work off the gevent event loop.
+
+Under a gevent worker every request is a greenlet on one OS thread, so a
+document extraction that spends a second in pypdf and regexes stalls every
+other request in that process, including cheap dashboard polls. run() hands
+such work to a pool of real OS threads owned by the gevent hub, leaving the
+loop free to switch between the other greenlets while the interpreter swaps
+the GIL between them. Under sync and gthread workers each request already
+has its own thread, so run() simply calls the function.
+
+Work passed to run() executes without Flask's request and app contexts; it
+must take plain arguments and must not touch the database session.
+"""
+
+import os
+import sys
+
+OFFLOAD_THREADS = int(os.environ.get('OFFLOAD_THREADS', 4))
+
+_pool = None
+_pool_pid = None
+
+def _gevent_active():
+    monkey = sys.modules.get('gevent.monkey')
+    return monkey is not None and monkey.is_module_patched('socket')
+
+def _threadpool():
+    """This process's gevent thread pool, created after the fork that started the worker"""
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        from gevent.threadpool import ThreadPool
+        _pool = ThreadPool(OFFLOAD_THREADS)
+        _pool_pid = os.getpid()
+    return _pool
+
+def run(func, *args, **kwargs):
+    """Call func(*args, **kwargs), on a real thread when running under gevent"""
+    if not _gevent_active():
+        return func(*args, **kwargs)
+    return _threadpool().apply(func, args, kwargs)
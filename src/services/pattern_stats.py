@@ -0,0 +1,205 @@
+"""
+Opt-in per-pattern instrumentation for the extraction engine.
+
+Set EXTRACTION_STATS_DIR to enable it. Each worker keeps running totals per
+pattern (invocations, hits, cumulative seconds and the fields its hits
+resolved) and periodically writes them to its own JSON file in that
+directory. merged_stats() folds every worker's file into one report. When
+a worker exits, the gunicorn master folds its file into a single retired
+file (retire()), so recycled workers do not leave files behind.
+"""
+
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+
+STATS_DIR = os.environ.get('EXTRACTION_STATS_DIR')
+FLUSH_INTERVAL = float(os.environ.get('EXTRACTION_STATS_FLUSH_SECONDS', 10))
+
+_lock = threading.Lock()
+_totals = {}
+_last_flush = 0.0
+_reset_seen = time.time()
+_worker_pid = None
+_worker_file = None
+
+def enabled():
+    return bool(STATS_DIR)
+
+def _new_entry(group):
+    return {'group': group, 'invocations': 0, 'hits': 0, 'seconds': 0.0, 'fields': {}}
+
+def _merge(total, entry):
+    total['invocations'] += entry['invocations']
+    total['hits'] += entry['hits']
+    total['seconds'] += entry['seconds']
+    for field, count in entry['fields'].items():
+        total['fields'][field] = total['fields'].get(field, 0) + count
+
+class PatternStats:
+    """Pattern timings and field attributions for one document"""
+
+    def __init__(self):
+        self.patterns = {}
+        self._data = {}
+        self._known = set()
+        self._last_hit = None
+
+    def watch(self, data):
+        self._data = data
+        self._known = set(data)
+
+    def record(self, pattern, group, seconds, hit):
+        self.settle()
+        entry = self.patterns.get(pattern)
+        if entry is None:
+            entry = self.patterns[pattern] = _new_entry(group)
+        entry['invocations'] += 1
+        entry['seconds'] += seconds
+        if hit:
+            entry['hits'] += 1
+        self._last_hit = pattern if hit else None
+
+    def settle(self):
+        """Credit fields added since the previous call to the pattern that hit"""
+        # Parsers only ever add keys, so an unchanged size means nothing new
+        if len(self._data) == len(self._known):
+            return
+        added = self._data.keys() - self._known
+        if self._last_hit:
+            fields = self.patterns[self._last_hit]['fields']
+            for field in added:
+                fields[field] = fields.get(field, 0) + 1
+        self._known.update(added)
+
+def _worker_path():
+    """This process's stats file, named after the pid and the time it first flushed"""
+    global _worker_pid, _worker_file
+    # Forked workers inherit module state, so key the name on the current pid;
+    # the timestamp keeps a recycled pid from overwriting a dead worker's file
+    if _worker_pid != os.getpid():
+        _worker_pid = os.getpid()
+        _worker_file = f'pattern-stats-{_worker_pid}-{int(time.time())}.json'
+    return os.path.join(STATS_DIR, _worker_file)
+
+def _reset_marker():
+    return os.path.join(STATS_DIR, 'reset')
+
+def _retired_path():
+    return os.path.join(STATS_DIR, 'pattern-stats-retired.json')
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write(path, payload):
+    with open(path + '.tmp', 'w') as f:
+        f.write(payload)
+    os.replace(path + '.tmp', path)
+
+def _fold(merged, totals):
+    for pattern, entry in totals.items():
+        total = merged.get(pattern)
+        if total is None:
+            total = merged[pattern] = _new_entry(entry['group'])
+        _merge(total, entry)
+
+def _apply_reset():
+    """Drop totals gathered before the last reset requested through any worker"""
+    global _reset_seen
+    try:
+        requested = os.path.getmtime(_reset_marker())
+    except OSError:
+        return
+    if requested > _reset_seen:
+        _totals.clear()
+        _reset_seen = requested
+
+def collect(stats):
+    """Fold one document's stats into this worker's totals, flushing when due"""
+    with _lock:
+        _apply_reset()
+        for pattern, entry in stats.patterns.items():
+            total = _totals.get(pattern)
+            if total is None:
+                total = _totals[pattern] = _new_entry(entry['group'])
+            _merge(total, entry)
+        due = time.monotonic() - _last_flush >= FLUSH_INTERVAL
+    if due:
+        flush()
+
+def flush():
+    """Write this worker's totals to its file in STATS_DIR"""
+    global _last_flush
+    if not enabled():
+        return
+    with _lock:
+        _apply_reset()
+        payload = json.dumps(_totals)
+        _last_flush = time.monotonic()
+    os.makedirs(STATS_DIR, exist_ok=True)
+    _write(_worker_path(), payload)
+
+def retire(pid):
+    """Fold an exited worker's file into the retired totals and remove it (gunicorn master only)"""
+    if not enabled():
+        return
+    paths = glob.glob(os.path.join(STATS_DIR, f'pattern-stats-{pid}-*.json'))
+    if not paths:
+        return
+    retired = _retired_path()
+    try:
+        # Retired totals written before the last reset no longer count
+        stale = os.path.getmtime(retired) < os.path.getmtime(_reset_marker())
+    except OSError:
+        stale = False
+    merged = {} if stale else _read(retired) or {}
+    for path in paths:
+        _fold(merged, _read(path) or {})
+    _write(retired, json.dumps(merged))
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def merged_stats():
+    """Totals across every worker file, slowest patterns first"""
+    flush()
+    merged = {}
+    files = glob.glob(os.path.join(STATS_DIR, 'pattern-stats-*.json'))
+    for path in files:
+        _fold(merged, _read(path) or {})
+
+    patterns = [dict(entry, pattern=pattern,
+                     hit_rate=entry['hits'] / entry['invocations'] if entry['invocations'] else 0)
+                for pattern, entry in merged.items()]
+    patterns.sort(key=lambda entry: entry['seconds'], reverse=True)
+    return {
+        'worker_files': len(files),
+        'total_seconds': sum(entry['seconds'] for entry in patterns),
+        'never_matched': sum(1 for entry in patterns if entry['hits'] == 0),
+        'patterns': patterns,
+    }
+
+def reset():
+    """Clear totals in every worker and remove the worker files"""
+    os.makedirs(STATS_DIR, exist_ok=True)
+    with open(_reset_marker(), 'w'):
+        pass
+    with _lock:
+        _apply_reset()
+    for path in glob.glob(os.path.join(STATS_DIR, 'pattern-stats-*.json')):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+if enabled():
+    atexit.register(flush)
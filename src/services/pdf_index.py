@@ -0,0 +1,176 @@
+"""
+Keyword page index for PDF manifests.
+
+Long stowage plans are mostly deck diagrams and VIN tables; the header fields
+live on a few pages. A first pass extracts each page's text once and records
+which field-group keywords occur on it (with their offsets). Each field group
+of parse_maritime_data then only sees the pages carrying its keywords, so
+parse time follows the header pages rather than the page count.
+
+Page texts and keyword hits are cached on disk under the document's SHA-256,
+so re-extracting the same document skips the PDF parser entirely.
+"""
+
+import hashlib
+import json
+import os
+import re
+
+from src.services import metrics
+
+INDEX_VERSION = 1
+CACHE_DIR = os.environ.get('PDF_INDEX_CACHE_DIR') or os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..', '..', 'uploads', '.page-index'))
+CACHE_LIMIT = int(os.environ.get('PDF_INDEX_CACHE_LIMIT', 50))
+MAX_OFFSETS = 10
+
+# Keywords marking pages a field group can resolve fields from. They are
+# lowercase regexes matched against lowercased page text. Each one is a
+# leading part (or a part every match must contain) of one of the group's
+# patterns in file_processor, so any page a pattern can match on is selected;
+# a pattern added there needs its keyword here. Most start with a literal so
+# the regex engine can skip ahead to candidate positions.
+GROUP_KEYWORDS = {
+    'vessel': [r'vessel', r'ship', r'mv\s', r'm/v\s', r'auto\s*carrier', r'car\s*carrier', r'vehicle\s*carrier',
+               r'automobile\s*carrier', r'ro-?ro', r'container', r'multi-purpose', r'port[:\s=-]',
+               r'destination[:\s=-]', r'berth[:\s=-]', r'location[:\s=-]', r'terminal[:\s=-]', r'colonel\s*island',
+               r'brunswick', r'savannah', r'charleston', r'\d{4}-\d{2}-\d{2}', r'\d{2}[/-]\d{2}[/-]\d{4}',
+               r'date[:\s]+\d', r'stevedoring', r'company[:\s]', r'ssa\s*marine', r'ports\s*america',
+               r'operation[:\s=-]+(?:discharge|loading)', r'discharge\s*(?:only|and\s*loading|operation)',
+               r'loading\s*(?:only|operation)', r'both\s*operation', r'type\s*of\s*operation[:\s=-]',
+               r'operation\s*type[:\s=-]', r'work\s*type[:\s=-]', r'cargo\s*operation[:\s=-]'],
+    'cargo': [r'total\s*automobile', r'total\s*vehicle', r'automobiles?\s*discharge', r'automobiles?[:\s]+\d',
+              r'cars?[:\s]+\d', r'units?[:\s]+\d', r'\d\s*automobile', r'\d\s*vehicle', r'\d\s*car',
+              r'heavy\s*equipment', r'equipment\s*unit', r'hh[:\s]+\d', r'high\s*&\s*heavy', r'high\s*and\s*heavy',
+              r'electric\s*vehicle', r'ev[:\s]+\d', r'static\s*cargo', r'cargo\s*type', r'brand[/\s]*type']
+             + [brand + r'[:\s]+\d' for brand in ('benz', 'mb', 'bmw', 'rover', 'lr', 'royce', 'rr', 'audi',
+                                                   'porsche', 'mini', 'jaguar')],
+    'team': [r'supervisor[:\s]', r'operations?[:\s]*(?:lead|assistant)', r'heavy[:\s]*(?:lead|assistant)',
+             r'equipment[:\s]*(?:lead|assistant)', r'manager[:\s]', r'your\s*name[:\s]', r'colby', r'chapman', r'cole',
+             r'bailey', r'spencer', r'wilkins', r'bruce', r'banner', r'john\s+smith'],
+    'berth': [r'berth', r'dock[:\s=-]+[1-6]', r'pier[:\s=-]+[1-6]', r'mooring[:\s=-]', r'wharf[:\s=-]'],
+    'operations': [r'rate[:\s]+\d', r'cars?/hour', r'drivers?[:\s]+\d', r'drivers?\s*total', r'shift\s*start[:\s]+\d',
+                   r'shift\s*end[:\s]+\d', r'start\s*time[:\s]+\d', r'end\s*time[:\s]+\d', r'\d:\d{2}\s*[ap]m',
+                   r'break\s*duration[:\s]+\d', r'break[:\s]+\d', r'minutes?\s*break'],
+    'zones': [r'zone\s*[abc]'],
+    'terminals': [r'brv\s*(?:terminal|total)', r'brv[:\s]+\d', r'brunswick\s*terminal',
+                  r'zee\s*(?:compound|total|facility)', r'zee[:\s]+\d', r'sou\s*(?:facility|total)', r'sou[:\s]+\d',
+                  r'southern\s*facility'],
+    'zee': [r'zee\s*(?:automobile|compound|heavy|electric|static|cargo|priority)',
+            r'zee[^\n]{0,100}?(?:automobile|heavy|electric|static|cargo|value|priority)'],
+    # The generic v(\d+) van id pattern takes the first four anywhere in the text
+    'tico': [r'v\d', r'van\s*\d+\s*id', r'vans?[:\s]+\d', r'\d\s*van', r'station\s*wagon', r'wagon\s*\d+\s*id'],
+}
+
+_KEYWORDS = sorted({keyword for keywords in GROUP_KEYWORDS.values() for keyword in keywords})
+_COMPILED = [(keyword, re.compile(keyword)) for keyword in _KEYWORDS]
+
+def extract_pages(file_path):
+    """Text of every page of a PDF, in order"""
+    from pypdf import PdfReader
+
+    with open(file_path, 'rb') as file:
+        return [page.extract_text() or "" for page in PdfReader(file).pages]
+
+def join_pages(pages, page_numbers=None, total_pages=None):
+    """Join page texts with the page markers parse_maritime_data strips out"""
+    if page_numbers is None:
+        page_numbers = range(1, len(pages) + 1)
+    total_pages = total_pages or len(pages)
+    return ''.join(f"\n=== PAGE {num} OF {total_pages} ===\n{text}\n=== END PAGE {num} ===\n"
+                   for num, text in zip(page_numbers, pages))
+
+def index_page(text):
+    """Keyword -> first offsets for one page"""
+    hits = {}
+    text = text.lower()
+    for keyword, pattern in _COMPILED:
+        offsets = [match.start() for _, match in zip(range(MAX_OFFSETS), pattern.finditer(text))]
+        if offsets:
+            hits[keyword] = offsets
+    return hits
+
+class PageIndex:
+    """Per-page texts plus keyword hits, able to hand each field group its pages"""
+
+    def __init__(self, pages, keywords, sha256=None):
+        self.pages = pages
+        self.keywords = keywords
+        self.sha256 = sha256
+        self._texts = {}
+
+    @classmethod
+    def build(cls, pages, sha256=None):
+        return cls(pages, [index_page(text) for text in pages], sha256)
+
+    def pages_for(self, group):
+        """1-based numbers of the pages carrying any of the group's keywords"""
+        keywords = GROUP_KEYWORDS.get(group)
+        if keywords is None:
+            return list(range(1, len(self.pages) + 1))
+        return [num for num, hits in enumerate(self.keywords, 1) if any(k in hits for k in keywords)]
+
+    def text_for(self, group):
+        numbers = tuple(self.pages_for(group))
+        if numbers not in self._texts:
+            self._texts[numbers] = join_pages([self.pages[num - 1] for num in numbers], numbers, len(self.pages))
+        return self._texts[numbers]
+
+    def full_text(self):
+        return join_pages(self.pages)
+
+    def summary(self):
+        return {
+            'pages': len(self.pages),
+            'sha256': self.sha256,
+            'group_pages': {group: len(self.pages_for(group)) for group in GROUP_KEYWORDS},
+        }
+
+def file_sha256(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _cache_path(sha256):
+    return os.path.join(CACHE_DIR, f'{sha256}.json')
+
+def _load_cached(sha256):
+    try:
+        with open(_cache_path(sha256)) as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if cached.get('version') != INDEX_VERSION or cached.get('keyword_set') != _KEYWORDS:
+        return None
+    return PageIndex(cached['pages'], cached['keywords'], sha256)
+
+def _store(index):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = _cache_path(index.sha256)
+    with open(path + '.tmp', 'w') as f:
+        json.dump({'version': INDEX_VERSION, 'keyword_set': _KEYWORDS,
+                   'pages': index.pages, 'keywords': index.keywords}, f)
+    os.replace(path + '.tmp', path)
+
+    entries = sorted((os.path.join(CACHE_DIR, name) for name in os.listdir(CACHE_DIR) if name.endswith('.json')),
+                     key=os.path.getmtime)
+    for stale in entries[:-CACHE_LIMIT]:
+        try:
+            os.remove(stale)
+        except OSError:
+            pass
+
+def load_or_build(file_path):
+    """Cached PageIndex for a PDF, extracting and indexing it on a cache miss"""
+    sha256 = file_sha256(file_path)
+    index = _load_cached(sha256)
+    metrics.count_cache_lookup('pdf_page_index', index is not None)
+    if index is None:
+        index = PageIndex.build(extract_pages(file_path), sha256)
+        try:
+            _store(index)
+        except OSError:
+            pass
+    return index
@@ -0,0 +1,57 @@
+"""
+Gunicorn pre-fork warm-up and post-fork cleanup for preload_app.
+
+With preload_app the master imports the app once and forks every worker
+(including each replacement after max_requests) from it. Anything the master
+builds before forking is shared with workers copy-on-write, so
+PREFORK_WARMUP=1 builds the state that is otherwise created lazily by the
+first request in every worker: the compiled extraction patterns, SQLAlchemy
+mapper configuration and compiled statements for the dashboard queries, and
+the URL matcher. The warmed heap is then frozen so the garbage collector does
+not write to those pages and unshare them.
+
+Whatever the master did with the database, every worker drops the inherited
+connection pool right after the fork, port shards' pools included, so no
+SQLite connection is ever used by two processes.
+"""
+
+import gc
+import os
+
+from sqlalchemy.orm import configure_mappers
+
+from src.models import db
+from src.models.ship import Ship
+from src.services import shards
+
+WARMUP = os.environ.get('PREFORK_WARMUP', '0') == '1'
+
+def warm_up(app):
+    """Build lazily created state in the master so forked workers share it"""
+    from src.routes.file_processor import parse_maritime_data
+    from src.services.templates import match_template
+
+    # Patterns are compiled into re's cache on first use; an empty document tries every one
+    parse_maritime_data('')
+    match_template('')
+
+    with app.app_context():
+        configure_mappers()
+        # Statements the dashboards run, compiled into the engine's statement cache
+        db.session.get(Ship, 0)
+        Ship.query.filter(Ship.status != 'complete').all()
+        Ship.query.count()
+        db.session.remove()
+        db.engine.dispose()
+        shards.dispose(app)
+    app.url_map.bind('localhost').match('/api/ships')
+
+    gc.collect()
+    gc.freeze()
+
+def after_fork(app):
+    """Give a freshly forked worker its own connection pool"""
+    with app.app_context():
+        # close=False leaves the master's connections (if any) alone and only forgets them here
+        db.engine.dispose(close=False)
+        shards.dispose(app, close=False)
@@ -0,0 +1,140 @@
+"""
+Opt-in per-request profiling.
+
+Set PROFILE_DIR to enable it; nothing is hooked into the app otherwise.
+Once enabled, a PROFILE_SAMPLE_RATE fraction of requests is profiled, as is
+any request sending "X-Profile: 1" together with a valid X-Admin-Token.
+
+The default "sample" mode runs a stack sampler thread beside the request
+and writes collapsed stacks ("frame;frame;frame count" lines), the input
+format of flamegraph.pl, speedscope and inferno. PROFILE_MODE=cprofile
+writes cProfile .pstats files instead (snakeviz, flameprof, gprof2dot).
+Files are named after the endpoint, and only the newest PROFILE_KEEP are
+kept.
+"""
+
+import cProfile
+import os
+import random
+import re
+import sys
+import threading
+import time
+
+from flask import g, request
+
+PROFILE_DIR = os.environ.get('PROFILE_DIR')
+SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+MODE = os.environ.get('PROFILE_MODE', 'sample')
+INTERVAL = float(os.environ.get('PROFILE_INTERVAL_MS', 5)) / 1000
+KEEP = int(os.environ.get('PROFILE_KEEP', 200))
+
+def enabled():
+    return bool(PROFILE_DIR)
+
+class StackSampler:
+    """Samples one thread's Python stack at a fixed interval into folded-stack counts"""
+
+    def __init__(self, thread_id, interval=INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                key = ';'.join(reversed(stack))
+                self.counts[key] = self.counts.get(key, 0) + 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.counts.items():
+                f.write(f'{stack} {count}\n')
+
+class CProfiler:
+    """cProfile wrapper with the same start/stop/write interface"""
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def write(self, path):
+        self.profile.dump_stats(path)
+
+def _requested():
+    if request.headers.get('X-Profile') != '1':
+        return False
+    # Imported here so the admin blueprint's module is only touched when profiling
+    from src.routes.admin import admin_authorized
+    return admin_authorized()
+
+def _before_request():
+    if not (_requested() or (SAMPLE_RATE and random.random() < SAMPLE_RATE)):
+        return
+    profiler = CProfiler() if MODE == 'cprofile' else StackSampler(threading.get_ident())
+    g.profiler = profiler
+    g.profile_started = time.time()
+    profiler.start()
+
+def _after_request(response):
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return response
+    profiler.stop()
+    endpoint = re.sub(r'[^\w.-]+', '_', request.endpoint or 'unmatched')
+    extension = 'pstats' if isinstance(profiler, CProfiler) else 'folded'
+    name = f'{endpoint}-{int(g.profile_started * 1000)}-{os.getpid()}.{extension}'
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    profiler.write(os.path.join(PROFILE_DIR, name))
+    _rotate()
+    response.headers['X-Profile-File'] = name
+    return response
+
+def _rotate():
+    """Keep only the newest KEEP profiles"""
+    paths = [os.path.join(PROFILE_DIR, name) for name in os.listdir(PROFILE_DIR)]
+    if len(paths) <= KEEP:
+        return
+    paths.sort(key=os.path.getmtime)
+    for path in paths[:-KEEP]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def list_profiles():
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for name in os.listdir(PROFILE_DIR):
+        path = os.path.join(PROFILE_DIR, name)
+        profiles.append({'name': name, 'bytes': os.path.getsize(path), 'created': os.path.getmtime(path)})
+    profiles.sort(key=lambda profile: profile['created'], reverse=True)
+    return profiles
+
+def init_app(app):
+    """Register the profiling hooks; a no-op unless PROFILE_DIR is set"""
+    if not enabled():
+        return
+    app.before_request(_before_request)
+    app.after_request(_after_request)
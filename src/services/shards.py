@@ -0,0 +1,322 @@
+"""
+Optional sharding of ship operations by port.
+
+With SHARD_BY_PORT=1 every port (terminal) gets its own database, named by
+SHARD_DATABASE_URL with {shard} filled in (by default one SQLite file per
+port in a shards/ directory beside the primary database). A shift-change
+burst of progress writes at one terminal then only takes that terminal's
+write lock. Everything else stays in the primary database: users,
+telemetry, push subscriptions, and the two routing tables:
+
+- shard lists the port databases
+- ship_shard maps each ship id to the database holding it. Inserting a
+  ship's row here allocates its id, so ids stay unique across shards and
+  the /api/ships/<id> URLs keep working.
+
+db.session becomes a RoutingSession, SQLAlchemy's horizontal-shard session
+with choosers backed by those tables:
+
+- New ships are written to their port's shard, which is created on first
+  use.
+- Statements that pin Ship.id (get_or_404, id == or IN filters) go to the
+  shards owning those ids. Each worker keeps a copy of ship_shard for this,
+  dropped every SHARD_DIRECTORY_TTL seconds, so a ship whose port was just
+  changed through another worker can 404 there until then. Other ship
+  queries scatter to every shard, and their rows are concatenated in shard
+  order. Code that aggregates in SQL must add up the per-shard rows itself.
+- Idempotency-Key records are written to the shard of the ship the request
+  changes, so they still commit in the same transaction as the write.
+
+Ships that existed before sharding was turned on stay in the primary
+database, which is treated as one more shard. They are registered in
+ship_shard at startup, and `flask --app main shard-ships` moves them to
+their ports' shards. A ship whose port is changed is moved with it.
+"""
+
+import os
+import re
+import threading
+import time
+
+from flask import current_app, g, has_request_context
+from sqlalchemy import create_engine, inspect, make_url, select, text
+from sqlalchemy.ext.horizontal_shard import ShardedSession
+from sqlalchemy.orm import Mapper
+from sqlalchemy.sql import operators, visitors
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter
+
+from src.models import db
+from src.models.idempotency import IdempotencyRecord
+from src.models.shard import Shard, ShipShard
+from src.models.ship import Ship
+
+ENABLED = os.environ.get('SHARD_BY_PORT', '0') == '1'
+# Database URL of a port's shard with {shard} in place of its id; next to a SQLite primary database by default
+SHARD_DATABASE_URL = os.environ.get('SHARD_DATABASE_URL')
+# How long a worker trusts its copy of the ship -> shard directory for id-filtered queries
+SHARD_DIRECTORY_TTL = float(os.environ.get('SHARD_DIRECTORY_TTL', 10))
+# Shard id of the primary database; port shard ids never contain '_'
+PRIMARY = '_primary'
+# create_ship's default, for ships stored without a port
+DEFAULT_PORT = 'Colonel Island'
+# Tables each shard holds: its ships, and the Idempotency-Key records of writes to them
+SHARD_TABLES = [Ship.__table__, IdempotencyRecord.__table__]
+
+def shard_for_port(port):
+    """Shard id for a port name, e.g. 'Colonel Island' -> 'colonel-island'"""
+    return re.sub(r'[^a-z0-9]+', '-', (port or DEFAULT_PORT).lower()).strip('-') or 'unknown'
+
+def _default_url(primary_url):
+    """Shard files in a shards/ directory beside the primary SQLite file"""
+    url = make_url(primary_url)
+    if url.get_backend_name() != 'sqlite' or not url.database or url.database == ':memory:':
+        raise RuntimeError('SHARD_DATABASE_URL must be set to shard ships outside a SQLite file database')
+    return f"sqlite:///{os.path.join(os.path.dirname(os.path.abspath(url.database)), 'shards', '{shard}.db')}"
+
+class Router:
+    """Shard engines for one app and the choosers RoutingSession routes statements with"""
+
+    def __init__(self, app, url):
+        self.app = app
+        self.url = url
+        self.engines = {}
+        self.lock = threading.Lock()
+        # This worker's copy of ship_shard, dropped every SHARD_DIRECTORY_TTL seconds
+        self.directory = {}
+        self.directory_expires = 0
+
+    @property
+    def primary(self):
+        return db.engines[None]
+
+    def engine(self, shard):
+        """Engine for a shard, creating its database and tables on first use"""
+        if shard == PRIMARY:
+            return self.primary
+        engine = self.engines.get(shard)
+        if engine is None:
+            with self.lock:
+                engine = self.engines.get(shard)
+                if engine is None:
+                    url = self.url.format(shard=shard)
+                    if url.startswith('sqlite:///'):
+                        os.makedirs(os.path.dirname(os.path.abspath(url[len('sqlite:///'):])), exist_ok=True)
+                    engine = create_engine(url, **self.app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+                    for table in SHARD_TABLES:
+                        table.create(engine, checkfirst=True)
+                    self.engines[shard] = engine
+        return engine
+
+    def shards(self):
+        """Every database that may hold ships: the primary, then each port's shard"""
+        if has_request_context() and 'ship_shard_list' in g:
+            return g.ship_shard_list
+        with self.primary.connect() as conn:
+            shards = [PRIMARY] + list(conn.execute(select(Shard.id).order_by(Shard.id)).scalars())
+        if has_request_context():
+            g.ship_shard_list = shards
+        return shards
+
+    def register(self, port):
+        """The shard for port, added to the shard table the first time the port is seen"""
+        shard = shard_for_port(port)
+        if shard in self.engines:
+            # Every engine this worker opened is for a shard already in the table
+            return shard
+        self.engine(shard)
+        with self.primary.begin() as conn:
+            if conn.execute(select(Shard.id).where(Shard.id == shard)).first() is None:
+                conn.execute(Shard.__table__.insert(), {'id': shard, 'port': port or DEFAULT_PORT})
+        if has_request_context():
+            g.pop('ship_shard_list', None)
+        return shard
+
+    def allocate(self, shard):
+        """A new ship id owned by shard, committed straight away so concurrent creators never collide"""
+        with self.primary.begin() as conn:
+            return conn.execute(ShipShard.__table__.insert(), {'shard': shard}).inserted_primary_key[0]
+
+    def owners(self, ship_ids, fresh=False):
+        """{ship id: shard} for the ids that exist, from this worker's copy of ship_shard unless fresh"""
+        ship_ids = [ship_id for ship_id in ship_ids if ship_id is not None]
+        if time.monotonic() >= self.directory_expires:
+            self.directory, self.directory_expires = {}, time.monotonic() + SHARD_DIRECTORY_TTL
+        directory = self.directory
+        missing = ship_ids if fresh else [ship_id for ship_id in ship_ids if ship_id not in directory]
+        if missing:
+            with self.primary.connect() as conn:
+                directory.update(conn.execute(select(ShipShard.ship_id, ShipShard.shard).where(
+                    ShipShard.ship_id.in_(missing))).all())
+        return {ship_id: directory[ship_id] for ship_id in ship_ids if ship_id in directory}
+
+    def assign(self, ship_id, shard):
+        with self.primary.begin() as conn:
+            conn.execute(ShipShard.__table__.update().where(ShipShard.ship_id == ship_id), {'shard': shard})
+        self.directory[ship_id] = shard
+
+    # Choosers for ShardedSession
+
+    def shard_chooser(self, mapper, instance, clause=None, **kw):
+        if mapper is not None and mapper.class_ is Ship:
+            if instance is None:
+                return PRIMARY
+            shard = self.register(instance.port)
+            if instance.id is None:
+                instance.id = self.allocate(shard)
+            return shard
+        if mapper is not None and mapper.class_ is IdempotencyRecord and instance is not None:
+            return self.session_shard(inspect(instance).session)
+        return PRIMARY
+
+    def session_shard(self, session):
+        """The one shard holding the ships a session is writing, or the primary database"""
+        shards = set()
+        objects = list(session.new) + list(session.dirty) + list(session.deleted)
+        for obj in objects + list(session.identity_map.values()):
+            if isinstance(obj, Ship):
+                state = inspect(obj)
+                shards.add(state.key[2] if state.key else state.identity_token or self.register(obj.port))
+        return shards.pop() if len(shards) == 1 else PRIMARY
+
+    def identity_chooser(self, mapper, primary_key, **kw):
+        if mapper.class_ is Ship:
+            return list(self.owners([primary_key[0]]).values())
+        if mapper.class_ is IdempotencyRecord:
+            return self.shards()
+        return [PRIMARY]
+
+    def execute_chooser(self, context):
+        mappers = {mapper.class_ for mapper in context.all_mappers}
+        if Ship in mappers:
+            ship_ids = _pinned_ids(context, Ship.__table__.c.id)
+            if ship_ids is not None:
+                return sorted(set(self.owners(ship_ids).values())) or [PRIMARY]
+            return self.shards()
+        if IdempotencyRecord in mappers:
+            return self.shards()
+        return [PRIMARY]
+
+    def move(self, ship_id, port):
+        """Move a ship to the shard of its (changed) port; a no-op if it is already there"""
+        source = self.owners([ship_id], fresh=True).get(ship_id, PRIMARY)
+        target = self.register(port)
+        if source == target:
+            return
+        table = Ship.__table__
+        with self.engine(source).begin() as conn:
+            row = conn.execute(select(table).where(table.c.id == ship_id)).mappings().first()
+            if row is None:
+                return
+            # Copied before the directory points at it, and removed from the old shard last
+            with self.engine(target).begin() as target_conn:
+                target_conn.execute(table.insert(), dict(row))
+            self.assign(ship_id, target)
+            conn.execute(table.delete().where(table.c.id == ship_id))
+
+    def register_legacy(self):
+        """Record ships already in the primary database as owned by it, so their ids are never reused"""
+        with self.primary.begin() as conn:
+            conn.execute(text('INSERT INTO ship_shard (ship_id, shard) SELECT id, :primary FROM ship '
+                              'WHERE id NOT IN (SELECT ship_id FROM ship_shard)'), {'primary': PRIMARY})
+
+    def dispose(self, close=True):
+        for engine in list(self.engines.values()):
+            engine.dispose(close=close)
+
+def _pinned_ids(context, column):
+    """Ids a statement restricts column to with == or IN, or None if it is not restricted that way"""
+    where = getattr(context.statement, 'whereclause', None)
+    if where is None:
+        return None
+    ids = None
+    for element in visitors.iterate(where):
+        if not isinstance(element, BinaryExpression) or not isinstance(element.right, BindParameter):
+            continue
+        if not getattr(element.left, 'shares_lineage', None) or not element.left.shares_lineage(column):
+            continue
+        if element.operator not in (operators.eq, operators.in_op):
+            continue
+        value = element.right.effective_value
+        if value is None and isinstance(context.parameters, dict):
+            value = context.parameters.get(element.right.key)
+        ids = set(value) if isinstance(value, (list, tuple, set)) else {value}
+    return ids
+
+class RoutingSession(ShardedSession):
+    """db.session while sharding is on: Flask-SQLAlchemy's session options with the router's choosers"""
+
+    def __init__(self, db, **kwargs):
+        router = get_router()
+        super().__init__(shard_chooser=router.shard_chooser, identity_chooser=router.identity_chooser,
+                         execute_chooser=router.execute_chooser, **kwargs)
+        self.router = router
+
+    def get_bind(self, mapper=None, *, shard_id=None, instance=None, clause=None, **kw):
+        if shard_id is None:
+            if mapper is None and instance is None:
+                # Textual and table-only statements go to the primary database
+                return self.router.primary
+            if mapper is not None and not isinstance(mapper, Mapper):
+                mapper = inspect(mapper)
+            shard_id = self._choose_shard_and_assign(mapper, instance, clause=clause)
+        return self.router.engine(shard_id)
+
+def get_router(app=None):
+    app = app or current_app
+    return app.extensions['ship_shards']
+
+def owner_engines(ship_ids):
+    """{engine: [ship ids]} for writers that bypass the session, such as write coalescing"""
+    if not ENABLED:
+        return {db.engine: list(ship_ids)}
+    router = get_router()
+    # Straight from the directory: a write routed to a shard the ship has left would be lost
+    owners = router.owners(ship_ids, fresh=True)
+    grouped = {}
+    for ship_id in ship_ids:
+        grouped.setdefault(router.engine(owners.get(ship_id, PRIMARY)), []).append(ship_id)
+    return grouped
+
+def move(ship_id, port):
+    """Move a ship to its port's shard after its port was changed; a no-op unless sharding is on"""
+    if ENABLED:
+        get_router().move(ship_id, port)
+
+def init_app(app):
+    """Route db.session by port when SHARD_BY_PORT is set"""
+    if not ENABLED:
+        return
+    app.extensions['ship_shards'] = Router(
+        app, SHARD_DATABASE_URL or _default_url(app.config['SQLALCHEMY_DATABASE_URI']))
+    if db.session.session_factory.class_ is not RoutingSession:
+        # Flask-SQLAlchemy's own scoped session, built with the routing session class
+        db.session = db._make_scoped_session({'class_': RoutingSession})
+
+def init_db(app):
+    """Register pre-sharding ships and create the tables of every known shard"""
+    if not ENABLED:
+        return
+    router = get_router(app)
+    with app.app_context():
+        router.register_legacy()
+        for shard in router.shards():
+            router.engine(shard)
+        router.dispose()
+
+def dispose(app, close=True):
+    if ENABLED:
+        get_router(app).dispose(close=close)
+
+def migrate(app):
+    """Move every ship still in the primary database to its port's shard; returns how many moved"""
+    router = get_router(app)
+    moved = 0
+    with app.app_context():
+        router.register_legacy()
+        with router.primary.connect() as conn:
+            legacy = conn.execute(select(Ship.id, Ship.port).where(Ship.id.in_(
+                select(ShipShard.ship_id).where(ShipShard.shard == PRIMARY)))).all()
+        for ship_id, port in legacy:
+            router.move(ship_id, port)
+            moved += 1
+    return moved
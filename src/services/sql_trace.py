@@ -0,0 +1,95 @@
+"""
+Per-request SQL instrumentation.
+
+Every statement executed while handling a request is counted and timed
+through SQLAlchemy engine events. Statements slower than SQL_SLOW_MS are
+logged with their parameters, and a statement shape (the SQL text with
+whitespace and IN-lists collapsed) repeating SQL_REPEAT_WARN times against
+one database within one request is logged as a likely N+1; a query
+scattered over the port shards (SHARD_BY_PORT) runs once per database and
+is not. Each response carries a Server-Timing header splitting the request
+into SQL time and the rest (view logic and serialization), which browser
+devtools display per request.
+
+Set SQL_TRACE=0 to switch it off.
+"""
+
+import os
+import re
+import time
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+ENABLED = os.environ.get('SQL_TRACE', '1') != '0'
+SLOW_MS = float(os.environ.get('SQL_SLOW_MS', 100))
+REPEAT_WARN = int(os.environ.get('SQL_REPEAT_WARN', 5))
+MAX_PARAMS_CHARS = 500
+
+class RequestQueries:
+    """Statement counts and timings for one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes = {}
+
+def statement_shape(statement):
+    shape = re.sub(r'\s+', ' ', statement).strip()
+    return re.sub(r'\bIN \([^()]*\)', 'IN (...)', shape, flags=re.IGNORECASE)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('sql_trace_started', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - conn.info['sql_trace_started'].pop()
+    if not has_request_context():
+        return
+    queries = g.get('sql_queries')
+    if queries is None:
+        return
+    queries.count += 1
+    queries.seconds += seconds
+
+    if seconds * 1000 >= SLOW_MS:
+        current_app.logger.warning('Slow SQL (%.1fms) in %s %s: %s params=%s', seconds * 1000, request.method,
+                                   request.path, statement, repr(parameters)[:MAX_PARAMS_CHARS])
+
+    shape = statement_shape(statement)
+    key = (conn.engine.url, shape)
+    repeats = queries.shapes[key] = queries.shapes.get(key, 0) + 1
+    if repeats == REPEAT_WARN:
+        current_app.logger.warning('Possible N+1 in %s %s: statement ran %d times: %s', request.method,
+                                   request.path, repeats, shape)
+
+def _handle_error(context):
+    conn = context.connection
+    if conn is not None and conn.info.get('sql_trace_started'):
+        conn.info['sql_trace_started'].pop()
+
+def _before_request():
+    g.sql_queries = RequestQueries()
+
+def _after_request(response):
+    queries = g.get('sql_queries')
+    if queries is not None:
+        total_ms = (time.perf_counter() - queries.started) * 1000
+        db_ms = queries.seconds * 1000
+        response.headers.add('Server-Timing', f'db;dur={db_ms:.1f};desc="{queries.count} queries"')
+        response.headers.add('Server-Timing', f'app;dur={max(total_ms - db_ms, 0):.1f};desc="view and serialization"')
+        response.headers.add('Server-Timing', f'total;dur={total_ms:.1f}')
+    return response
+
+def init_app(app):
+    """Count and time SQL per request and report it in Server-Timing"""
+    if not ENABLED:
+        return
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
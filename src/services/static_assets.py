@@ -0,0 +1,220 @@
+"""
+Fingerprinted, precompressed static assets.
+
+Every file under static/ gets a content-hashed URL (js/widgets.js is also
+served as js/widgets.<hash>.js), and build() writes gzip copies of the
+compressible ones, plus brotli copies when the optional brotli package is
+installed, into STATIC_BUILD_DIR, named by content hash. It runs once before
+the workers start (gunicorn on_starting, `flask --app main build-static`, or
+the development server), so requests never compress anything:
+
+- hashed URLs get the best precompressed variant the client accepts and are
+  cached for a year as immutable
+- plain /static URLs (the service workers precache these) are revalidated
+  by ETag
+- HTML shells have their asset references rewritten to hashed URLs and are
+  served from memory with a strong ETag and no-cache, so a deploy is picked
+  up on the next load while an unchanged page costs a 304
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+
+from flask import current_app, request, send_file
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+BUILD_DIR = os.environ.get('STATIC_BUILD_DIR', os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..', '..', 'build', 'static')))
+# Files whose URL must never change: service worker scopes and the web app manifest
+STABLE = {'sw.js', 'sw-enhanced.js', 'manifest.json'}
+COMPRESSIBLE = {'.js', '.css', '.json', '.html', '.svg', '.txt', '.map', '.xml'}
+# Below this the compressed copy saves less than the headers it costs
+MIN_COMPRESS_SIZE = 1024
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+HASH_LENGTH = 12
+HASHED_NAME = re.compile(r'^(.*)\.([0-9a-f]{%d})(\.[^./]+)$' % HASH_LENGTH)
+ASSET_REFERENCE = re.compile(r'\b(src|href)="([^"]+)"')
+
+def _compressors():
+    """(Content-Encoding, file suffix, compress) in order of preference"""
+    compressors = []
+    if brotli is not None:
+        compressors.append(('br', '.br', lambda data: brotli.compress(data, quality=11)))
+    compressors.append(('gzip', '.gz', lambda data: gzip.compress(data, 9, mtime=0)))
+    return compressors
+
+def _compressible(path, size):
+    return os.path.splitext(path)[1].lower() in COMPRESSIBLE and size >= MIN_COMPRESS_SIZE
+
+def _accepted(encodings):
+    """The first available encoding the request accepts, or None for identity"""
+    for encoding in encodings:
+        if request.accept_encodings.quality(encoding) > 0:
+            return encoding
+    return None
+
+class Shell:
+    """An HTML page with hashed asset URLs, kept in memory with its compressed variants"""
+
+    def __init__(self, body):
+        self.body = body
+        self.digest = hashlib.sha256(body).hexdigest()[:HASH_LENGTH * 2]
+        self.variants = {}
+        if len(body) >= MIN_COMPRESS_SIZE:
+            for encoding, _, compress in _compressors():
+                self.variants[encoding] = compress(body)
+
+class Manifest:
+    """Content hashes of every file in a static folder, and the rewritten HTML shells"""
+
+    def __init__(self, folder, build_dir=BUILD_DIR):
+        self.folder = folder
+        self.build_dir = build_dir
+        self.digests = {}
+        self.shells = {}
+        html = []
+        for root, dirs, files in os.walk(folder):
+            dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+            for name in sorted(files):
+                if name.startswith('.'):
+                    continue
+                path = os.path.relpath(os.path.join(root, name), folder).replace(os.sep, '/')
+                if name.endswith('.html'):
+                    html.append(path)
+                else:
+                    with open(os.path.join(root, name), 'rb') as f:
+                        self.digests[path] = hashlib.sha256(f.read()).hexdigest()
+        for path in html:
+            with open(os.path.join(folder, path), 'rb') as f:
+                self.shells[path] = Shell(self._rewrite(f.read().decode('utf-8')).encode('utf-8'))
+
+    def hashed(self, path):
+        base, ext = os.path.splitext(path)
+        return f'{base}.{self.digests[path][:HASH_LENGTH]}{ext}'
+
+    def url(self, path):
+        """Public URL for a static file: hashed unless it has to stay stable"""
+        if path in self.digests and os.path.basename(path) not in STABLE:
+            return '/static/' + self.hashed(path)
+        return '/static/' + path
+
+    def _rewrite(self, html):
+        """Point src/href attributes that name local static files at their hashed URLs"""
+        def replace(match):
+            value = match.group(2)
+            if ':' in value or value.startswith('//'):
+                return match.group(0)
+            path = value.split('?', 1)[0].split('#', 1)[0]
+            path = path[len('/static/'):] if path.startswith('/static/') else path.lstrip('/')
+            if path not in self.digests:
+                return match.group(0)
+            return f'{match.group(1)}="{self.url(path)}"'
+        return ASSET_REFERENCE.sub(replace, html)
+
+    def resolve(self, filename):
+        """(path, immutable) for a request path, or (None, False) when it is not a known file"""
+        if filename in self.digests or filename in self.shells:
+            return filename, False
+        match = HASHED_NAME.match(filename)
+        if match:
+            path = match.group(1) + match.group(3)
+            if path in self.digests:
+                # A hash from another deploy still gets the current file, just not cached for good
+                return path, self.digests[path].startswith(match.group(2))
+        return None, False
+
+    def variant_path(self, path, suffix):
+        return os.path.join(self.build_dir, self.digests[path] + suffix)
+
+    def variants(self, path):
+        """Encodings with a precompressed copy on disk, most preferred first"""
+        return [encoding for encoding, suffix, _ in _compressors()
+                if os.path.exists(self.variant_path(path, suffix))]
+
+_manifests = {}
+_manifests_lock = threading.Lock()
+
+def get_manifest(folder):
+    """This process's manifest for a static folder, built on first use"""
+    manifest = _manifests.get(folder)
+    if manifest is None:
+        with _manifests_lock:
+            manifest = _manifests.get(folder)
+            if manifest is None:
+                manifest = _manifests[folder] = Manifest(folder)
+    return manifest
+
+def build(folder):
+    """Write missing compressed copies of the static files; returns how many were written"""
+    manifest = get_manifest(folder)
+    os.makedirs(manifest.build_dir, exist_ok=True)
+    written = 0
+    for path in manifest.digests:
+        source = os.path.join(folder, path)
+        if not _compressible(path, os.path.getsize(source)):
+            continue
+        data = None
+        for _, suffix, compress in _compressors():
+            target = manifest.variant_path(path, suffix)
+            if os.path.exists(target):
+                continue
+            if data is None:
+                with open(source, 'rb') as f:
+                    data = f.read()
+            # Write then rename so a worker never serves a half-written file
+            with open(target + '.tmp', 'wb') as f:
+                f.write(compress(data))
+            os.replace(target + '.tmp', target)
+            written += 1
+    return written
+
+def send_shell(filename):
+    """An HTML page, compressed for the client and answered with 304 while its ETag matches"""
+    shell = get_manifest(current_app.static_folder).shells[filename]
+    encoding = _accepted(list(shell.variants))
+    response = current_app.response_class(shell.variants.get(encoding, shell.body), mimetype='text/html')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.set_etag(f'{shell.digest}-{encoding}' if encoding else shell.digest)
+    response.cache_control.no_cache = True
+    response.vary.add('Accept-Encoding')
+    return response.make_conditional(request)
+
+def send_static(filename):
+    """View for /static/<path:filename>, replacing Flask's default static view"""
+    manifest = get_manifest(current_app.static_folder)
+    path, immutable = manifest.resolve(filename)
+    if path is None:
+        # Added after startup or outside the manifest: plain Flask behaviour
+        return current_app.send_static_file(filename)
+    if path in manifest.shells:
+        return send_shell(path)
+
+    encoding = _accepted(manifest.variants(path))
+    suffix = {e: s for e, s, _ in _compressors()}.get(encoding)
+    source = manifest.variant_path(path, suffix) if encoding else os.path.join(manifest.folder, path)
+    digest = manifest.digests[path][:HASH_LENGTH * 2]
+    response = send_file(source, mimetype=mimetypes.guess_type(path)[0] or 'application/octet-stream',
+                         etag=f'{digest}-{encoding}' if encoding else digest, conditional=True)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if _compressible(path, os.path.getsize(os.path.join(manifest.folder, path))):
+        response.vary.add('Accept-Encoding')
+    if immutable:
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    return response
+
+def init_app(app):
+    """Serve /static through the manifest"""
+    app.view_functions['static'] = send_static
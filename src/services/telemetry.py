@@ -0,0 +1,148 @@
+"""
+Buffered ingestion of client telemetry.
+
+The ingest routes validate each batch cheaply and append its rows to this
+worker's in-memory buffer; nothing touches the database on the request
+path. A background thread writes the buffer to the append-only client_event
+table with one executemany INSERT and one commit, every
+TELEMETRY_FLUSH_SECONDS or as soon as TELEMETRY_FLUSH_SIZE rows are waiting,
+and once more when the worker exits. Telemetry is best effort: rows
+still buffered when a worker is killed are lost, and when the buffer is at
+TELEMETRY_BUFFER_LIMIT (the database is unreachable, say) new batches are
+refused so clients keep them for later.
+"""
+
+import atexit
+import json
+import math
+import os
+import threading
+from datetime import datetime, timezone
+
+from flask import current_app
+
+from src.models import db
+from src.models.telemetry import ClientEvent
+from src.services import metrics
+
+TELEMETRY_FLUSH_SIZE = int(os.environ.get('TELEMETRY_FLUSH_SIZE', 500))
+TELEMETRY_FLUSH_SECONDS = float(os.environ.get('TELEMETRY_FLUSH_SECONDS', 5))
+TELEMETRY_BUFFER_LIMIT = int(os.environ.get('TELEMETRY_BUFFER_LIMIT', 50000))
+# Per-request limits, checked before anything is parsed or stored
+TELEMETRY_MAX_BYTES = int(os.environ.get('TELEMETRY_MAX_BYTES', 256 * 1024))
+TELEMETRY_MAX_EVENTS = int(os.environ.get('TELEMETRY_MAX_EVENTS', 1000))
+MAX_KIND = 40
+MAX_TEXT = 200
+MAX_DATA = 2000
+
+class BufferFull(Exception):
+    """The buffer is at TELEMETRY_BUFFER_LIMIT rows"""
+
+def _text(value, limit=MAX_TEXT):
+    return value[:limit] if isinstance(value, str) else None
+
+def _number(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return float(value) if math.isfinite(value) else None
+
+def _timestamp(value):
+    """Client epoch milliseconds (Date.now()) or an ISO string, as naive UTC"""
+    try:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return datetime.fromtimestamp(value / 1000, timezone.utc).replace(tzinfo=None)
+        if isinstance(value, str):
+            parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+            return parsed.astimezone(timezone.utc).replace(tzinfo=None) if parsed.tzinfo else parsed
+    except (ValueError, OverflowError, OSError):
+        pass
+    return None
+
+def make_row(kind, name=None, value=None, page=None, occurred=None, data=None, received=None):
+    """A client_event row, or None if kind is missing or the extra data is too large"""
+    kind = _text(kind, MAX_KIND)
+    if not kind:
+        return None
+    encoded = None
+    if data:
+        encoded = json.dumps(data, separators=(',', ':'), default=str)
+        if len(encoded) > MAX_DATA:
+            return None
+    return {
+        'kind': kind,
+        'name': _text(name),
+        'value': _number(value),
+        'page': _text(page),
+        'occurred_at': _timestamp(occurred),
+        'received_at': received or datetime.utcnow(),
+        'data': encoded,
+    }
+
+class Buffer:
+    """Rows waiting to be inserted by a daemon thread, woken early when TELEMETRY_FLUSH_SIZE rows are waiting"""
+
+    def __init__(self, app):
+        self.app = app
+        self.rows = []
+        self.lock = threading.Lock()
+        # Serializes flushes so rows are written in the order they arrived
+        self.flush_lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='telemetry-flusher', daemon=True)
+        self.thread.start()
+        atexit.register(self.flush)
+
+    def add(self, rows):
+        with self.lock:
+            if len(self.rows) + len(rows) > TELEMETRY_BUFFER_LIMIT:
+                raise BufferFull()
+            self.rows.extend(rows)
+            full = len(self.rows) >= TELEMETRY_FLUSH_SIZE
+        metrics.track_telemetry_buffer(len(rows))
+        if full:
+            self.wake.set()
+
+    def flush(self):
+        """Insert everything buffered so far; returns the number of rows written"""
+        with self.flush_lock:
+            with self.lock:
+                rows, self.rows = self.rows, []
+            if not rows:
+                return 0
+            try:
+                with self.app.app_context():
+                    with db.engine.begin() as conn:
+                        conn.execute(ClientEvent.__table__.insert(), rows)
+            except Exception:
+                self.app.logger.exception('Telemetry flush of %d rows failed; keeping them for the next one', len(rows))
+                with self.lock:
+                    self.rows[:0] = rows
+                return 0
+            metrics.track_telemetry_buffer(-len(rows))
+            metrics.count_telemetry_events('stored', len(rows))
+            return len(rows)
+
+    def _run(self):
+        while True:
+            self.wake.wait(TELEMETRY_FLUSH_SECONDS)
+            self.wake.clear()
+            self.flush()
+
+_buffer = None
+_buffer_pid = None
+_buffer_lock = threading.Lock()
+
+def get_buffer(app=None):
+    """This process's buffer, created after the fork that started the worker"""
+    global _buffer, _buffer_pid
+    if _buffer is None or _buffer_pid != os.getpid():
+        with _buffer_lock:
+            if _buffer is None or _buffer_pid != os.getpid():
+                _buffer = Buffer(app or current_app._get_current_object())
+                _buffer_pid = os.getpid()
+    return _buffer
+
+def ingest(rows):
+    """Buffer validated rows for the next bulk insert"""
+    if rows:
+        get_buffer().add(rows)
@@ -0,0 +1,249 @@
+"""
+Template fingerprinting and fast-path extraction for known document layouts.
+
+Most documents come from a few fixed templates. Each TemplateProfile names
+the header strings that identify its layout on page 1, and the labels its
+fields sit under. A recognised document is read with one pass over its
+"Label: value" lines and a dictionary lookup per field instead of the
+generic pattern cascade. Unknown documents, and known ones missing a
+required field (template drift), fall back to parse_maritime_data.
+
+Register further shipping-line or terminal layouts with register_template().
+"""
+
+import re
+
+# How much of page 1 fingerprinting looks at
+HEAD_CHARS = 2000
+
+def _normalize(label):
+    return re.sub(r'\s+', ' ', label.strip(' -*\t').lower())
+
+def label_values(text):
+    """Map each 'Label: value' line to its value in one pass over the text
+
+    Labels under a bare 'Section:' line are also keyed as 'section / label'
+    until the next blank line. The first occurrence of a label wins.
+    """
+    values = {}
+    section = None
+    for line in text.splitlines():
+        if not line.strip():
+            section = None
+            continue
+        label, sep, value = line.partition(':')
+        if not sep:
+            continue
+        label = _normalize(label)
+        value = value.strip()
+        if not value:
+            section = label
+            continue
+        if section:
+            values.setdefault(f'{section} / {label}', value)
+        values.setdefault(label, value)
+    return values
+
+def _count(value):
+    match = re.search(r'\d+', value.replace(',', ''))
+    return int(match.group(0)) if match else None
+
+def _number(value):
+    match = re.search(r'\d+(?:\.\d+)?', value.replace(',', ''))
+    return match.group(0) if match else None
+
+# Value conversions, matching the types the generic cascade returns
+CONVERTERS = {
+    'text': lambda value: value,
+    'lower': lambda value: value.lower(),
+    'number': _number,
+    'count': _count,
+}
+
+# Fields the cascade also publishes under other names
+ALTERNATE_FIELDS = {
+    'totalAutomobilesDischarge': ['totalAutomobiles', 'automobiles'],
+    'heavyEquipmentDischarge': ['heavyEquipment'],
+    'berthLocation': ['berth', 'berthAssignment'],
+    'vanId1': ['van1Id'], 'vanId2': ['van2Id'], 'vanId3': ['van3Id'], 'vanId4': ['van4Id'],
+}
+
+class TemplateProfile:
+    """A known layout: page-1 markers plus the labels each field is read from"""
+
+    def __init__(self, name, markers, fields, required=()):
+        self.name = name
+        self.markers = [marker.lower() for marker in markers]
+        # fields: parsed field name -> (label or list of labels, converter name)
+        self.fields = {}
+        for field, (labels, kind) in fields.items():
+            labels = [labels] if isinstance(labels, str) else labels
+            self.fields[field] = ([_normalize(label) for label in labels], CONVERTERS[kind])
+        self.required = tuple(required)
+
+    def matches(self, head):
+        return all(marker in head for marker in self.markers)
+
+    def extract(self, text, fields=None):
+        """Fields read through the profile's labels, or None if a required field is missing"""
+        values = label_values(text)
+        wanted = None
+        if fields is not None:
+            # Alternate names are copied from their source field, so read the source too
+            wanted = set(fields)
+            fields = wanted | {field for field, alternates in ALTERNATE_FIELDS.items()
+                               if wanted.intersection(alternates)}
+        data = {}
+        for field, (labels, convert) in self.fields.items():
+            if fields is not None and field not in fields:
+                continue
+            for label in labels:
+                if label in values:
+                    value = convert(values[label])
+                    if value not in (None, ''):
+                        data[field] = value
+                        break
+        if any(field not in data for field in self.required if fields is None or field in fields):
+            return None
+        for field, alternates in ALTERNATE_FIELDS.items():
+            if field in data:
+                for alternate in alternates:
+                    data.setdefault(alternate, data[field])
+        if wanted is not None:
+            data = {field: value for field, value in data.items() if field in wanted}
+        return data
+
+TEMPLATES = []
+
+def register_template(profile):
+    TEMPLATES.append(profile)
+    return profile
+
+def page_one(text):
+    """The start of the first page, without the PDF page marker"""
+    head = text.lstrip()
+    if head.startswith('=== PAGE'):
+        head = head.split('\n', 1)[-1]
+    return head.split('=== END PAGE', 1)[0][:HEAD_CHARS].lower()
+
+def match_template(text):
+    """The registered profile whose markers all appear on page 1, if any"""
+    head = page_one(text)
+    for profile in TEMPLATES:
+        if profile.matches(head):
+            return profile
+    return None
+
+def _numbered(field, label, kind, count=15):
+    return {field.format(n=n): (label.format(n=n), kind) for n in range(1, count + 1)}
+
+# The dashboard's own operation document (dev-tools/complete_comprehensive_test_document.txt)
+register_template(TemplateProfile(
+    'operation-document',
+    markers=['maritime vessel operation document', 'vessel information', 'stevedore team assignments'],
+    required=['vesselName'],
+    fields={
+        'vesselName': ('Vessel Name', 'text'),
+        'vesselType': ('Vessel Type', 'text'),
+        'port': ('Port', 'text'),
+        'operationDate': ('Operation Date', 'text'),
+        'berthLocation': ('Berth Location', 'text'),
+        'company': ('Stevedoring Company', 'text'),
+        'operationType': ('Operation Type', 'text'),
+        'operationManager': ('Operation Manager', 'text'),
+        'autoOperationsLead': ('Auto Operations Team / Lead Supervisor', 'text'),
+        'autoOperationsAssistant': ('Auto Operations Team / Assistant Supervisor', 'text'),
+        'heavyHeavyLead': ('High & Heavy Team / Lead Supervisor', 'text'),
+        'heavyHeavyAssistant': ('High & Heavy Team / Assistant Supervisor', 'text'),
+        'totalAutomobilesDischarge': ('Total Automobiles to Discharge', 'count'),
+        'heavyEquipmentDischarge': ('Heavy Equipment to Discharge', 'count'),
+        'mbCount': ('Mercedes-Benz (MB)', 'count'),
+        'bmwCount': ('BMW', 'count'),
+        'lrCount': ('Land Rover (LR)', 'count'),
+        'rrCount': ('Rolls-Royce (RR)', 'count'),
+        'audi': ('Audi', 'number'),
+        'porsche': ('Porsche', 'number'),
+        'mini': ('MINI', 'number'),
+        'jaguar': ('Jaguar', 'number'),
+        'brvTarget': ('BRV Loading Target', 'count'),
+        'zeeTarget': ('ZEE Loading Target', 'count'),
+        'souTarget': ('SOU Loading Target', 'count'),
+        'electricVehicles': ('Electric Vehicles', 'number'),
+        'staticCargo': ('Static Cargo Units', 'number'),
+        'cargoType': ('Cargo Brand/Type', 'text'),
+        'zoneA': ('Zone A - Vehicles', 'number'),
+        'zoneB': ('Zone B - Vehicles', 'number'),
+        'zoneC': ('Zone C - Vehicles', 'number'),
+        'zoneADescription': ('Zone A - Description', 'text'),
+        'zoneBDescription': ('Zone B - Description', 'text'),
+        'zoneCDescription': ('Zone C - Description', 'text'),
+        'expectedRate': ('Expected Rate', 'number'),
+        'totalDrivers': ('Total Drivers', 'number'),
+        'shiftStart': ('Shift Start Time', 'text'),
+        'shiftEnd': ('Shift End Time', 'text'),
+        'breakDuration': ('Break Duration', 'number'),
+        'numVans': ('Number of Vans', 'number'),
+        'numStationWagons': ('Number of Station Wagons', 'number'),
+        **_numbered('vanId{n}', 'Van {n} ID', 'text'),
+        **_numbered('wagonId{n}', 'Station Wagon {n} ID', 'text'),
+    },
+))
+
+# Terminal discharge plans: a flat label block on page 1 ahead of deck plans and VIN tables
+register_template(TemplateProfile(
+    'discharge-plan',
+    markers=['vessel discharge plan', 'vessel name:', 'berth location:'],
+    required=['vesselName'],
+    fields={
+        'vesselName': ('Vessel Name', 'text'),
+        'vesselType': ('Vessel Type', 'text'),
+        'port': ('Port', 'text'),
+        'operationDate': ('Operation Date', 'text'),
+        'berthLocation': ('Berth Location', 'text'),
+        'company': ('Stevedoring Company', 'text'),
+        'operationType': ('Operation Type', 'text'),
+        'operationManager': ('Operation Manager', 'text'),
+        'autoOperationsLead': ('Auto Operations Team Lead Supervisor', 'text'),
+        'autoOperationsAssistant': ('Auto Operations Team Assistant Supervisor', 'text'),
+        'heavyHeavyLead': ('High & Heavy Team Lead Supervisor', 'text'),
+        'heavyHeavyAssistant': ('High & Heavy Team Assistant Supervisor', 'text'),
+        'totalAutomobilesDischarge': ('Total Automobiles to Discharge', 'count'),
+        'heavyEquipmentDischarge': ('Heavy Equipment to Discharge', 'count'),
+        'electricVehicles': ('Electric Vehicles', 'number'),
+        'staticCargo': ('Static Cargo Units', 'number'),
+        'cargoType': ('Cargo Brand/Type', 'text'),
+        'mbCount': ('Mercedes-Benz', 'count'),
+        'bmwCount': ('Bmw', 'count'),
+        'lrCount': ('Land Rover', 'count'),
+        'rrCount': ('Rolls-Royce', 'count'),
+        'audi': ('Audi', 'number'),
+        'porsche': ('Porsche', 'number'),
+        'mini': ('Mini', 'number'),
+        'jaguar': ('Jaguar', 'number'),
+        'brvTarget': ('BRV Terminal', 'count'),
+        'zeeTarget': ('ZEE Compound', 'count'),
+        'souTarget': ('SOU Facility', 'count'),
+        'zeeAutomobiles': ('ZEE Automobiles', 'number'),
+        'zeeHeavyEquipment': ('ZEE Heavy Equipment', 'number'),
+        'zeeElectricVehicles': ('ZEE Electric Vehicles', 'number'),
+        'zeeStaticCargo': ('ZEE Static Cargo', 'number'),
+        'zeeCargoType': ('ZEE Cargo Type', 'text'),
+        'zeeCargoValue': ('ZEE Cargo Value', 'number'),
+        'zeePriority': ('ZEE Priority', 'lower'),
+        'zoneA': ('Zone A', 'number'),
+        'zoneB': ('Zone B', 'number'),
+        'zoneC': ('Zone C', 'number'),
+        'zoneADescription': ('Zone A Description', 'text'),
+        'zoneBDescription': ('Zone B Description', 'text'),
+        'zoneCDescription': ('Zone C Description', 'text'),
+        'expectedRate': ('Expected Rate', 'number'),
+        'totalDrivers': ('Total Drivers', 'number'),
+        'shiftStart': ('Shift Start', 'text'),
+        'shiftEnd': ('Shift End', 'text'),
+        'breakDuration': ('Break Duration', 'number'),
+        'numVans': ('Number of Vans', 'number'),
+        'numStationWagons': ('Number of Station Wagons', 'number'),
+        **_numbered('vanId{n}', 'Van {n} ID', 'text'),
+        **_numbered('wagonId{n}', 'Station Wagon {n} ID', 'text'),
+    },
+))
@@ -2,6 +2,7 @@
 let ships = [];
 let refreshInterval;
 let charts = {};
+let forecasts = {};
 
 // Initialize dashboard
 document.addEventListener('DOMContentLoaded', function() {
@@ -35,6 +36,7 @@ async function loadShips() {
                 throw new Error('Failed to load ships');
             }
         }
+        await loadForecasts();
         
         updateDashboard();
         updateCharts();
@@ -56,6 +58,32 @@ async function loadShips() {
     }
 }
 
+async function loadForecasts() {
+    // Server-side completion forecasts; cards fall back to the planned completion time without them
+    try {
+        const response = await fetch('/api/ships/forecast');
+        if (response.ok) {
+            const data = await response.json();
+            forecasts = {};
+            data.ships.forEach(forecast => { forecasts[forecast.shipId] = forecast; });
+        }
+    } catch (error) {
+        console.warn('Completion forecast unavailable:', error);
+    }
+}
+
+function formatCompletion(ship) {
+    const forecast = forecasts[ship.id];
+    if (ship.status === 'complete' || !forecast || !forecast.estimatedCompletion) {
+        return ship.estimatedCompletion;
+    }
+    const eta = new Date(forecast.estimatedCompletion);
+    const time = eta.toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' });
+    return eta.toDateString() === new Date().toDateString()
+        ? `ETA ${time}`
+        : `ETA ${eta.toLocaleDateString([], { month: 'short', day: 'numeric' })} ${time}`;
+}
+
 function updateDashboard() {
     updateStats();
     updateBerthMap();
@@ -176,7 +204,7 @@ function renderShips(statusFilter = '') {
             </div>
 
             <div class="mt-3 text-xs text-blue-100">
-                Manager: ${ship.operationManager} | ${ship.startTime} - ${ship.estimatedCompletion}
+                Manager: ${ship.operationManager} | ${ship.startTime} - ${formatCompletion(ship)}
             </div>
 
             <div class="mt-4 pt-4 border-t border-white border-opacity-20">
@@ -305,6 +305,15 @@ class OfflineStorageManager {
     // Enhanced API call with comprehensive offline fallback
     async apiCall(url, options = {}) {
         const fullUrl = url.startsWith('http') ? url : `${window.location.origin}${url}`;
+
+        // One key per logical write, kept by the queued copy, so the server applies it once however often it is retried
+        if (options.method && options.method !== 'GET') {
+            const headers = options.headers || {};
+            options = {
+                ...options,
+                headers: { ...headers, 'Idempotency-Key': headers['Idempotency-Key'] || this.generateId() }
+            };
+        }
         
         try {
             // Try online first
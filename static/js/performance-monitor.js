@@ -417,11 +417,10 @@ class PerformanceMonitor {
    */
   sendBeaconReport() {
     if ('sendBeacon' in navigator) {
-      const report = this.generateReport();
+      const report = { ...this.generateReport(), page: location.pathname };
       const blob = new Blob([JSON.stringify(report)], { type: 'application/json' });
       
-      // Would send to analytics endpoint
-      // navigator.sendBeacon('/api/analytics/performance', blob);
+      navigator.sendBeacon('/api/analytics/performance', blob);
     }
   }
 
@@ -1,7 +1,6 @@
 // Push Notifications Manager for Maritime Operations
 class PushNotificationManager {
     constructor() {
-        this.publicVapidKey = 'BP8rKvXF6GVbFrtNz5Wq9C_jN5D6yA8Hs4I9xJ7kL8mN9oP0qR1sT2uV3wX4yZ5'; // Demo key
         this.subscription = null;
         this.permissionStatus = null;
         this.notificationQueue = [];
@@ -209,11 +208,26 @@ class PushNotificationManager {
         }
     }
 
+    async fetchPublicVapidKey() {
+        const response = await fetch('/api/notifications/vapid-public-key');
+        if (!response.ok) {
+            return null;
+        }
+        const { publicKey } = await response.json();
+        return publicKey || null;
+    }
+
     async createSubscription(registration) {
         try {
+            const publicVapidKey = await this.fetchPublicVapidKey();
+            if (!publicVapidKey) {
+                console.warn('Push delivery is not configured on the server');
+                return;
+            }
+
             const subscription = await registration.pushManager.subscribe({
                 userVisibleOnly: true,
-                applicationServerKey: this.urlBase64ToUint8Array(this.publicVapidKey)
+                applicationServerKey: this.urlBase64ToUint8Array(publicVapidKey)
             });
 
             this.subscription = subscription;
@@ -234,6 +248,9 @@ class PushNotificationManager {
                 },
                 body: JSON.stringify({
                     subscription: subscription,
+                    // Follow the ship on screen (every ship from the dashboard) in the user's role
+                    shipId: new URLSearchParams(window.location.search).get('ship') || null,
+                    role: localStorage.getItem('userRole') || null,
                     userAgent: navigator.userAgent,
                     timestamp: new Date().toISOString()
                 })
@@ -273,46 +290,10 @@ class PushNotificationManager {
         return outputArray;
     }
 
-    // Send notification to server for broadcasting
+    // Ship alerts are pushed to every subscriber by the server when ship data changes
+    // (broadcasting needs the admin token), so the client only shows them locally
     async sendNotification(type, title, message, data = {}) {
-        const notification = {
-            type,
-            title,
-            message,
-            data,
-            timestamp: new Date().toISOString(),
-            priority: this.getNotificationPriority(type)
-        };
-
-        try {
-            if (this.isOnline) {
-                const response = await fetch('/api/notifications/send', {
-                    method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json'
-                    },
-                    body: JSON.stringify(notification)
-                });
-
-                if (response.ok) {
-                    console.log('Notification sent successfully');
-                } else {
-                    throw new Error('Failed to send notification');
-                }
-            } else {
-                // Queue for when back online
-                this.notificationQueue.push({
-                    type: 'notification',
-                    data: notification,
-                    timestamp: Date.now()
-                });
-            }
-        } catch (error) {
-            console.error('Error sending notification:', error);
-            
-            // Show local notification as fallback
-            this.showLocalNotification(title, message, type);
-        }
+        this.showLocalNotification(title, message, type);
     }
 
     showLocalNotification(title, message, type = 'info') {
@@ -407,18 +388,6 @@ class PushNotificationManager {
             try {
                 if (item.type === 'subscription') {
                     await this.sendSubscriptionToServer(item.data);
-                } else if (item.type === 'notification') {
-                    const response = await fetch('/api/notifications/send', {
-                        method: 'POST',
-                        headers: {
-                            'Content-Type': 'application/json'
-                        },
-                        body: JSON.stringify(item.data)
-                    });
-
-                    if (!response.ok) {
-                        throw new Error('Failed to send queued notification');
-                    }
                 }
             } catch (error) {
                 console.error('Error processing queued notification:', error);
@@ -287,6 +287,53 @@ function collectFormData() {
     return data;
 }
 
+// Resumable chunked upload; resolves with the same response as /api/upload
+async function uploadFileInChunks(file, maxAttempts = 5) {
+    const started = await fetch('/api/uploads', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({ filename: file.name, size: file.size })
+    });
+    let session = await started.json();
+    if (!started.ok) {
+        throw new Error(session.error || 'Upload failed');
+    }
+
+    for (let attempt = 1; ; attempt++) {
+        try {
+            for (const [rangeStart, rangeEnd] of session.missing) {
+                for (let offset = rangeStart; offset < rangeEnd; offset += session.chunk_size) {
+                    const chunkEnd = Math.min(offset + session.chunk_size, rangeEnd);
+                    const index = Math.floor(offset / session.chunk_size);
+                    const response = await fetch(`/api/uploads/${session.upload_id}/chunks/${index}`, {
+                        method: 'PUT',
+                        headers: {
+                            'X-Chunk-Offset': String(offset)
+                        },
+                        body: file.slice(offset, chunkEnd)
+                    });
+                    if (!response.ok) {
+                        throw new Error((await response.json()).error || 'Chunk upload failed');
+                    }
+                }
+            }
+            break;
+        } catch (error) {
+            if (attempt >= maxAttempts) throw error;
+            // Back off, then resume from whatever the server already has
+            await new Promise(resolve => setTimeout(resolve, 1000 * attempt));
+            session = await fetch(`/api/uploads/${session.upload_id}`)
+                .then(response => response.json())
+                .catch(() => session);
+        }
+    }
+
+    const response = await fetch(`/api/uploads/${session.upload_id}/finalize`, { method: 'POST' });
+    return response.json();
+}
+
 // Wizard file upload functions
 function handleWizardFileUpload(event) {
     const file = event.target.files[0];
@@ -297,15 +344,8 @@ function handleWizardFileUpload(event) {
     document.getElementById('wizardUploadSuccess').classList.add('hidden');
     document.getElementById('wizardUploadError').classList.add('hidden');
 
-    // Create FormData and upload file
-    const formData = new FormData();
-    formData.append('file', file);
-
-    fetch('/api/upload', {
-        method: 'POST',
-        body: formData
-    })
-    .then(response => response.json())
+    // Upload in resumable chunks so a dropped connection does not start over
+    uploadFileInChunks(file)
     .then(data => {
         if (data.success) {
             return fetch('/api/extract', {
@@ -385,15 +425,8 @@ function handleFileUpload(event) {
     document.getElementById('uploadSuccess').classList.add('hidden');
     document.getElementById('uploadError').classList.add('hidden');
 
-    // Create FormData and upload file
-    const formData = new FormData();
-    formData.append('file', file);
-
-    fetch('/api/upload', {
-        method: 'POST',
-        body: formData
-    })
-    .then(response => response.json())
+    // Upload in resumable chunks so a dropped connection does not start over
+    uploadFileInChunks(file)
     .then(data => {
         if (data.success) {
             return fetch('/api/extract', {